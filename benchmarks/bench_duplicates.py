@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Measure duplicate lookup latency as the indexed archive grows
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatgpt_to_markdown import Message, SearchIndex, write_markdown
+from synthetic import make_varied_messages, make_vocabulary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    
+    vocabulary = make_vocabulary()
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(Path(tmp) / "index.db")
+        conversations = []
+        
+        for size in args.sizes:
+            start = time.perf_counter()
+            while len(conversations) < size:
+                messages = make_varied_messages(args.turns, vocabulary, seed=len(conversations))
+                target = Path(tmp) / f"conversation-{len(conversations)}.md"
+                write_markdown(target, messages)
+                index.add(target, messages, "title", "2024-01-01", [])
+                conversations.append(messages)
+            build_s = time.perf_counter() - start
+            
+            # Re-shares with two more turns, forks and unrelated conversations
+            queries = []
+            for i in range(args.queries):
+                original = conversations[(i * 7919) % len(conversations)]
+                if i % 3 == 0:
+                    queries.append(original + [Message("User", "one more"), Message("ChatGPT", "answer")])
+                elif i % 3 == 1:
+                    queries.append(original[:args.turns // 2] + [Message("User", f"fork {i}")])
+                else:
+                    queries.append(make_varied_messages(args.turns, vocabulary, seed=10 ** 6 + i))
+            
+            start = time.perf_counter()
+            found = sum(1 for q in queries if index.find_duplicate(q))
+            lookup_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{size:6} conversations: indexed (+{build_s:.1f} s), "
+                  f"lookup {lookup_ms:6.2f} ms  ({found}/{len(queries)} matched)")
+
+
+if __name__ == "__main__":
+    main()
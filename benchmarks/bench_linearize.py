@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark mapping linearization on synthetic conversation trees
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatgpt_to_markdown import BRANCH_MODES, Message, NoiseFilter, linearize_mapping
+from synthetic import make_mapping
+
+
+def linearize_by_sort(mapping: Dict[str, Any]) -> list:
+    """The previous approach: every node, sorted by create_time"""
+    noise = NoiseFilter.default()
+    nodes = []
+    for node in mapping.values():
+        msg = node.get("message")
+        if msg:
+            role = msg.get("author", {}).get("role", "assistant")
+            content = "\n".join(str(p) for p in msg.get("content", {}).get("parts", []) if p)
+            if content and not noise.is_noise(content):
+                nodes.append((msg.get("create_time", 0), Message("User" if role == "user" else "ChatGPT", content)))
+    nodes.sort(key=lambda x: x[0])
+    return [m for _, m in nodes]
+
+
+def timed(fn, repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(fn())
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    mapping, current_node = make_mapping(args.nodes)
+    print(f"Synthetic mapping: {len(mapping)} nodes")
+    
+    seconds, count = timed(lambda: linearize_by_sort(mapping), args.repeat)
+    print(f"  sort by create_time  {seconds * 1000:8.1f} ms  {count} messages")
+    
+    for mode in BRANCH_MODES:
+        seconds, count = timed(lambda: linearize_mapping(mapping, current_node, mode), args.repeat)
+        print(f"  tree walk ({mode:7})  {seconds * 1000:8.1f} ms  {count} messages")
+    
+    seconds, count = timed(lambda: linearize_mapping(mapping, None, "active"), args.repeat)
+    print(f"  tree walk (no current_node) {seconds * 1000:8.1f} ms  {count} messages")
+
+
+if __name__ == "__main__":
+    main()
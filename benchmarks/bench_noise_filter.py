@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Noise filter throughput over millions of messages, as in a bulk import
+
+Compares the compiled NoiseFilter (built-in rules, and with a larger set of
+configured rules) with the substring scan it replaced:
+
+    python benchmarks/bench_noise_filter.py --messages 2000000 --rules 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatgpt_to_markdown import DEFAULT_NOISE_RULES, NoiseFilter
+
+# The hard-coded check the filter replaced
+UI_PATTERNS = [
+    "Login", "Sign up", "Terms of Use", "Privacy Policy",
+    "Continue with", "Email address", "Welcome back",
+    "Create your account", "Remember me", "Don't have an account"
+]
+
+PAGE_TEXT = ["Log in", "Sign up", "Continue with Google", "Terms of Use | Privacy Policy",
+             "Don't have an account? Sign up", "Email address", "Copy link", "Report content"]
+
+
+def is_ui_text(text: str) -> bool:
+    return any(pattern in text for pattern in UI_PATTERNS)
+
+
+def make_texts(count: int, distinct: int = 20000, noise_ratio: float = 0.02, seed: int = 0) -> List[str]:
+    """count messages drawn from a pool of distinct ones (so millions fit in memory)"""
+    rng = random.Random(seed)
+    words = "the a to of and in is for that with on as it be this are or by from can if use your you".split()
+    words += ["function", "Python", "error", "database", "query", "login", "policy", "account", "terms"]
+    pool = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 400))) for _ in range(distinct)]
+    return [rng.choice(PAGE_TEXT) if rng.random() < noise_ratio else rng.choice(pool) for _ in range(count)]
+
+
+def make_rules(count: int) -> List[dict]:
+    """Configured rules of every kind, as a large filters.rules section would have"""
+    rules = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            rules.append({"name": f"exact{i}", "text": f"Banner text {i}"})
+        elif kind == 1:
+            rules.append({"name": f"folded{i}", "text": f"Cookie notice {i}", "ignore_case": True})
+        elif kind == 2:
+            rules.append({"name": f"substring{i}", "text": f"tracking-pixel-{i}", "match": "substring"})
+        else:
+            rules.append({"name": f"regex{i}", "regex": rf"Upgrade to Plus \({i}\)|Limit reached #{i}"})
+    return rules
+
+
+def timed(fn: Callable[[str], object], texts: List[str]) -> Tuple[float, int]:
+    start = time.perf_counter()
+    dropped = sum(1 for text in texts if fn(text))
+    return time.perf_counter() - start, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--rules", type=int, default=100, help="Configured rules added to the built-in ones")
+    args = parser.parse_args()
+    
+    texts = make_texts(args.messages)
+    print(f"{len(texts):,} messages")
+    
+    candidates = [
+        ("substring scan (before)", is_ui_text),
+        ("NoiseFilter, built-in rules", NoiseFilter(DEFAULT_NOISE_RULES).match),
+        (f"NoiseFilter, +{args.rules} rules", NoiseFilter(DEFAULT_NOISE_RULES + make_rules(args.rules)).match),
+    ]
+    for name, fn in candidates:
+        seconds, dropped = timed(fn, texts)
+        print(f"  {name:30} {seconds:7.2f} s  {len(texts) / seconds / 1e6:6.2f} M msg/s  {dropped:,} dropped")
+
+
+if __name__ == "__main__":
+    main()
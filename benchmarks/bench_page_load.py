@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compare default and fast-load page loading against local fixture share pages
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatgpt_to_markdown import BrowserPool, Config
+from fixture_server import start_fixture_server
+
+
+async def load_all(config: Config, urls, repeat: int):
+    timings = {}
+    async with BrowserPool(config, 1) as pool:
+        for url in urls:
+            totals = []
+            for _ in range(repeat):
+                messages = await pool.extract(url)
+                timing = pool.timings.pop(url)
+                totals.append(timing)
+            timings[url] = (totals, len(messages))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    server, base_url = start_fixture_server()
+    urls = [f"{base_url}/share/{kind}-{args.nodes}" for kind in ("next", "remix", "dom")]
+    
+    for fast_load in (False, True):
+        config = Config(browser_fast_load=fast_load, http_fast_path=False)
+        print(f"{'fast-load' if fast_load else 'default'}:")
+        for url, (timings, count) in asyncio.run(load_all(config, urls, args.repeat)).items():
+            total = statistics.median(t.total_ms for t in timings)
+            blocked = timings[-1].blocked_requests
+            print(f"  {url.rsplit('/', 1)[-1]:12} {total:8.0f} ms  {count} messages  {blocked} blocked")
+    
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
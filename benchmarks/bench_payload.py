@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Measure extraction payload size and evaluate time: full object vs compact JSON payload
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from playwright.sync_api import sync_playwright
+
+from chatgpt_to_markdown import EXTRACT_JS, LoadTiming, evaluate_payload
+from fixture_server import start_fixture_server
+
+# What extraction returned before the in-page projection: the whole object
+FULL_OBJECT_JS = """
+() => JSON.parse(document.getElementById('__NEXT_DATA__').textContent).props.pageProps.sharedConversation
+"""
+
+
+def best_of(repeat: int, fn):
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    server, base_url = start_fixture_server()
+    
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+        
+        for size in args.sizes:
+            page.goto(f"{base_url}/share/next-{size}", wait_until="domcontentloaded")
+            
+            full_ms, full = best_of(args.repeat, lambda: page.evaluate(FULL_OBJECT_JS))
+            object_ms, compact_object = best_of(args.repeat, lambda: page.evaluate(EXTRACT_JS))
+            timing = LoadTiming(page.url)
+            payload_ms, _ = best_of(args.repeat, lambda: evaluate_payload(page, timing))
+            
+            print(f"{size} nodes:")
+            print(f"  full object      {len(json.dumps(full)) / 1024:9.0f} KB  {full_ms:8.1f} ms")
+            print(f"  compact object   {len(json.dumps(compact_object)) / 1024:9.0f} KB  {object_ms:8.1f} ms")
+            print(f"  compact JSON     {timing.payload_chars / 1024:9.0f} KB  {payload_ms:8.1f} ms"
+                  f"  ({timing.payload_chunks} chunk{'s' if timing.payload_chunks > 1 else ''})")
+        
+        browser.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Measure rendering time and peak memory: building the whole document vs streaming it to disk
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatgpt_to_markdown import create_markdown, write_markdown
+from synthetic import make_messages
+
+
+def build_and_write(path: Path, messages, format_type: str) -> None:
+    # What export did before streaming: render the whole document, then write it
+    markdown = create_markdown(messages, ["insight"], ["#tag"], format_type)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(markdown)
+
+
+def stream(path: Path, messages, format_type: str) -> None:
+    write_markdown(path, messages, ["insight"], ["#tag"], format_type)
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--format", default="obsidian")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "conversation.md"
+        for size in args.sizes:
+            messages = make_messages(size)
+            build_ms, build_mb = measure(build_and_write, path, messages, args.format)
+            stream_ms, stream_mb = measure(stream, path, messages, args.format)
+            size_mb = path.stat().st_size / (1024 * 1024)
+            
+            print(f"{size} turns ({size_mb:.1f} MB):")
+            print(f"  build + write   {build_ms:8.1f} ms  peak {build_mb:7.1f} MB")
+            print(f"  streamed        {stream_ms:8.1f} ms  peak {stream_mb:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
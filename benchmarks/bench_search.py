@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Measure search index build time and query latency over a synthetic archive
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatgpt_to_markdown import SearchIndex, reindex, write_markdown
+from synthetic import make_varied_messages, make_vocabulary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "archive"
+        root.mkdir()
+        vocabulary = make_vocabulary()
+        for i in range(args.conversations):
+            messages = make_varied_messages(args.turns, vocabulary, seed=i)
+            write_markdown(root / f"conversation-{i}.md", messages, format_type="obsidian")
+        
+        index = SearchIndex(Path(tmp) / "index.db")
+        start = time.perf_counter()
+        indexed, _ = reindex(index, [root.resolve()])
+        print(f"reindex {indexed} files ({indexed * args.turns} messages): "
+              f"{time.perf_counter() - start:.2f} s")
+        
+        # The most common word, rarer words, a phrase, a prefix and a boolean query
+        queries = [vocabulary[0], vocabulary[50], vocabulary[2000],
+                   f'"{vocabulary[1]} {vocabulary[0]}"', vocabulary[10][:2] + "*",
+                   f"{vocabulary[100]} AND {vocabulary[200]}"]
+        for query in queries:
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hits = index.search(query)
+                best = min(best, time.perf_counter() - start)
+            print(f"  {query:20} {best * 1000:7.2f} ms  ({len(hits)} hits)")
+
+
+if __name__ == "__main__":
+    main()
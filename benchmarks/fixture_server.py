@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Local HTTP server for synthetic share pages
+
+Pages are served at ``/share/<kind>-<nodes>`` where kind is ``next``,
+``remix`` or ``dom`` (see synthetic.render_share_page), e.g.
+http://127.0.0.1:8766/share/next-2000. ``server.sizes`` overrides the
+number of nodes served for a path, so a test can make a shared
+conversation grow. ``/gzip/<bytes>`` serves that many zero bytes
+gzip-encoded, for testing size limits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+from synthetic import render_share_page
+
+PIXEL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+
+@lru_cache(maxsize=32)
+def _page(kind: str, size: int) -> bytes:
+    return render_share_page(kind, size).encode("utf-8")
+
+
+@lru_cache(maxsize=8)
+def _gzipped_zeros(size: int) -> bytes:
+    return gzip.compress(bytes(size))
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status: int, body: bytes, content_type: str, encoding: str = "") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        match = re.fullmatch(r"/share/(next|remix|dom)-(\d+)", path)
+        if match:
+            size = self.server.sizes.get(path, int(match.group(2)))
+            self._send(200, _page(match.group(1), size), "text/html; charset=utf-8")
+        elif re.fullmatch(r"/gzip/\d+", path):
+            self._send(200, _gzipped_zeros(int(path[len("/gzip/"):])), "application/octet-stream", "gzip")
+        elif self.path.startswith("/static/"):
+            # Slow static assets, as on a cold CDN
+            time.sleep(0.5)
+            self._send(200, PIXEL_PNG, "image/png")
+        elif self.path.startswith("/collect"):
+            time.sleep(0.1)
+            self._send(204, b"", "text/plain")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+
+class FixtureServer(ThreadingHTTPServer):
+    request_queue_size = 256
+    daemon_threads = True
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sizes: Dict[str, int] = {}
+    
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (e.g. size limits) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_fixture_server(port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the server in a background thread and return it with its base URL"""
+    server = FixtureServer(("127.0.0.1", port), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    
+    server, base_url = start_fixture_server(args.port)
+    print(f"Fixture share pages: {base_url}/share/next-2000 (kinds: next, remix, dom)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the commands that don't need a browser
+
+Each command runs in a fresh interpreter with ``python -X importtime``. The
+check fails (exit status 1) when a command imports a module it has no use
+for (Playwright, OpenAI, asyncio, ...) or when the median of its import
+times is over the budget:
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 80 --repeat 10
+
+tests/test_import_budget.py checks the imported modules with the test suite, and
+the timing too when IMPORT_BUDGET_MS is set.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic import make_conversation
+
+# Modules that only browser extraction, insights or batch mode need
+HEAVY_MODULES = ("playwright", "openai", "yaml", "asyncio", "http.client", "ssl", "concurrent.futures")
+
+RUN = "import sys; from chatgpt_to_markdown import main; sys.exit(main(sys.argv[1:]))"
+
+
+def commands(tmp: Path) -> List[Tuple[str, List[str], Tuple[str, ...]]]:
+    """(name, argv, heavy modules the command may import)"""
+    return [
+        ("import module", [], ()),
+        ("--help", ["--help"], ()),
+        ("config validate", ["config", "validate", "--config", os.path.join(ROOT, "config.example.yaml")], ("yaml",)),
+        ("search", ["search", "lorem", "--config", str(tmp / "none.yaml")], ()),
+        ("reindex", ["reindex", str(tmp / "out"), "--workers", "1", "--config", str(tmp / "none.yaml")], ()),
+        ("queue status", ["queue", "status", "--config", str(tmp / "none.yaml")], ()),
+        ("import", ["import", str(tmp / "conversations.json"), "--no-insights", "--workers", "1",
+                    "--output", str(tmp / "out"), "--config", str(tmp / "none.yaml")], ()),
+        ("render", ["render", "--workers", "1", "--output", str(tmp / "rendered"), "--config", str(tmp / "none.yaml")], ()),
+    ]
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Top-level cumulative import times in microseconds, plus every imported module name"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name[1:].rstrip()] = int(cumulative)
+    return modules
+
+
+def run_command(argv: List[str], env: Dict[str, str], cwd: Path) -> Dict[str, int]:
+    code = RUN if argv else "import chatgpt_to_markdown"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code, *argv],
+                            env=env, cwd=cwd, capture_output=True, text=True)
+    return parse_importtime(result.stderr)
+
+
+def total_ms(modules: Dict[str, int]) -> float:
+    # Nested imports are indented; their time is already in their parent's cumulative time
+    return sum(us for name, us in modules.items() if not name.startswith(" ")) / 1000
+
+
+def check(budget_ms: Optional[float] = 100, repeat: int = 5, verbose: bool = True) -> List[str]:
+    """Names of the commands over the budget or importing heavy modules they don't need
+    
+    With ``budget_ms`` None only the imported modules are checked, which
+    doesn't depend on how fast or busy the machine is.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp_name:
+        tmp = Path(tmp_name)
+        with open(tmp / "conversations.json", "w", encoding="utf-8") as f:
+            json.dump([make_conversation(20, seed=i) for i in range(3)], f)
+        
+        env = dict(os.environ, HOME=tmp_name, PYTHONPATH=ROOT)
+        # Measure what an installed command sees: compiled bytecode is cached after the first run
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        
+        checked = commands(tmp)
+        for _, argv, _ in checked:
+            run_command(argv, env, tmp)
+        # Round-robin, so a burst of load on the machine is spread across the
+        # commands instead of landing on all runs of one of them
+        runs: Dict[str, List[Dict[str, int]]] = {name: [] for name, _, _ in checked}
+        for _ in range(repeat):
+            for name, argv, _ in checked:
+                runs[name].append(run_command(argv, env, tmp))
+        
+        for name, argv, allowed in checked:
+            median = statistics.median(total_ms(modules) for modules in runs[name])
+            
+            imported = {m.strip() for m in runs[name][0]}
+            unexpected = sorted(m for m in HEAVY_MODULES if m not in allowed and m in imported)
+            over = budget_ms is not None and median > budget_ms
+            
+            status = "FAIL" if over or unexpected else "ok"
+            if verbose:
+                print(f"  {name:16} {median:8.1f} ms  {status}"
+                      + (f"  (imports {', '.join(unexpected)})" if unexpected else ""))
+            if status != "ok":
+                failures.append(name + (f" (imports {', '.join(unexpected)})" if unexpected else f" ({median:.0f} ms)"))
+    return failures
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=100,
+                        help="Maximum median import time per command (default: 100)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per command; their median is compared with the budget")
+    args = parser.parse_args(argv)
+    
+    failures = check(args.budget_ms, args.repeat)
+    if failures:
+        print(f"\n❌ Over the {args.budget_ms:.0f} ms import budget: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"\n✅ All commands within the {args.budget_ms:.0f} ms import budget")
+
+
+if __name__ == "__main__":
+    main()
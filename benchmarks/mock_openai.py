@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Minimal OpenAI-compatible chat completions server for exercising insights offline
+
+Point the exporter at it with ``openai.base_url: http://127.0.0.1:8765/v1`` in
+config.yaml (any API key works).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    failure_rate = 0.0
+    fail_first = 0
+    truncate = False
+    requests = 0
+    _lock = threading.Lock()
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self._lock:
+            type(self).requests += 1
+            count = type(self).requests
+        
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        
+        if self.latency:
+            time.sleep(self.latency)
+        if count <= self.fail_first or random.random() < self.failure_rate:
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                            {"Retry-After": "0.1"})
+            return
+        
+        prompt = request["messages"][-1]["content"]
+        content = json.dumps({
+            "insights": [f"Insight {i} about a {len(prompt)}-character prompt" for i in range(1, 7)],
+            "tags": [f"#tag{i}" for i in range(1, 9)],
+        })
+        finish_reason = "stop"
+        if self.truncate:
+            # As when the reply runs into max_tokens
+            content, finish_reason = content[:len(content) // 2], "length"
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 50,
+                      "total_tokens": len(prompt) // 4 + 50},
+        })
+
+
+def start_mock_server(port: int = 0, latency: float = 0.0, failure_rate: float = 0.0,
+                      fail_first: int = 0, truncate: bool = False) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the server in a background thread and return it with its base URL
+    
+    The first ``fail_first`` requests, and then a random ``failure_rate`` of
+    them, are answered with 429. With ``truncate``, replies are cut off
+    halfway with ``finish_reason: length``. ``server.RequestHandlerClass.requests``
+    counts the requests received.
+    """
+    handler = type("Handler", (MockOpenAIHandler,), {"latency": latency, "failure_rate": failure_rate,
+                                                     "fail_first": fail_first, "truncate": truncate})
+    server_class = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 256, "daemon_threads": True})
+    server = server_class(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+    
+    server, base_url = start_mock_server(args.port, args.latency, args.failure_rate)
+    print(f"Mock OpenAI endpoint: {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
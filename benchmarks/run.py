@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the whole export pipeline
+
+Every stage runs against synthetic data (fixed seeds), local fixture share
+pages and a mock OpenAI endpoint, so results are reproducible and can be
+compared across commits:
+
+    python benchmarks/run.py --output before.json
+    git checkout my-branch
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from chatgpt_to_markdown import (BRANCH_MODES, Config, InsightsEngine, NoiseFilter, extract_messages_with_playwright,
+                                 fetch_with_http, linearize_mapping, parse_extraction_result,
+                                 create_markdown, write_markdown)
+from fixture_server import start_fixture_server
+from mock_openai import start_mock_server
+from synthetic import PAGE_NOISE, make_dom_elements, make_linear_conversation, make_mapping, make_messages
+
+STAGES = ("extract_playwright", "extract_http", "linearize", "parse", "noise_filter",
+          "create_markdown", "write", "insights")
+FORMATS = ("standard", "obsidian", "blog")
+PAGE_KINDS = ("next", "remix", "dom")
+
+
+class Suite:
+    """Collects one JSON record per (stage, parameters)"""
+    
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: List[Dict[str, Any]] = []
+    
+    def time(self, stage: str, params: Dict[str, Any], fn: Callable[[], Any],
+             repeat: Optional[int] = None, items: Optional[Callable[[Any], int]] = None) -> None:
+        samples = []
+        value = None
+        for _ in range(repeat or self.repeat):
+            gc.collect()
+            start = time.perf_counter()
+            value = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        self.record(stage, params, samples, items(value) if items else None)
+    
+    def record(self, stage: str, params: Dict[str, Any], samples: List[float],
+               items: Optional[int] = None) -> None:
+        result = {
+            "stage": stage,
+            "params": params,
+            "samples_ms": [round(s, 3) for s in samples],
+            "min_ms": round(min(samples), 3),
+            "median_ms": round(statistics.median(samples), 3),
+            "items": items,
+        }
+        self.results.append(result)
+        label = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"  {stage:20} {label:44} {result['median_ms']:10.2f} ms"
+              + (f"  ({items} items)" if items is not None else ""), file=sys.stderr)
+    
+    def skip(self, stage: str, reason: str) -> None:
+        self.results.append({"stage": stage, "params": {}, "skipped": reason})
+        print(f"  {stage:20} skipped: {reason}", file=sys.stderr)
+
+
+def bench_extract_playwright(suite: Suite, base_url: str, sizes: List[int]) -> None:
+    # Cold extraction, as in a single-URL export: browser launch, load, evaluate
+    config = Config(http_fast_path=False, browser_fast_load=True)
+    try:
+        extract_messages_with_playwright(f"{base_url}/share/next-2", config)
+    except Exception as e:
+        suite.skip("extract_playwright", f"{type(e).__name__}: {str(e).splitlines()[0]}")
+        return
+    for kind in PAGE_KINDS:
+        for size in sizes:
+            url = f"{base_url}/share/{kind}-{size}"
+            suite.time("extract_playwright", {"kind": kind, "size": size},
+                       lambda: extract_messages_with_playwright(url, config), items=len)
+
+
+def bench_extract_http(suite: Suite, base_url: str, sizes: List[int]) -> None:
+    config = Config()
+    for kind in ("next", "remix"):
+        for size in sizes:
+            url = f"{base_url}/share/{kind}-{size}"
+            suite.time("extract_http", {"kind": kind, "size": size},
+                       lambda: parse_extraction_result(fetch_with_http(url, config)), items=len)
+
+
+def bench_linearize(suite: Suite, sizes: List[int]) -> None:
+    for size in sizes:
+        mapping, current_node = make_mapping(size)
+        for mode in BRANCH_MODES:
+            suite.time("linearize", {"mode": mode, "size": size},
+                       lambda: linearize_mapping(mapping, current_node, mode), items=len)
+
+
+def bench_parse(suite: Suite, sizes: List[int]) -> None:
+    for size in sizes:
+        for variant, data in (("linear_conversation", make_linear_conversation(size)),
+                              ("dom_elements", make_dom_elements(size))):
+            suite.time("parse", {"variant": variant, "size": size},
+                       lambda: parse_extraction_result(data), items=len)
+
+
+def bench_noise_filter(suite: Suite, sizes: List[int]) -> None:
+    noise = [line.strip() for line in PAGE_NOISE.splitlines() if line.strip()]
+    noise += ["Log in", "Sign up", "Copy link", "Report content", "Terms of use"]
+    noise_filter = NoiseFilter.default()
+    for size in sizes:
+        texts = [m.content for m in make_messages(size)] + noise * max(1, size // 100)
+        suite.time("noise_filter", {"size": len(texts)},
+                   lambda: [t for t in texts if noise_filter.match(t) is None], items=len)
+
+
+def bench_render(suite: Suite, sizes: List[int], tmp: Path, stages: List[str]) -> None:
+    insights, tags = [f"Insight {i}" for i in range(5)], [f"#tag{i}" for i in range(7)]
+    for size in sizes:
+        messages = make_messages(size)
+        for format_type in FORMATS:
+            if "create_markdown" in stages:
+                suite.time("create_markdown", {"format": format_type, "size": size},
+                           lambda: create_markdown(messages, insights, tags, format_type))
+            if "write" in stages:
+                path = tmp / f"{format_type}-{size}.md"
+                suite.time("write", {"format": format_type, "size": size},
+                           lambda: write_markdown(path, messages, insights, tags, format_type))
+
+
+def bench_insights(suite: Suite, sizes: List[int], latency: float, conversations: int) -> None:
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        suite.skip("insights", "openai is not installed")
+        return
+    
+    server, base_url = start_mock_server(latency=latency)
+    try:
+        for mode in ("truncate", "map_reduce"):
+            for size in sizes:
+                config = Config(openai_api_key="mock", openai_base_url=base_url, openai_cache=False,
+                                insights_mode=mode, openai_max_concurrency=8)
+                batch = [make_messages(size, seed=i) for i in range(conversations)]
+                
+                async def run():
+                    engine = InsightsEngine(config)
+                    try:
+                        return await asyncio.gather(*(engine.generate(m) for m in batch))
+                    finally:
+                        await engine.close()
+                
+                suite.time("insights", {"mode": mode, "size": size, "conversations": conversations,
+                                        "latency_ms": int(latency * 1000)},
+                           lambda: asyncio.run(run()), items=len)
+    finally:
+        server.shutdown()
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    return result["stage"] + json.dumps(result["params"], sort_keys=True)
+
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    before = {result_key(r): r for r in baseline["results"] if "median_ms" in r}
+    print(f"\nCompared with {baseline['revision'].get('commit') or 'baseline'}:", file=sys.stderr)
+    for result in current["results"]:
+        old = before.get(result_key(result))
+        if old is None or "median_ms" not in result:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        label = " ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"  {result['stage']:20} {label:44} {old['median_ms']:10.2f} -> {result['median_ms']:10.2f} ms"
+              f"  x{ratio:.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Conversation sizes in messages/nodes")
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[100, 1000],
+                        help="Conversation sizes for the fixture share pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--insights-latency", type=float, default=0.05,
+                        help="Simulated latency of the mock OpenAI endpoint in seconds")
+    parser.add_argument("--insights-conversations", type=int, default=8)
+    parser.add_argument("--output", "-o", default="-", help="JSON results file (- for stdout)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Print timings relative to an earlier run")
+    args = parser.parse_args()
+    
+    suite = Suite(args.repeat)
+    started = datetime.now().isoformat(timespec="seconds")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        server, base_url = start_fixture_server()
+        try:
+            if "extract_playwright" in args.stages:
+                bench_extract_playwright(suite, base_url, args.page_sizes)
+            if "extract_http" in args.stages:
+                bench_extract_http(suite, base_url, args.page_sizes)
+        finally:
+            server.shutdown()
+        if "linearize" in args.stages:
+            bench_linearize(suite, args.sizes)
+        if "parse" in args.stages:
+            bench_parse(suite, args.sizes)
+        if "noise_filter" in args.stages:
+            bench_noise_filter(suite, args.sizes)
+        if "create_markdown" in args.stages or "write" in args.stages:
+            bench_render(suite, args.sizes, Path(tmp), args.stages)
+        if "insights" in args.stages:
+            bench_insights(suite, [s for s in args.sizes if s <= 1000] or args.sizes[:1],
+                           args.insights_latency, args.insights_conversations)
+    
+    report = {
+        "revision": git_revision(),
+        "started_at": started,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"sizes": args.sizes, "page_sizes": args.page_sizes, "repeat": args.repeat,
+                     "insights_latency": args.insights_latency,
+                     "insights_conversations": args.insights_conversations},
+        "results": suite.results,
+    }
+    
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Synthetic ChatGPT conversations and share pages for benchmarks
+"""
+
+from __future__ import annotations
+
+import html
+import json
+import random
+from typing import Any, Dict, List, Tuple
+
+
+def make_mapping(size: int, fork_every: int = 20, seed: int = 0) -> Tuple[Dict[str, Any], str]:
+    """Build a mapping of ``size`` nodes where every ``fork_every``-th node was regenerated
+    
+    Returns the mapping and the ID of the current (last active) node.
+    """
+    rng = random.Random(seed)
+    mapping = {"root": {"id": "root", "message": None, "parent": None, "children": []}}
+    tip = "root"
+    
+    for i in range(size - 1):
+        node_id = f"n{i}"
+        role = "user" if i % 2 == 0 else "assistant"
+        mapping[node_id] = {
+            "id": node_id,
+            "parent": tip,
+            "children": [],
+            "message": {
+                "id": node_id,
+                "author": {"role": role, "name": None, "metadata": {}},
+                "content": {"content_type": "text",
+                            "parts": [f"message {i} " + "lorem ipsum " * rng.randint(1, 20)]},
+                "create_time": 1700000000 + i,
+                "update_time": None,
+                "status": "finished_successfully",
+                "weight": 1.0,
+                "metadata": {"model_slug": "gpt-4o", "finish_details": {"type": "stop"},
+                             "citations": [], "request_id": f"req-{i:08x}"},
+                "recipient": "all",
+            },
+        }
+        mapping[tip]["children"].append(node_id)
+        # Abandoned regenerations stay attached as siblings of the next node
+        if i % fork_every != 0:
+            tip = node_id
+    
+    return mapping, tip
+
+
+def make_conversation(size: int, seed: int = 0) -> Dict[str, Any]:
+    """A sharedConversation / data-export style conversation object"""
+    mapping, current_node = make_mapping(size, seed=seed)
+    return {
+        "title": f"Synthetic conversation ({size} nodes)",
+        "create_time": 1700000000,
+        "update_time": 1700000000 + size,
+        "mapping": mapping,
+        "current_node": current_node,
+        "conversation_id": f"{seed:08d}-0000-0000-0000-000000000000",
+    }
+
+
+def make_linear_conversation(size: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    return {"linear_conversation": [
+        {"message": {"author": {"role": "user" if i % 2 == 0 else "assistant"},
+                     "content": {"parts": [f"message {i} " + "lorem ipsum " * rng.randint(1, 20)]}}}
+        for i in range(size)
+    ]}
+
+
+def make_dom_elements(size: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    return {"dom_elements": [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "text": f"message {i} " + "lorem ipsum " * rng.randint(1, 20)}
+        for i in range(size)
+    ]}
+
+
+def _script_json(data: Any) -> str:
+    return json.dumps(data).replace("</", "<\\/")
+
+
+# Loads an image, a font and keeps "analytics" requests going for ~2s,
+# which is what keeps real share pages from reaching networkidle quickly
+PAGE_NOISE = """
+<link rel="preload" href="/static/font.woff2" as="font" crossorigin>
+<img src="/static/hero.png" alt="">
+<script>
+  let beacons = 0;
+  const timer = setInterval(() => {
+    fetch('/collect?n=' + beacons).catch(() => {});
+    if (++beacons >= 10) clearInterval(timer);
+  }, 200);
+</script>
+"""
+
+
+def render_share_page(kind: str, size: int, seed: int = 0) -> str:
+    """HTML for a share page that carries the conversation the way ``kind`` does
+    
+    kind: ``next`` (__NEXT_DATA__), ``remix`` (window.__remixContext) or
+    ``dom`` (only rendered message elements).
+    """
+    if kind == "next":
+        data = {"props": {"pageProps": {"sharedConversation": make_conversation(size, seed)}}}
+        payload = f'<script id="__NEXT_DATA__" type="application/json">{_script_json(data)}</script>'
+    elif kind == "remix":
+        data = {"state": {"loaderData": {"routes/share.$shareId.($action)": {
+            "sharedConversation": make_conversation(size, seed)}}}}
+        payload = f"<script>window.__remixContext = {_script_json(data)};</script>"
+    elif kind == "dom":
+        payload = "\n".join(
+            f'<div data-message-author-role="{e["role"]}">{html.escape(e["text"])}</div>'
+            for e in make_dom_elements(size, seed)["dom_elements"]
+        )
+    else:
+        raise ValueError(f"Unknown page kind: {kind}")
+    
+    return (f"<!DOCTYPE html><html><head><title>Shared conversation</title></head>"
+            f"<body><main>{payload}</main>{PAGE_NOISE}</body></html>")
+
+
+def make_messages(count: int, seed: int = 0) -> List[Any]:
+    """Message objects of realistic length for rendering benchmarks"""
+    from chatgpt_to_markdown import Message
+    
+    rng = random.Random(seed)
+    return [Message("User" if i % 2 == 0 else "ChatGPT",
+                    f"message {i}\n" + "lorem ipsum dolor sit amet " * rng.randint(5, 80))
+            for i in range(count)]
+
+
+def make_vocabulary(size: int = 5000, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def make_varied_messages(count: int, vocabulary: List[str], seed: int = 0) -> List[Any]:
+    """Messages with Zipf-distributed words, so term frequencies look like natural text"""
+    from chatgpt_to_markdown import Message
+    
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [Message("User" if i % 2 == 0 else "ChatGPT",
+                    " ".join(rng.choices(vocabulary, weights, k=rng.randint(20, 400))))
+            for i in range(count)]
@@ -6,17 +6,24 @@ ChatGPT to Markdown with configuration support
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import os
+import random
 import re
+import sqlite3
 import sys
-import yaml
-from dataclasses import dataclass
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote, urljoin, urlparse, urlsplit
 
-from playwright.sync_api import sync_playwright
+# asyncio, http.client, Playwright, OpenAI and YAML are imported where they are
+# used, so that --help, search, reindex and imports don't pay for them at startup
 
 
 @dataclass
@@ -30,9 +37,58 @@ class Config:
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o-mini"
     openai_temperature: float = 0.2
+    openai_max_tokens: Optional[int] = None
+    openai_base_url: Optional[str] = None
+    openai_max_concurrency: int = 4
+    openai_requests_per_minute: int = 0
+    openai_tokens_per_minute: int = 0
+    openai_max_retries: int = 5
+    openai_cache: bool = True
+    openai_cache_max_size_mb: float = 50
+    openai_cache_max_age_days: float = 90
+    incremental: bool = True
+    duplicates: str = "write"
+    duplicate_threshold: float = 0.6
     browser_headless: bool = True
     browser_timeout: int = 30000
+    browser_concurrency: int = 4
+    browser_fast_load: bool = False
     insights_language: str = "auto"
+    insights_mode: str = "truncate"
+    openai_chunk_tokens: int = 3000
+    openai_reduce_fanout: int = 8
+    branch_mode: str = "active"
+    http_fast_path: bool = True
+    cache_enabled: bool = True
+    cache_dir: Optional[str] = None  # None: see data_path
+    cache_max_size_mb: float = 500
+    cache_max_age_days: float = 30
+    index_enabled: bool = True
+    index_path: Optional[str] = None
+    index_tokenizer: str = "unicode61 remove_diacritics 2"
+    metrics_json: Optional[str] = None
+    metrics_prometheus: Optional[str] = None
+    server_host: str = "127.0.0.1"
+    server_port: int = 8765
+    server_socket: Optional[str] = None
+    server_max_queue: int = 32
+    server_warm_browser: bool = True
+    queue_path: Optional[str] = None
+    queue_max_attempts: int = 5
+    queue_retry_delay: float = 10.0
+    queue_max_retry_delay: float = 600.0
+    queue_poll_interval: float = 5.0
+    assets_enabled: bool = True
+    assets_dir: str = "assets"
+    assets_max_size_mb: float = 20
+    assets_concurrency: int = 8
+    assets_search_paths: List[str] = field(default_factory=list)
+    assets_url_template: Optional[str] = None
+    archive_enabled: bool = True
+    archive_path: Optional[str] = None
+    archive_batch_rows: int = 1000
+    filter_defaults: bool = True
+    filter_rules: List[Dict[str, Any]] = field(default_factory=list)
     
     @classmethod
     def from_file(cls, config_path: str) -> Config:
@@ -40,12 +96,17 @@ class Config:
         config = cls()
         
         if os.path.exists(config_path):
+            import yaml
+            
             with open(config_path, 'r', encoding='utf-8') as f:
                 data = yaml.safe_load(f)
                 
                 if data and 'output' in data:
                     config.output_dir = data['output'].get('directory', config.output_dir)
                     config.format = data['output'].get('format', config.format)
+                    config.incremental = data['output'].get('incremental', config.incremental)
+                    config.duplicates = data['output'].get('duplicates', config.duplicates)
+                    config.duplicate_threshold = data['output'].get('duplicate_threshold', config.duplicate_threshold)
                     
                     if 'obsidian' in data['output']:
                         obs = data['output']['obsidian']
@@ -59,10 +120,74 @@ class Config:
                     config.openai_api_key = data['openai'].get('api_key')
                     config.openai_model = data['openai'].get('model', config.openai_model)
                     config.openai_temperature = data['openai'].get('temperature', config.openai_temperature)
+                    config.openai_max_tokens = data['openai'].get('max_tokens', config.openai_max_tokens)
+                    config.openai_base_url = data['openai'].get('base_url', config.openai_base_url)
+                    config.openai_max_concurrency = data['openai'].get('max_concurrency', config.openai_max_concurrency)
+                    config.openai_requests_per_minute = data['openai'].get('requests_per_minute', config.openai_requests_per_minute)
+                    config.openai_tokens_per_minute = data['openai'].get('tokens_per_minute', config.openai_tokens_per_minute)
+                    config.openai_max_retries = data['openai'].get('max_retries', config.openai_max_retries)
+                    config.openai_cache = data['openai'].get('cache', config.openai_cache)
+                    config.openai_cache_max_size_mb = data['openai'].get('cache_max_size_mb', config.openai_cache_max_size_mb)
+                    config.openai_cache_max_age_days = data['openai'].get('cache_max_age_days', config.openai_cache_max_age_days)
+                    config.insights_mode = data['openai'].get('insights_mode', config.insights_mode)
+                    config.openai_chunk_tokens = data['openai'].get('chunk_tokens', config.openai_chunk_tokens)
+                    config.openai_reduce_fanout = data['openai'].get('reduce_fanout', config.openai_reduce_fanout)
                 
                 if data and 'browser' in data:
                     config.browser_headless = data['browser'].get('headless', config.browser_headless)
                     config.browser_timeout = data['browser'].get('timeout', config.browser_timeout)
+                    config.browser_concurrency = data['browser'].get('concurrency', config.browser_concurrency)
+                    config.browser_fast_load = data['browser'].get('fast_load', config.browser_fast_load)
+                
+                if data and 'extraction' in data:
+                    config.branch_mode = data['extraction'].get('branches', config.branch_mode)
+                    config.http_fast_path = data['extraction'].get('http_fast_path', config.http_fast_path)
+                
+                if data and 'cache' in data:
+                    config.cache_enabled = data['cache'].get('enabled', config.cache_enabled)
+                    config.cache_dir = data['cache'].get('directory', config.cache_dir)
+                    config.cache_max_size_mb = data['cache'].get('max_size_mb', config.cache_max_size_mb)
+                    config.cache_max_age_days = data['cache'].get('max_age_days', config.cache_max_age_days)
+                
+                if data and 'index' in data:
+                    config.index_enabled = data['index'].get('enabled', config.index_enabled)
+                    config.index_path = data['index'].get('path', config.index_path)
+                    config.index_tokenizer = data['index'].get('tokenizer', config.index_tokenizer)
+                
+                if data and data.get('metrics'):
+                    config.metrics_json = data['metrics'].get('json_lines', config.metrics_json)
+                    config.metrics_prometheus = data['metrics'].get('prometheus_textfile', config.metrics_prometheus)
+                
+                if data and data.get('server'):
+                    config.server_host = data['server'].get('host', config.server_host)
+                    config.server_port = data['server'].get('port', config.server_port)
+                    config.server_socket = data['server'].get('socket', config.server_socket)
+                    config.server_max_queue = data['server'].get('max_queue', config.server_max_queue)
+                    config.server_warm_browser = data['server'].get('warm_browser', config.server_warm_browser)
+                
+                if data and data.get('queue'):
+                    config.queue_path = data['queue'].get('path', config.queue_path)
+                    config.queue_max_attempts = data['queue'].get('max_attempts', config.queue_max_attempts)
+                    config.queue_retry_delay = data['queue'].get('retry_delay', config.queue_retry_delay)
+                    config.queue_max_retry_delay = data['queue'].get('max_retry_delay', config.queue_max_retry_delay)
+                    config.queue_poll_interval = data['queue'].get('poll_interval', config.queue_poll_interval)
+                
+                if data and data.get('assets'):
+                    config.assets_enabled = data['assets'].get('enabled', config.assets_enabled)
+                    config.assets_dir = data['assets'].get('directory', config.assets_dir)
+                    config.assets_max_size_mb = data['assets'].get('max_size_mb', config.assets_max_size_mb)
+                    config.assets_concurrency = data['assets'].get('concurrency', config.assets_concurrency)
+                    config.assets_search_paths = data['assets'].get('search_paths') or config.assets_search_paths
+                    config.assets_url_template = data['assets'].get('url_template', config.assets_url_template)
+                
+                if data and data.get('archive'):
+                    config.archive_enabled = data['archive'].get('enabled', config.archive_enabled)
+                    config.archive_path = data['archive'].get('path', config.archive_path)
+                    config.archive_batch_rows = data['archive'].get('batch_rows', config.archive_batch_rows)
+                
+                if data and data.get('filters'):
+                    config.filter_defaults = data['filters'].get('defaults', config.filter_defaults)
+                    config.filter_rules = data['filters'].get('rules') or config.filter_rules
                 
                 if data and 'language' in data:
                     config.insights_language = data['language'].get('insights_language', config.insights_language)
@@ -71,363 +196,4829 @@ class Config:
         config.openai_api_key = config.openai_api_key or os.environ.get("OPENAI_API_KEY")
         
         return config
+    
+    def validate(self) -> List[str]:
+        """Describe every setting that would make an export fail (empty when valid)"""
+        problems = []
+        choices = [
+            ("output.format", self.format, list(FORMAT_BACKENDS)),
+            ("output.duplicates", self.duplicates, list(DUPLICATE_MODES)),
+            ("extraction.branches", self.branch_mode, list(BRANCH_MODES)),
+            ("openai.insights_mode", self.insights_mode, ["truncate", "map_reduce"]),
+        ]
+        for name, value, allowed in choices:
+            if value not in allowed:
+                problems.append(f"{name}: {value!r} is not one of {', '.join(allowed)}")
+        
+        positive = [
+            ("browser.timeout", self.browser_timeout),
+            ("browser.concurrency", self.browser_concurrency),
+            ("openai.max_concurrency", self.openai_max_concurrency),
+            ("openai.chunk_tokens", self.openai_chunk_tokens),
+            ("openai.cache_max_size_mb", self.openai_cache_max_size_mb),
+            ("openai.cache_max_age_days", self.openai_cache_max_age_days),
+            ("queue.max_attempts", self.queue_max_attempts),
+            ("queue.retry_delay", self.queue_retry_delay),
+            ("queue.poll_interval", self.queue_poll_interval),
+            ("assets.max_size_mb", self.assets_max_size_mb),
+            ("assets.concurrency", self.assets_concurrency),
+            ("archive.batch_rows", self.archive_batch_rows),
+        ]
+        for name, value in positive:
+            if not isinstance(value, (int, float)) or value <= 0:
+                problems.append(f"{name}: must be a positive number, got {value!r}")
+        if not isinstance(self.duplicate_threshold, (int, float)) or not 0 < self.duplicate_threshold <= 1:
+            problems.append(f"output.duplicate_threshold: must be between 0 and 1, got {self.duplicate_threshold!r}")
+        if not isinstance(self.server_port, int) or not 0 < self.server_port < 65536:
+            problems.append(f"server.port: must be between 1 and 65535, got {self.server_port!r}")
+        if not isinstance(self.server_max_queue, int) or self.server_max_queue < 0:
+            problems.append(f"server.max_queue: must be 0 or more, got {self.server_max_queue!r}")
+        if self.openai_max_tokens is not None and (not isinstance(self.openai_max_tokens, int)
+                                                   or self.openai_max_tokens <= 0):
+            problems.append(f"openai.max_tokens: must be a positive integer or unset, got {self.openai_max_tokens!r}")
+        if self.openai_reduce_fanout < 2:
+            problems.append(f"openai.reduce_fanout: must be at least 2, got {self.openai_reduce_fanout!r}")
+        
+        try:
+            NoiseFilter.from_config(self)
+        except ValueError as e:
+            problems.append(f"filters.rules: {e}")
+        
+        if self.format == "obsidian" and self.obsidian_vault and not os.path.isdir(self.obsidian_vault):
+            problems.append(f"output.obsidian.vault_path: {self.obsidian_vault} does not exist")
+        return problems
 
 
 @dataclass
 class Message:
-    speaker: str  # "User" | "ChatGPT"
+    speaker: str  # "User" | "ChatGPT" | BRANCH_SPEAKER
     content: str
+    
+    @property
+    def is_marker(self) -> bool:
+        """A branch note added by linearize_mapping, not a turn of the conversation"""
+        return self.speaker == BRANCH_SPEAKER
 
 
-def extract_messages_with_playwright(url: str, config: Config) -> List[Message]:
-    """Extract messages from ChatGPT share URL using Playwright"""
+EXTRACT_JS = """
+() => {
+    // Project conversation data down to what parse_extraction_result reads,
+    // so large conversations are not serialized over the DevTools protocol
+    function compactPart(part) {
+        if (part === null || typeof part !== 'object') return part;
+        const out = {};
+        for (const key of ['content_type', 'text', 'asset_pointer', 'name', 'mime_type', 'width', 'height', 'size_bytes']) {
+            if (part[key] !== undefined) out[key] = part[key];
+        }
+        return out;
+    }
+
+    function compactMessage(msg) {
+        if (!msg) return null;
+        return {
+            author: {role: msg.author?.role},
+            content: {parts: (msg.content?.parts || []).map(compactPart)},
+            metadata: {attachments: (msg.metadata?.attachments || []).map(a => ({id: a.id, name: a.name, mime_type: a.mime_type}))},
+            create_time: msg.create_time ?? null
+        };
+    }
+
+    function compact(data) {
+        if (!data || typeof data !== 'object') return data;
+        if (data.mapping) {
+            const mapping = {};
+            for (const [id, node] of Object.entries(data.mapping)) {
+                mapping[id] = {
+                    parent: node.parent ?? null,
+                    children: node.children || [],
+                    message: compactMessage(node.message)
+                };
+            }
+            return {
+                title: data.title ?? null,
+                create_time: data.create_time ?? null,
+                update_time: data.update_time ?? null,
+                current_node: data.current_node ?? null,
+                mapping
+            };
+        }
+        if (Array.isArray(data.linear_conversation)) {
+            return {
+                title: data.title ?? null,
+                update_time: data.update_time ?? null,
+                linear_conversation: data.linear_conversation.map(item => ({message: compactMessage(item.message)}))
+            };
+        }
+        return data;
+    }
+
+    // Method 1: Extract from React Fiber
+    const root = document.querySelector('#__next');
+    if (root && root._reactRootContainer) {
+        const fiber = root._reactRootContainer._internalRoot.current;
+
+        function findData(node, depth = 0) {
+            if (depth > 50) return null;
+
+            if (node && node.memoizedProps) {
+                if (node.memoizedProps.sharedConversation) {
+                    return node.memoizedProps.sharedConversation;
+                }
+                if (node.memoizedProps.conversation) {
+                    return node.memoizedProps.conversation;
+                }
+                if (node.memoizedProps.messages) {
+                    return node.memoizedProps.messages;
+                }
+            }
+
+            if (node && node.child) {
+                const result = findData(node.child, depth + 1);
+                if (result) return result;
+            }
+
+            if (node && node.sibling) {
+                const result = findData(node.sibling, depth + 1);
+                if (result) return result;
+            }
+
+            return null;
+        }
+
+        const data = findData(fiber);
+        if (data) return compact(data);
+    }
+
+    // Method 2: Extract from __NEXT_DATA__
+    const nextDataScript = document.getElementById('__NEXT_DATA__');
+    if (nextDataScript) {
+        const data = JSON.parse(nextDataScript.textContent);
+        const props = data?.props?.pageProps;
+        if (props?.sharedConversation) {
+            return compact(props.sharedConversation);
+        }
+    }
+
+    // Method 3: Extract from window.__remixContext
+    if (window.__remixContext) {
+        const loaderData = window.__remixContext?.state?.loaderData;
+        for (const key in loaderData) {
+            if (loaderData[key]?.sharedConversation) {
+                return compact(loaderData[key].sharedConversation);
+            }
+        }
+    }
+
+    // Method 4: Extract from DOM elements
+    const elements = [];
+
+    const selectors = [
+        '[data-message-author-role]',
+        '[data-testid*="conversation-turn"]',
+        '.text-message',
+        '.markdown',
+        'article'
+    ];
+
+    for (const selector of selectors) {
+        const found = document.querySelectorAll(selector);
+        if (found.length > 0) {
+            found.forEach(el => {
+                const text = el.innerText || el.textContent;
+                const role = el.getAttribute('data-message-author-role') || 
+                            (el.className.includes('user') ? 'user' : 'assistant');
+                if (text && text.trim()) {
+                    elements.push({role, text: text.trim()});
+                }
+            });
+            if (elements.length > 0) break;
+        }
+    }
+
+    if (elements.length > 0) {
+        return {dom_elements: elements};
+    }
+
+    return null;
+}
+"""
+
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+VIEWPORT = {"width": 1920, "height": 1080}
+
+# Runs EXTRACT_JS and hands the result back as JSON text, which crosses the
+# DevTools protocol far more cheaply than a structured object. Results
+# longer than the chunk size are left in the page and read in slices.
+PAYLOAD_JS = """
+(chunkSize) => {
+    const data = (""" + EXTRACT_JS.strip() + """)();
+    const json = JSON.stringify(data ?? null);
+    if (json.length <= chunkSize) {
+        return {json, length: json.length, chunks: 1};
+    }
+    window.__c2mPayload = json;
+    return {length: json.length, chunks: Math.ceil(json.length / chunkSize)};
+}
+"""
+
+PAYLOAD_CHUNK_JS = """
+([index, size]) => window.__c2mPayload.slice(index * size, (index + 1) * size)
+"""
+
+PAYLOAD_RELEASE_JS = "() => { delete window.__c2mPayload; }"
+
+PAYLOAD_CHUNK_CHARS = 4 * 1024 * 1024
+
+
+def evaluate_payload(page, timing: Optional[LoadTiming] = None) -> Any:
+    """Run PAYLOAD_JS on a sync Playwright page and decode the result"""
+    head = page.evaluate(PAYLOAD_JS, PAYLOAD_CHUNK_CHARS)
+    if head['chunks'] == 1:
+        text = head['json']
+    else:
+        text = "".join(page.evaluate(PAYLOAD_CHUNK_JS, [i, PAYLOAD_CHUNK_CHARS])
+                       for i in range(head['chunks']))
+        page.evaluate(PAYLOAD_RELEASE_JS)
+    if timing:
+        timing.payload_chars = head['length']
+        timing.payload_chunks = head['chunks']
+    return json.loads(text)
+
+
+async def evaluate_payload_async(page, timing: Optional[LoadTiming] = None) -> Any:
+    """Run PAYLOAD_JS on an async Playwright page and decode the result"""
+    head = await page.evaluate(PAYLOAD_JS, PAYLOAD_CHUNK_CHARS)
+    if head['chunks'] == 1:
+        text = head['json']
+    else:
+        parts = []
+        for i in range(head['chunks']):
+            parts.append(await page.evaluate(PAYLOAD_CHUNK_JS, [i, PAYLOAD_CHUNK_CHARS]))
+        text = "".join(parts)
+        await page.evaluate(PAYLOAD_RELEASE_JS)
+    if timing:
+        timing.payload_chars = head['length']
+        timing.payload_chunks = head['chunks']
+    return json.loads(text)
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    url: str
+
+
+class HttpFetcher:
+    """Minimal HTTP client that keeps one persistent connection per host and thread"""
     
-    messages = []
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+    
+    def __init__(self, timeout: float = 30.0, max_redirects: int = 5):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._local = threading.local()
+        # Every thread's connections, so close() reaches those of executor threads too
+        self._pools: List[Dict[Tuple[str, str], http.client.HTTPConnection]] = []
+        self._pools_lock = threading.Lock()
+    
+    def _pool(self) -> Dict[Tuple[str, str], http.client.HTTPConnection]:
+        pool = getattr(self._local, 'connections', None)
+        if pool is None:
+            pool = self._local.connections = {}
+            with self._pools_lock:
+                self._pools.append(pool)
+        return pool
+    
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        import http.client
+        
+        pool = self._pool()
+        conn = pool.get((scheme, netloc))
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(netloc, timeout=self.timeout)
+            with self._pools_lock:
+                pool[(scheme, netloc)] = conn
+        return conn
+    
+    def _discard(self, scheme: str, netloc: str) -> None:
+        pool = self._pool()
+        with self._pools_lock:
+            conn = pool.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+    
+    def close(self) -> None:
+        """Close the connections of every thread that used this fetcher"""
+        with self._pools_lock:
+            connections = [conn for pool in self._pools for conn in pool.values()]
+            for pool in self._pools:
+                pool.clear()
+        for conn in connections:
+            conn.close()
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+            max_bytes: Optional[int] = None) -> HttpResponse:
+        """GET url, following redirects; raises ValueError if the body exceeds max_bytes"""
+        import http.client
+        
+        request_headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Accept-Encoding": "gzip",
+        }
+        request_headers.update(headers or {})
+        
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            
+            for attempt in range(2):
+                conn = self._connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request("GET", path, headers=request_headers)
+                    response = conn.getresponse()
+                    break
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    # The server closed an idle keep-alive connection; reconnect once
+                    self._discard(parts.scheme, parts.netloc)
+                    if attempt:
+                        raise
+            
+            location = response.getheader("Location")
+            if response.status in self.REDIRECT_STATUSES and location:
+                response.read()
+                url = urljoin(url, location)
+                continue
+            
+            # max_bytes limits the decoded body, which is what is kept in memory
+            decoder = None
+            if response.getheader("Content-Encoding") == "gzip":
+                import zlib
+                
+                decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            declared = response.getheader("Content-Length")
+            if max_bytes and declared and not decoder and int(declared) > max_bytes:
+                self._discard(parts.scheme, parts.netloc)
+                raise ValueError(f"Response from {url} is larger than {max_bytes} bytes")
+            
+            chunks = []
+            size = 0
+            while True:
+                data = response.read(65536)
+                chunk = data
+                if decoder:
+                    # Never inflate more than one byte past the limit, however well the data compresses
+                    limit = max_bytes + 1 - size if max_bytes else 0
+                    chunk = decoder.decompress(data, limit) if data else decoder.flush()
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    self._discard(parts.scheme, parts.netloc)
+                    raise ValueError(f"Response from {url} is larger than {max_bytes} bytes")
+                chunks.append(chunk)
+                if not data:
+                    break
+            body = b"".join(chunks)
+            
+            if response.getheader("Connection", "").lower() == "close":
+                self._discard(parts.scheme, parts.netloc)
+            
+            return HttpResponse(response.status, {k.lower(): v for k, v in response.getheaders()}, body, url)
+        
+        raise ValueError(f"Too many redirects for {url}")
+
+
+NEXT_DATA_RE = re.compile(r'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+REMIX_CONTEXT_RE = re.compile(r'window\.__remixContext\s*=\s*')
+
+
+def parse_share_html(html: str) -> Optional[Dict[str, Any]]:
+    """The sharedConversation embedded in server-rendered share page HTML, if present
+    
+    Reads the same sources as methods 2 and 3 of EXTRACT_JS.
+    """
+    match = NEXT_DATA_RE.search(html)
+    if match:
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            data = None
+        conversation = ((data or {}).get('props') or {}).get('pageProps', {}).get('sharedConversation')
+        if conversation:
+            return conversation
+    
+    match = REMIX_CONTEXT_RE.search(html)
+    if match:
+        try:
+            context, _ = json.JSONDecoder().raw_decode(html, match.end())
+        except ValueError:
+            return None
+        loader_data = (context.get('state') or {}).get('loaderData') or {}
+        for value in loader_data.values():
+            if isinstance(value, dict) and value.get('sharedConversation'):
+                return value['sharedConversation']
+    
+    return None
+
+
+def fetch_with_http(url: str, config: Config, fetcher: Optional[HttpFetcher] = None) -> Optional[Dict[str, Any]]:
+    """Fetch a share page without a browser and return its embedded conversation, if any"""
+    fetcher = fetcher or HttpFetcher(config.browser_timeout / 1000)
+    response = fetcher.get(url)
+    if response.status != 200:
+        return None
+    return parse_share_html(response.body.decode("utf-8", errors="replace"))
+
+
+# Resources that never carry conversation data
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+ANALYTICS_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "segment.io", "segment.com", "sentry.io", "datadoghq.com", "browser-intake-datadoghq.com",
+    "intercom.io", "intercomcdn.com", "statsig.com", "statsigapi.net", "featuregates.org",
+    "amplitude.com", "mixpanel.com", "hotjar.com", "clarity.ms", "cloudflareinsights.com",
+)
+
+# True as soon as any source EXTRACT_JS can read from is present
+READY_JS = """
+() => !!(document.getElementById('__NEXT_DATA__') || window.__remixContext ||
+         document.querySelector('[data-message-author-role]'))
+"""
+
+
+def should_block_request(resource_type: str, url: str) -> bool:
+    """Whether fast-load mode drops a request"""
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in ANALYTICS_HOSTS)
+
+
+@dataclass
+class LoadTiming:
+    """Where the time went while loading one share page"""
+    url: str
+    goto_ms: float = 0.0
+    ready_ms: float = 0.0
+    evaluate_ms: float = 0.0
+    blocked_requests: int = 0
+    payload_chars: int = 0
+    payload_chunks: int = 0
+    
+    @property
+    def total_ms(self) -> float:
+        return self.goto_ms + self.ready_ms + self.evaluate_ms
+    
+    def describe(self) -> str:
+        text = (f"{self.total_ms:.0f} ms (load {self.goto_ms:.0f}, wait {self.ready_ms:.0f}, "
+                f"extract {self.evaluate_ms:.0f})")
+        if self.payload_chars:
+            text += f", payload {self.payload_chars / 1024:.0f} KB"
+            if self.payload_chunks > 1:
+                text += f" in {self.payload_chunks} chunks"
+        if self.blocked_requests:
+            text += f", {self.blocked_requests} requests blocked"
+        return text
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def _prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics:
+    """Per-stage timings and counters for one run
+    
+    Instrumented stages report events (stage name, duration and fields such
+    as the URL, sizes or message counts). Durations and counters are
+    aggregated for the Prometheus textfile; with a JSON lines sink, every
+    event is also written out as it happens.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sink = None
+        self.durations: Dict[str, List[float]] = {}  # stage -> [count, total ms]
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+    
+    def open_json_lines(self, path: str) -> None:
+        """Append events to path (- for stderr)"""
+        self._sink = sys.stderr if path == "-" else open(os.path.expanduser(path), "a", encoding="utf-8")
+    
+    def close(self) -> None:
+        if self._sink not in (None, sys.stderr):
+            self._sink.close()
+        self._sink = None
+    
+    def event(self, stage: str, duration_ms: Optional[float] = None, **fields: Any) -> None:
+        with self._lock:
+            if duration_ms is not None:
+                total = self.durations.setdefault(stage, [0, 0.0])
+                total[0] += 1
+                total[1] += duration_ms
+            if self._sink:
+                record = {"ts": round(time.time(), 3), "stage": stage}
+                if duration_ms is not None:
+                    record["duration_ms"] = round(duration_ms, 2)
+                record.update(fields)
+                self._sink.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._sink.flush()
+    
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def take(self, name: str) -> List[Tuple[Tuple[Tuple[str, str], ...], float]]:
+        """Remove and return name's counters as (labels, value), to report them from another process"""
+        with self._lock:
+            keys = [key for key in self.counters if key[0] == name]
+            return [(key[1], self.counters.pop(key)) for key in keys]
+    
+    @contextmanager
+    def timer(self, stage: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Time a block; fields added to the yielded dict are reported with it"""
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.event(stage, _elapsed_ms(start), **fields)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Aggregates as JSON-serializable data"""
+        with self._lock:
+            stages = {stage: {"count": count, "total_ms": round(total, 2), "mean_ms": round(total / count, 2)}
+                      for stage, (count, total) in sorted(self.durations.items()) if count}
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {"stages": stages, "counters": counters}
+    
+    def prometheus(self) -> str:
+        """Aggregates in the Prometheus text exposition format"""
+        prefix = "chatgpt_to_markdown"
+        with self._lock:
+            lines = [f"# HELP {prefix}_stage_seconds Time spent in each stage during the last run",
+                     f"# TYPE {prefix}_stage_seconds summary"]
+            for stage, (count, total) in sorted(self.durations.items()):
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {total / 1000:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {count}')
+            
+            previous = None
+            for (name, labels), value in sorted(self.counters.items()):
+                if name != previous:
+                    lines.append(f"# TYPE {prefix}_{name}_total counter")
+                    previous = name
+                label_text = ",".join(f'{k}="{_prometheus_label(v)}"' for k, v in labels)
+                lines.append(f"{prefix}_{name}_total{{{label_text}}} {value:g}")
+        
+        lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+    
+    def write_prometheus(self, path: str) -> None:
+        # The node_exporter textfile collector may read at any time, so replace atomically
+        path = Path(os.path.expanduser(path))
+        tmp_path = _temp_path_for(path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
+
+
+def _record_load_timing(timing: LoadTiming, fast_load: bool) -> None:
+    METRICS.event("page_goto", timing.goto_ms, url=timing.url, fast_load=fast_load)
+    METRICS.event("page_wait", timing.ready_ms, url=timing.url, fast_load=fast_load)
+    METRICS.event("page_evaluate", timing.evaluate_ms, url=timing.url, payload_chars=timing.payload_chars,
+                  payload_chunks=timing.payload_chunks, blocked_requests=timing.blocked_requests)
+    METRICS.count("payload_chars", timing.payload_chars)
+    METRICS.count("blocked_requests", timing.blocked_requests)
+
+
+def fetch_with_playwright(url: str, config: Config) -> Any:
+    """Load a share page and return the raw object produced by EXTRACT_JS"""
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+    from playwright.sync_api import sync_playwright
+    
+    result = None
+    timing = LoadTiming(url)
     
     with sync_playwright() as p:
         print("🌐 Launching browser...")
-        browser = p.chromium.launch(headless=config.browser_headless)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-            viewport={"width": 1920, "height": 1080}
-        )
+        with METRICS.timer("browser_launch", headless=config.browser_headless):
+            browser = p.chromium.launch(headless=config.browser_headless)
+        context = browser.new_context(user_agent=USER_AGENT, viewport=VIEWPORT)
         page = context.new_page()
         
+        if config.browser_fast_load:
+            def block(route):
+                if should_block_request(route.request.resource_type, route.request.url):
+                    timing.blocked_requests += 1
+                    route.abort()
+                else:
+                    route.continue_()
+            page.route("**/*", block)
+        
         try:
             print(f"📍 Accessing URL: {url}")
-            page.goto(url, wait_until="networkidle", timeout=config.browser_timeout)
-            
-            print("⏳ Waiting for page to load...")
-            page.wait_for_timeout(3000)
-            
-            print("🔍 Extracting conversation data...")
-            js_script = """
-            () => {
-                // Method 1: Extract from React Fiber
-                const root = document.querySelector('#__next');
-                if (root && root._reactRootContainer) {
-                    const fiber = root._reactRootContainer._internalRoot.current;
-                    
-                    function findData(node, depth = 0) {
-                        if (depth > 50) return null;
-                        
-                        if (node && node.memoizedProps) {
-                            if (node.memoizedProps.sharedConversation) {
-                                return node.memoizedProps.sharedConversation;
-                            }
-                            if (node.memoizedProps.conversation) {
-                                return node.memoizedProps.conversation;
-                            }
-                            if (node.memoizedProps.messages) {
-                                return node.memoizedProps.messages;
-                            }
-                        }
-                        
-                        if (node && node.child) {
-                            const result = findData(node.child, depth + 1);
-                            if (result) return result;
-                        }
-                        
-                        if (node && node.sibling) {
-                            const result = findData(node.sibling, depth + 1);
-                            if (result) return result;
-                        }
-                        
-                        return null;
-                    }
-                    
-                    const data = findData(fiber);
-                    if (data) return data;
-                }
-                
-                // Method 2: Extract from __NEXT_DATA__
-                const nextDataScript = document.getElementById('__NEXT_DATA__');
-                if (nextDataScript) {
-                    const data = JSON.parse(nextDataScript.textContent);
-                    const props = data?.props?.pageProps;
-                    if (props?.sharedConversation) {
-                        return props.sharedConversation;
-                    }
-                }
-                
-                // Method 3: Extract from window.__remixContext
-                if (window.__remixContext) {
-                    const loaderData = window.__remixContext?.state?.loaderData;
-                    for (const key in loaderData) {
-                        if (loaderData[key]?.sharedConversation) {
-                            return loaderData[key].sharedConversation;
-                        }
-                    }
-                }
-                
-                // Method 4: Extract from DOM elements
-                const elements = [];
+            start = time.perf_counter()
+            if config.browser_fast_load:
+                page.goto(url, wait_until="domcontentloaded", timeout=config.browser_timeout)
+                timing.goto_ms = _elapsed_ms(start)
                 
-                const selectors = [
-                    '[data-message-author-role]',
-                    '[data-testid*="conversation-turn"]',
-                    '.text-message',
-                    '.markdown',
-                    'article'
-                ];
+                print("⏳ Waiting for conversation data...")
+                start = time.perf_counter()
+                try:
+                    page.wait_for_function(READY_JS, timeout=config.browser_timeout)
+                except PlaywrightTimeoutError:
+                    print("⚠️ Conversation data not detected, extracting anyway")
+                timing.ready_ms = _elapsed_ms(start)
+            else:
+                page.goto(url, wait_until="networkidle", timeout=config.browser_timeout)
+                timing.goto_ms = _elapsed_ms(start)
                 
-                for (const selector of selectors) {
-                    const found = document.querySelectorAll(selector);
-                    if (found.length > 0) {
-                        found.forEach(el => {
-                            const text = el.innerText || el.textContent;
-                            const role = el.getAttribute('data-message-author-role') || 
-                                        (el.className.includes('user') ? 'user' : 'assistant');
-                            if (text && text.trim()) {
-                                elements.push({role, text: text.trim()});
-                            }
-                        });
-                        if (elements.length > 0) break;
-                    }
-                }
-                
-                if (elements.length > 0) {
-                    return {dom_elements: elements};
-                }
-                
-                return null;
-            }
-            """
+                print("⏳ Waiting for page to load...")
+                start = time.perf_counter()
+                page.wait_for_timeout(3000)
+                timing.ready_ms = _elapsed_ms(start)
             
-            result = page.evaluate(js_script)
+            print("🔍 Extracting conversation data...")
+            start = time.perf_counter()
+            result = evaluate_payload(page, timing)
+            timing.evaluate_ms = _elapsed_ms(start)
             
             if result:
                 print(f"✅ Data extracted successfully")
-                
-                # Process DOM elements
-                if isinstance(result, dict) and 'dom_elements' in result:
-                    for elem in result['dom_elements']:
-                        text = elem['text']
-                        role = elem.get('role', 'assistant')
-                        
-                        if not is_ui_text(text):
-                            speaker = "User" if role == "user" else "ChatGPT"
-                            messages.append(Message(speaker, text))
-                
-                # Process mapping data
-                elif isinstance(result, dict) and 'mapping' in result:
-                    mapping = result['mapping']
-                    nodes = []
-                    
-                    for node_id, node in mapping.items():
-                        if 'message' in node and node['message']:
-                            msg = node['message']
-                            role = msg.get('author', {}).get('role', 'assistant')
-                            parts = msg.get('content', {}).get('parts', [])
-                            create_time = msg.get('create_time', 0)
-                            
-                            content = '\n'.join([str(p) for p in parts if p])
-                            speaker = "User" if role == "user" else "ChatGPT"
-                            
-                            if content and not is_ui_text(content):
-                                nodes.append((create_time, Message(speaker, content)))
-                    
-                    nodes.sort(key=lambda x: x[0])
-                    messages = [msg for _, msg in nodes]
-                
-                # Process linear conversation data
-                elif isinstance(result, dict) and 'linear_conversation' in result:
-                    for item in result['linear_conversation']:
-                        if 'message' in item:
-                            msg = item['message']
-                            role = msg.get('author', {}).get('role', 'assistant')
-                            content = msg.get('content', {}).get('parts', [''])[0]
-                            speaker = "User" if role == "user" else "ChatGPT"
-                            if content and not is_ui_text(content):
-                                messages.append(Message(speaker, content))
-            
-            print(f"📊 Extracted {len(messages)} messages")
+            print(f"⏱️  Page load: {timing.describe()}")
+            _record_load_timing(timing, config.browser_fast_load)
             
         finally:
             browser.close()
             print("🔒 Browser closed")
     
+    return result
+
+
+def _parse_recorded(result: Any, config: Config, url: str) -> List[Message]:
+    with METRICS.timer("parse", url=url) as fields:
+        messages = parse_extraction_result(result, config.branch_mode, NoiseFilter.from_config(config))
+        fields["messages"] = len(messages)
     return messages
 
 
-def is_ui_text(text: str) -> bool:
-    """Check if text is UI element text"""
-    ui_patterns = [
-        "Login", "Sign up", "Terms of Use", "Privacy Policy",
-        "Continue with", "Email address", "Welcome back",
-        "Create your account", "Remember me", "Don't have an account"
-    ]
-    return any(pattern in text for pattern in ui_patterns)
+def _record_extraction(url: str, method: str, messages: List[Message], start: float) -> None:
+    METRICS.event("extract", _elapsed_ms(start), url=url, method=method, messages=len(messages))
+    METRICS.count("extractions", method=method if messages else "failed")
 
 
-def generate_insights_and_tags(messages: List[Message], config: Config) -> Tuple[List[str], List[str]]:
-    """Generate insights and tags using OpenAI API"""
-    if not config.openai_api_key:
-        return [], []
+def extract_messages_with_playwright(url: str, config: Config) -> List[Message]:
+    """Extract messages from ChatGPT share URL using Playwright"""
+    start = time.perf_counter()
+    result = fetch_with_playwright(url, config)
+    messages = _parse_recorded(result, config, url)
+    _record_extraction(url, "playwright", messages, start)
+    print(f"📊 Extracted {len(messages)} messages")
+    return messages
+
+
+def exported_before(url: str, config: Config, is_blog: bool = False) -> bool:
+    """Whether url was exported to its output directory before, so a re-export may find new turns"""
+    if not config.incremental:
+        return False
+    return ExportManifest.for_directory(resolve_output_dir(config, is_blog)).get(share_id_from_url(url)) is not None
+
+
+def _cached_messages(cache: ExtractionCache, url: str, config: Config, parse: Callable[[Any], List[Message]],
+                     current: Optional[Dict[str, Any]], revalidate: bool) -> Optional[List[Message]]:
+    """Cached messages for url, if they are known to be current
     
-    try:
-        from openai import OpenAI
+    ``current`` is the conversation just read over HTTP, if any; the cache
+    is only used if it was extracted from the same ``update_time``.
+    Without it there is nothing cheap to compare with, so the cache is
+    trusted unless ``revalidate`` is set.
+    """
+    if current is not None:
+        update_time = current.get('update_time') if isinstance(current, dict) else None
+        messages = cache.get(share_id_from_url(url), parse_key(config), parse, update_time) if update_time else None
+    elif revalidate:
+        messages = None
+    else:
+        messages = cache.get(share_id_from_url(url), parse_key(config), parse)
+    METRICS.count("cache_lookups", result="miss" if messages is None else "hit")
+    return messages
+
+
+def extract_messages(url: str, config: Config, cache: Optional[ExtractionCache] = None,
+                     refresh: bool = False, revalidate: bool = False) -> List[Message]:
+    """Extract messages, trying plain HTTP (or the cache when it is current), then the browser
+    
+    ``revalidate`` makes the cache serve only extractions whose
+    ``update_time`` was confirmed over HTTP, e.g. for a URL exported before.
+    """
+    import http.client
+    
+    share_id = share_id_from_url(url)
+    parse = lambda raw: _parse_recorded(raw, config, url)
+    start = time.perf_counter()
+    
+    result = None
+    messages = []
+    method = "http"
+    if config.http_fast_path:
+        try:
+            with METRICS.timer("http_fetch", url=url) as fields:
+                result = fetch_with_http(url, config)
+                fields["embedded_data"] = result is not None
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            print(f"⚠️ HTTP fetch failed: {e}")
+    
+    if cache and not refresh:
+        cached = _cached_messages(cache, url, config, parse, result, revalidate)
+        if cached is not None:
+            print(f"⚡ Using cached extraction ({len(cached)} messages)")
+            _record_extraction(url, "cache", cached, start)
+            return cached
+    
+    if config.http_fast_path:
+        messages = parse(result) if result else []
+        if messages:
+            print("⚡ Conversation read from page HTML, no browser needed")
+        else:
+            METRICS.count("http_fallbacks")
+    
+    if not messages:
+        result = fetch_with_playwright(url, config)
+        messages = parse(result)
+        method = "playwright"
+    print(f"📊 Extracted {len(messages)} messages")
+    _record_extraction(url, method, messages, start)
+    
+    if cache and messages:
+        cache.put(share_id, result, parse_key(config), messages)
+    return messages
+
+
+EXTRACTION_TIERS = ("cache", "http", "playwright")
+
+
+class BrowserPool:
+    """Single Chromium instance shared by a bounded number of concurrent pages
+    
+    Share pages whose conversation is embedded in the HTML are read with a
+    pooled HTTP client first; Chromium is only launched once a page needs it.
+    """
+    
+    def __init__(self, config: Config, size: int):
+        self.config = config
+        self.size = max(1, size)
+        self._playwright = None
+        self._browser = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.timings: Dict[str, LoadTiming] = {}
+        self.tiers: Dict[str, str] = {}
+        self.http = HttpFetcher(config.browser_timeout / 1000)
+        self._launch_lock: Optional[asyncio.Lock] = None
+    
+    async def start(self) -> BrowserPool:
+        import asyncio
         
-        client = OpenAI(api_key=config.openai_api_key)
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._launch_lock = asyncio.Lock()
+        return self
+    
+    async def _ensure_browser(self) -> None:
+        async with self._launch_lock:
+            if self._browser:
+                return
+            from playwright.async_api import async_playwright
+            
+            print("🌐 Launching browser...")
+            with METRICS.timer("browser_launch", headless=self.config.browser_headless):
+                self._playwright = await async_playwright().start()
+                try:
+                    self._browser = await self._playwright.chromium.launch(headless=self.config.browser_headless)
+                except BaseException:
+                    # Stop the driver now; a retry starts a new one and would leak this one
+                    await self._playwright.stop()
+                    self._playwright = None
+                    raise
+    
+    async def close(self) -> None:
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+            print("🔒 Browser closed")
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        self.http.close()
+    
+    async def __aenter__(self) -> BrowserPool:
+        return await self.start()
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+    
+    async def fetch(self, url: str) -> Any:
+        """Load one share URL in its own browser context and return the raw EXTRACT_JS result
         
-        combined = []
-        total_chars = 0
-        for m in messages:
-            chunk = f"{m.speaker}: {m.content}\n\n"
-            combined.append(chunk)
-            total_chars += len(chunk)
-            if total_chars > 12000:
-                break
-        convo = "".join(combined)
+        The page's LoadTiming is kept in ``self.timings[url]``.
+        """
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
         
-        if len(convo) < 50:
-            return [], []
+        config = self.config
+        timing = LoadTiming(url)
+        self.timings[url] = timing
         
-        # Determine language for insights
-        lang_instruction = ""
-        if config.insights_language == "ja":
-            lang_instruction = "Return insights and tags in Japanese."
-        elif config.insights_language == "en":
-            lang_instruction = "Return insights and tags in English."
-        else:
-            lang_instruction = "Return insights and tags in the same language as the conversation."
+        async with self._semaphore:
+            await self._ensure_browser()
+            context = await self._browser.new_context(user_agent=USER_AGENT, viewport=VIEWPORT)
+            try:
+                page = await context.new_page()
+                
+                if config.browser_fast_load:
+                    async def block(route):
+                        if should_block_request(route.request.resource_type, route.request.url):
+                            timing.blocked_requests += 1
+                            await route.abort()
+                        else:
+                            await route.continue_()
+                    await page.route("**/*", block)
+                
+                start = time.perf_counter()
+                if config.browser_fast_load:
+                    await page.goto(url, wait_until="domcontentloaded", timeout=config.browser_timeout)
+                    timing.goto_ms = _elapsed_ms(start)
+                    start = time.perf_counter()
+                    try:
+                        await page.wait_for_function(READY_JS, timeout=config.browser_timeout)
+                    except PlaywrightTimeoutError:
+                        pass
+                    timing.ready_ms = _elapsed_ms(start)
+                else:
+                    await page.goto(url, wait_until="networkidle", timeout=config.browser_timeout)
+                    timing.goto_ms = _elapsed_ms(start)
+                    start = time.perf_counter()
+                    await page.wait_for_timeout(3000)
+                    timing.ready_ms = _elapsed_ms(start)
+                
+                start = time.perf_counter()
+                result = await evaluate_payload_async(page, timing)
+                timing.evaluate_ms = _elapsed_ms(start)
+                _record_load_timing(timing, config.browser_fast_load)
+                return result
+            finally:
+                await context.close()
+    
+    async def extract(self, url: str, cache: Optional[ExtractionCache] = None,
+                      refresh: bool = False, revalidate: bool = False) -> List[Message]:
+        """Extract messages from one share URL, trying plain HTTP (or the cache when it is
+        current), then the browser; see extract_messages
         
-        prompt = (
-            f"Extract key insights and tags from this ChatGPT conversation.\n"
-            f"{lang_instruction}\n"
-            "Return JSON only:\n"
-            '{"insights": ["insight1", "insight2", ...], "tags": ["#tag1", "#tag2", ...]}'
-        )
+        The tier that produced the messages is kept in ``self.tiers[url]``.
+        """
+        import asyncio
+        import http.client
         
-        response = client.chat.completions.create(
-            model=config.openai_model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that extracts insights from conversations."},
-                {"role": "user", "content": prompt + "\n\n" + convo},
-            ],
-            temperature=config.openai_temperature,
-            response_format={"type": "json_object"},
-        )
+        share_id = share_id_from_url(url)
+        parse = lambda raw: _parse_recorded(raw, self.config, url)
+        start = time.perf_counter()
         
-        text = response.choices[0].message.content or "{}"
-        data = json.loads(text)
-        insights = data.get("insights", [])
-        tags = data.get("tags", [])
+        result = None
+        messages = []
+        if self.config.http_fast_path:
+            loop = asyncio.get_running_loop()
+            fetch_start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(None, fetch_with_http, url, self.config, self.http)
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                METRICS.event("http_fetch", _elapsed_ms(fetch_start), url=url, error=type(e).__name__)
+                result = None
+            else:
+                METRICS.event("http_fetch", _elapsed_ms(fetch_start), url=url, embedded_data=result is not None)
         
-        return insights[:5], tags[:7]
+        if cache and not refresh:
+            cached = _cached_messages(cache, url, self.config, parse, result, revalidate)
+            if cached is not None:
+                self.tiers[url] = "cache"
+                _record_extraction(url, "cache", cached, start)
+                return cached
         
-    except Exception as e:
-        print(f"⚠️ API error: {e}")
-        return [], []
+        if self.config.http_fast_path:
+            messages = parse(result) if result else []
+            self.tiers[url] = "http"
+            if not messages:
+                METRICS.count("http_fallbacks")
+        
+        if not messages:
+            result = await self.fetch(url)
+            messages = parse(result)
+            self.tiers[url] = "playwright"
+        _record_extraction(url, self.tiers[url], messages, start)
+        
+        if cache and messages:
+            cache.put(share_id, result, parse_key(self.config), messages)
+        return messages
 
 
-def create_markdown(messages: List[Message], insights: List[str] = None, tags: List[str] = None, format_type: str = "standard") -> str:
-    """Create markdown content from messages"""
+def parse_extraction_result(result: Any, branch_mode: str = "active",
+                            noise: Optional[NoiseFilter] = None) -> List[Message]:
+    """Convert the object returned by EXTRACT_JS into messages, dropping those ``noise`` matches"""
+    noise = noise or NoiseFilter.default()
+    messages = []
     
-    # Extract title from first user message
-    title = "ChatGPT Conversation"
-    for m in messages:
-        if m.speaker == "User":
-            title = m.content[:100].replace("\n", " ")
-            break
+    if not result:
+        return messages
     
-    # Build markdown
-    lines = []
+    # Process DOM elements
+    if isinstance(result, dict) and 'dom_elements' in result:
+        for elem in result['dom_elements']:
+            text = elem['text']
+            role = elem.get('role', 'assistant')
+            
+            if not noise.is_noise(text):
+                speaker = "User" if role == "user" else "ChatGPT"
+                messages.append(Message(speaker, text))
     
-    if format_type == "obsidian":
-        lines.append(f"# {title}")
-        lines.append("")
-        lines.append(f"Date: {datetime.now().strftime('%Y-%m-%d')}")
-        if tags:
-            lines.append(f"Tags: {' '.join(tags)}")
-        lines.append("")
-    else:
-        lines.append(f"# {title}")
-        lines.append("")
-        lines.append(f"**Date:** {datetime.now().strftime('%Y-%m-%d')}")
-        lines.append("")
+    # Process mapping data
+    elif isinstance(result, dict) and 'mapping' in result:
+        messages = linearize_mapping(result['mapping'], result.get('current_node'), branch_mode, noise)
     
-    if insights:
-        lines.append("## Key Insights")
-        lines.append("")
-        for insight in insights:
-            lines.append(f"- {insight}")
-        lines.append("")
+    # Process linear conversation data
+    elif isinstance(result, dict) and 'linear_conversation' in result:
+        for item in result['linear_conversation']:
+            message = _node_message(item, noise)
+            if message:
+                messages.append(message)
+    
+    return messages
+
+
+BRANCH_MODES = ("active", "all", "summary")
+BRANCH_SPEAKER = "Branch"
+
+
+ASSET_LINK_RE = re.compile(r'(!?)\[([^\]\n]*)\]\(asset:([^)\s]+)\)')
+
+
+def asset_reference(source: str, name: Optional[str], image: bool) -> str:
+    """Placeholder link for an image or file that the asset stage resolves at write time"""
+    label = " ".join(re.sub(r"[\[\]]", " ", name or "").split()) or ("image" if image else "attachment")
+    return f"{'!' if image else ''}[{label}](asset:{quote(source, safe=':/')})"
+
+
+def _message_parts(parts: List[Any], attachments: List[Dict[str, Any]]) -> List[str]:
+    """Text of each content part, with images and attached files as asset references"""
+    texts = []
+    seen = set()
+    for part in parts:
+        if isinstance(part, dict):
+            pointer = part.get('asset_pointer')
+            if pointer:
+                seen.add(pointer.split("://", 1)[-1])
+                image = part.get('content_type') == 'image_asset_pointer' or \
+                    str(part.get('mime_type', '')).startswith('image/')
+                texts.append(asset_reference(pointer, part.get('name'), image))
+            elif part.get('text'):
+                texts.append(part['text'])
+        elif part:
+            texts.append(str(part))
     
-    lines.append("## Conversation")
-    lines.append("")
+    # Uploaded images are listed both as parts and as attachments
+    for attachment in attachments:
+        file_id = attachment.get('id')
+        if file_id and file_id not in seen:
+            seen.add(file_id)
+            image = str(attachment.get('mime_type') or '').startswith('image/')
+            texts.append(asset_reference(f"file-service://{file_id}", attachment.get('name'), image))
+    return texts
+
+
+def _node_message(node: Dict[str, Any], noise: Optional[NoiseFilter] = None) -> Optional[Message]:
+    """Convert a mapping node to a Message, or None if it has no visible content"""
+    msg = node.get('message')
+    if not msg:
+        return None
     
-    for i, message in enumerate(messages, 1):
-        emoji = "👤" if message.speaker == "User" else "🤖"
-        lines.append(f"### {emoji} {message.speaker}")
-        lines.append("")
-        lines.append(message.content)
-        lines.append("")
+    role = msg.get('author', {}).get('role', 'assistant')
+    parts = msg.get('content', {}).get('parts', [])
+    attachments = (msg.get('metadata') or {}).get('attachments') or []
     
-    if format_type == "blog":
-        lines.append("---")
-        lines.append("")
-        lines.append("*This conversation was exported from ChatGPT.*")
+    content = '\n'.join(_message_parts(parts, attachments))
+    speaker = "User" if role == "user" else "ChatGPT"
     
-    return "\n".join(lines)
+    if content and not (noise or NoiseFilter.default()).is_noise(content):
+        return Message(speaker, content)
+    return None
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Export ChatGPT conversations as beautiful markdown files",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  %(prog)s https://chatgpt.com/share/...
-  %(prog)s https://chatgpt.com/share/... --format obsidian
-  %(prog)s https://chatgpt.com/share/... --output ./conversations
-  %(prog)s https://chatgpt.com/share/... --config config.yaml
-  %(prog)s https://chatgpt.com/share/... --no-insights --show-browser
+def _excerpt(text: str, length: int = 80) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[:length - 1] + "…"
+
+
+def _mapping_root(mapping: Dict[str, Any]) -> Optional[str]:
+    for node_id, node in mapping.items():
+        if node.get('parent') not in mapping:
+            return node_id
+    return None
+
+
+def _active_path(mapping: Dict[str, Any], current_node: Optional[str]) -> List[str]:
+    """Node IDs from the root down to current_node
+    
+    Without a usable current_node, follow the most recent child (the last
+    one in ``children``) from the root, which is the branch ChatGPT shows.
+    """
+    if current_node not in mapping:
+        current_node = _mapping_root(mapping)
+        seen = set()
+        while current_node is not None and current_node not in seen:
+            seen.add(current_node)
+            children = [c for c in mapping[current_node].get('children', []) if c in mapping]
+            if not children:
+                break
+            current_node = children[-1]
+    
+    path = []
+    seen = set()
+    node_id = current_node
+    while node_id in mapping and node_id not in seen:
+        seen.add(node_id)
+        path.append(node_id)
+        node_id = mapping[node_id].get('parent')
+    path.reverse()
+    return path
+
+
+def linearize_mapping(mapping: Dict[str, Any], current_node: Optional[str] = None,
+                      branch_mode: str = "active", noise: Optional[NoiseFilter] = None) -> List[Message]:
+    """Turn a conversation ``mapping`` tree into an ordered message list in O(n)
+    
+    branch_mode:
+        active  - only the branch ending at current_node (what the share page shows)
+        all     - every branch, depth first, each alternative introduced by a marker
+        summary - the active branch, with a short note wherever other branches exist
+    """
+    if branch_mode not in BRANCH_MODES:
+        raise ValueError(f"Unknown branch mode: {branch_mode}")
+    
+    noise = noise or NoiseFilter.default()
+    messages = []
+    
+    if branch_mode == "all":
+        root = _mapping_root(mapping)
+        stack = [(root, None)] if root is not None else []
+        seen = set()
+        while stack:
+            node_id, marker = stack.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            if marker:
+                messages.append(marker)
+            
+            node = mapping[node_id]
+            message = _node_message(node, noise)
+            if message:
+                messages.append(message)
+            
+            children = [c for c in node.get('children', []) if c in mapping]
+            markers = [None] * len(children)
+            if len(children) > 1:
+                reply_to = f" in reply to: {_excerpt(message.content)}" if message else ""
+                markers = [Message(BRANCH_SPEAKER, f"Branch {i} of {len(children)}{reply_to}")
+                           for i in range(1, len(children) + 1)]
+            # Push in reverse so the first child is visited first
+            stack.extend(reversed(list(zip(children, markers))))
+        return messages
+    
+    path = _active_path(mapping, current_node)
+    for index, node_id in enumerate(path):
+        node = mapping[node_id]
+        message = _node_message(node, noise)
+        if message:
+            messages.append(message)
+        
+        if branch_mode == "summary":
+            chosen = path[index + 1] if index + 1 < len(path) else None
+            others = [c for c in node.get('children', []) if c in mapping and c != chosen]
+            if others and chosen is not None:
+                lines = [f"{len(others)} other branch{'es' if len(others) > 1 else ''} not shown:"]
+                for child in others:
+                    alt = _node_message(mapping[child], noise)
+                    lines.append(f"- {_excerpt(alt.content) if alt else '(empty)'}")
+                messages.append(Message(BRANCH_SPEAKER, "\n".join(lines)))
+    
+    return messages
+
+
+# Login and sign-up page text that DOM extraction picks up. Whole-message rules,
+# so real messages that merely mention these are kept
+DEFAULT_NOISE_RULES: List[Dict[str, Any]] = [
+    {"name": "auth", "ignore_case": True,
+     "text": ["Login", "Log in", "Sign up", "Sign in", "Welcome back", "Create your account",
+              "Remember me", "Email address"]},
+    {"name": "auth", "ignore_case": True,
+     "regex": r"(Continue with|Log in with|Sign (in|up) with) [\w .]{1,40}|Don't have an account\??( Sign up)?"},
+    {"name": "legal", "ignore_case": True,
+     "regex": r"(Terms of Use|Privacy Policy)(\s*[|·,&]?\s*(and\s+)?(Terms of Use|Privacy Policy))*"},
+]
+
+
+def literal_pattern(literals: List[str]) -> str:
+    """Regex matching any of literals, factored into a prefix tree
+    
+    re tries every branch of a plain alternation at every position; with
+    shared prefixes factored out it can rule out most positions on the
+    first character, which keeps a search over hundreds of literals close
+    to a single pass.
+    """
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:%s)" % "|".join(branches)
+        if '' in node:
+            return body + "?" if len(branches) == 1 and len(branches[0]) == 1 else "(?:%s)?" % body
+        return body
+    
+    return emit(trie)
+
+
+def scope_leading_flags(pattern: str) -> str:
+    """pattern with its leading global flags, e.g. ``(?i)``, scoped to it as ``(?i:...)``
+    
+    Global flags are only allowed at the start of a whole expression, so a
+    pattern using them can't be embedded in a larger one as it is.
+    """
+    flags = ""
+    match = re.match(r"\(\?([aiLmsux]+)\)", pattern)
+    while match:
+        flags += match.group(1)
+        pattern = pattern[match.end():]
+        match = re.match(r"\(\?([aiLmsux]+)\)", pattern)
+    return f"(?{flags}:{pattern})" if flags else pattern
+
+
+class NoiseFilter:
+    """Drops extracted text that is page chrome rather than conversation
+    
+    Rules come from ``filters.rules`` in the configuration (after the
+    built-in DEFAULT_NOISE_RULES unless ``filters.defaults`` is false). A
+    rule has a literal ``text`` (or a list of them) or a ``regex``; by
+    default it must match the whole message, ignoring surrounding
+    whitespace, or anywhere in it with ``match: substring``.
+    
+    Rules are compiled once into a single-pass check: whole-message
+    literals become dict lookups and whole-message regexes one alternation
+    matched at the start of the message only. Substring literals become a
+    prefix tree (see literal_pattern) searched together with the substring
+    regexes in one pattern, with a named group per regex rule to tell which
+    one matched. Leading global flags such as ``(?i)`` are scoped to their
+    rule; regexes with named groups or group references, or that still
+    can't be combined, are matched one by one. Dropped messages are counted
+    per rule (the ``filtered`` counter).
+    """
+    
+    _instances: Dict[str, NoiseFilter] = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.fingerprint = hashlib.sha1(json.dumps(rules, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self._exact: Dict[str, str] = {}
+        self._exact_folded: Dict[str, str] = {}
+        self._max_exact = 0
+        self._literals: Dict[str, str] = {}
+        self._literals_folded: Dict[str, str] = {}
+        self._folded_names: Dict[str, str] = {}  # casefolded ignore_case literal -> rule name
+        self._names: Dict[str, str] = {}  # regex group -> rule name
+        self._separate: List[Tuple[re.Pattern, bool, str]] = []  # (pattern, whole, rule name)
+        alternatives: Dict[str, List[str]] = {'whole': [], 'substring': []}
+        combined: Dict[str, List[Tuple[re.Pattern, bool, str]]] = {'whole': [], 'substring': []}
+        
+        for number, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise ValueError(f"{rule!r}: expected a mapping")
+            match = rule.get('match', 'whole')
+            if match not in alternatives:
+                raise ValueError(f"{rule!r}: match must be whole or substring")
+            ignore_case = bool(rule.get('ignore_case', False))
+            
+            if 'regex' in rule:
+                name = str(rule.get('name') or str(rule['regex'])[:40])
+                try:
+                    compiled = re.compile(rule['regex'], re.IGNORECASE if ignore_case else 0)
+                except (re.error, TypeError) as e:
+                    raise ValueError(f"rule {name!r}: invalid regex {rule['regex']!r}: {e}")
+                separate = (compiled, match == 'whole', name)
+                if compiled.groupindex or (compiled.groups and re.search(r"\\\d|\(\?P=|\(\?\(", rule['regex'])):
+                    # Named groups could clash with the combined pattern's, and
+                    # group references would be renumbered inside it
+                    self._separate.append(separate)
+                    continue
+                pattern = scope_leading_flags(rule['regex'])
+                combined[match].append(separate)
+            elif 'text' in rule:
+                texts = rule['text'] if isinstance(rule['text'], list) else [rule['text']]
+                if not texts or not all(isinstance(t, str) and t.strip() for t in texts):
+                    raise ValueError(f"{rule!r}: text must be a non-empty string or list of strings")
+                name = str(rule.get('name') or texts[0][:40])
+                if match == 'whole':
+                    for text in texts:
+                        exact = self._exact_folded if ignore_case else self._exact
+                        key = text.strip().casefold() if ignore_case else text.strip()
+                        exact.setdefault(key, name)
+                        self._max_exact = max(self._max_exact, len(key))
+                    continue
+                for text in texts:
+                    (self._literals_folded if ignore_case else self._literals).setdefault(text, name)
+                    if ignore_case:
+                        self._folded_names.setdefault(text.casefold(), name)
+                continue
+            else:
+                raise ValueError(f"{rule!r}: needs text or regex")
+            
+            group = f"r{number}"
+            self._names[group] = name
+            alternatives[match].append(f"(?P<{group}>{'(?i:' if ignore_case else '(?:'}{pattern}))")
+        
+        whole, substring = alternatives['whole'], alternatives['substring']
+        if self._literals_folded:
+            substring.insert(0, f"(?P<folded>(?i:{literal_pattern(list(self._literals_folded))}))")
+        if self._literals:
+            substring.insert(0, f"(?P<literal>{literal_pattern(list(self._literals))})")
+        self._whole = self._substring = None
+        try:
+            self._whole = re.compile(r"\s*(?:%s)\s*" % "|".join(whole)) if whole else None
+        except re.error:
+            # e.g. a verbose rule whose trailing comment swallows the rest; match them one by one
+            self._separate.extend(combined['whole'])
+        try:
+            self._substring = re.compile("|".join(substring)) if substring else None
+        except re.error:
+            literals = substring[:len(substring) - len(combined['substring'])]
+            self._substring = re.compile("|".join(literals)) if literals else None
+            self._separate.extend(combined['substring'])
+    
+    @classmethod
+    def from_config(cls, config: Config) -> NoiseFilter:
+        """Shared filter for config's rules (compiled once per set of rules)"""
+        rules = (DEFAULT_NOISE_RULES if config.filter_defaults else []) + list(config.filter_rules)
+        key = json.dumps(rules, sort_keys=True, default=str)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(rules)
+            return cls._instances[key]
+    
+    @classmethod
+    def default(cls) -> NoiseFilter:
+        return cls.from_config(Config())
+    
+    def match(self, text: str) -> Optional[str]:
+        """Name of the first rule that matches text, or None"""
+        # strip() returns text itself when there is nothing to strip, so long messages aren't copied
+        stripped = text.strip()
+        if len(stripped) <= self._max_exact:
+            name = self._exact.get(stripped) or self._exact_folded.get(stripped.casefold())
+            if name:
+                return name
+        
+        found = self._whole.fullmatch(text) if self._whole else None
+        if found is None and self._substring:
+            found = self._substring.search(text)
+        if found:
+            if found.lastgroup == 'literal':
+                return self._literals[found.group()]
+            if found.lastgroup == 'folded':
+                return self._folded_name(found.group())
+            return self._names[found.lastgroup]
+        
+        for pattern, whole, name in self._separate:
+            if (pattern.fullmatch(stripped) if whole else pattern.search(text)):
+                return name
+        return None
+    
+    def _folded_name(self, matched: str) -> str:
+        """Rule name for text matched by the ignore_case literals"""
+        name = self._folded_names.get(matched.casefold())
+        if name is None:
+            # re's case-insensitive matching and casefold() disagree on a few characters
+            name = next((name for literal, name in self._literals_folded.items()
+                         if re.fullmatch(re.escape(literal), matched, re.IGNORECASE)),
+                        next(iter(self._literals_folded.values())))
+        return name
+    
+    def is_noise(self, text: str) -> bool:
+        name = self.match(text)
+        if name is None:
+            return False
+        METRICS.count("filtered", rule=name)
+        return True
+
+
+# Bump when parse_extraction_result output changes, so cached messages are re-parsed
+PARSER_VERSION = 2
+
+
+def parse_key(config: Config) -> str:
+    """Key for the cached messages parsed with config's extraction settings"""
+    return f"{config.branch_mode}-v{PARSER_VERSION}-{NoiseFilter.from_config(config).fingerprint[:12]}"
+
+
+def share_id_from_url(url: str) -> str:
+    """Stable identifier for a share URL (the share ID, or a hash for other URLs)"""
+    match = re.search(r"/share/(?:e/)?([A-Za-z0-9-]+)", url)
+    if match:
+        return match.group(1)
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    share_id TEXT PRIMARY KEY,
+    object TEXT NOT NULL,
+    update_time TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_object ON entries (object);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+"""
+
+
+class ExtractionCache:
+    """On-disk cache of raw extraction results and the messages parsed from them
+    
+    Raw results are stored content-addressed under ``objects/`` and a
+    SQLite index maps each share ID to the object and ``update_time`` of
+    the most recent extraction. Parsed messages are kept next to the raw
+    object per parse key (e.g. branch mode), so other settings can be
+    re-parsed from the raw result without opening a browser.
+    """
+    
+    def __init__(self, directory: str, max_size_mb: float = 500, max_age_days: float = 30):
+        self.directory = Path(directory).expanduser()
+        self.objects_dir = self.directory / "objects"
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the batch and server threads, serialized by _lock
+        self.conn = sqlite3.connect(str(self.directory / "index.db"), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(CACHE_SCHEMA)
+        self._import_json_index(self.directory / "index.json")
+    
+    @classmethod
+    def from_config(cls, config: Config) -> Optional[ExtractionCache]:
+        if not config.cache_enabled:
+            return None
+        return cls(str(data_path(config, config.cache_dir, "cache")), config.cache_max_size_mb,
+                   config.cache_max_age_days)
+    
+    def _import_json_index(self, path: Path) -> None:
+        """Carry entries over from the JSON index earlier versions rewrote on every lookup"""
+        if not path.exists():
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    [(share_id, e['object'], json.dumps(e.get('update_time')), e.get('size', 0),
+                      e['stored_at'], e.get('accessed_at', e['stored_at'])) for share_id, e in entries.items()])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+        try:
+            path.unlink()
+        except OSError:
+            pass
+    
+    def _object_path(self, digest: str, suffix: str = "raw") -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.{suffix}.json"
+    
+    def get(self, share_id: str, parse_key: str, parse: Callable[[Any], List[Message]],
+            update_time: Any = None) -> Optional[List[Message]]:
+        """Cached messages for share_id, or None on a miss or expired entry
+        
+        With ``update_time`` (the conversation's current one), an entry
+        extracted from another version of the conversation is a miss too.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT object, update_time, stored_at FROM entries WHERE share_id = ?",
+                                    (share_id,)).fetchone()
+            if not row:
+                return None
+            digest, cached_update_time, stored_at = row
+            if self.max_age and time.time() - stored_at > self.max_age:
+                return None
+            if update_time is not None and json.dumps(update_time) != cached_update_time:
+                return None
+            
+            messages_path = self._object_path(digest, f"messages-{parse_key}")
+            added = 0
+            try:
+                if messages_path.exists():
+                    with open(messages_path, 'r', encoding='utf-8') as f:
+                        messages = [Message(**m) for m in json.load(f)]
+                else:
+                    with open(self._object_path(digest), 'r', encoding='utf-8') as f:
+                        messages = parse(json.load(f))
+                    _write_json_atomic(messages_path, [asdict(m) for m in messages])
+                    added = messages_path.stat().st_size
+            except (OSError, ValueError, TypeError):
+                with self.conn:
+                    self.conn.execute("DELETE FROM entries WHERE share_id = ?", (share_id,))
+                return None
+            
+            with self.conn:
+                self.conn.execute("UPDATE entries SET accessed_at = ?, size = size + ? WHERE share_id = ?",
+                                  (time.time(), added, share_id))
+            return messages
+    
+    def put(self, share_id: str, raw: Any, parse_key: str, messages: List[Message]) -> None:
+        """Store a raw extraction result and its parsed messages"""
+        payload = json.dumps(raw, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        
+        with self._lock:
+            raw_path = self._object_path(digest)
+            if not raw_path.exists():
+                raw_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = raw_path.with_name(raw_path.name + ".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, raw_path)
+            messages_path = self._object_path(digest, f"messages-{parse_key}")
+            _write_json_atomic(messages_path, [asdict(m) for m in messages])
+            
+            previous = self.conn.execute("SELECT object FROM entries WHERE share_id = ?", (share_id,)).fetchone()
+            now = time.time()
+            update_time = raw.get('update_time') if isinstance(raw, dict) else None
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                                  (share_id, digest, json.dumps(update_time),
+                                   raw_path.stat().st_size + messages_path.stat().st_size, now, now))
+            if previous and previous[0] != digest:
+                self._remove_object_if_unused(previous[0])
+            self._evict()
+    
+    def close(self) -> None:
+        self.conn.close()
+    
+    def _remove_object_if_unused(self, digest: str) -> None:
+        if self.conn.execute("SELECT 1 FROM entries WHERE object = ? LIMIT 1", (digest,)).fetchone():
+            return
+        for path in self._object_path(digest).parent.glob(f"{digest}.*"):
+            path.unlink()
+    
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under the size limit"""
+        if self.max_age:
+            expired = self.conn.execute("SELECT share_id, object FROM entries WHERE stored_at < ?",
+                                        (time.time() - self.max_age,)).fetchall()
+            self._remove(expired)
+        
+        if not self.max_size:
+            return
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for share_id, digest, size in self.conn.execute(
+                "SELECT share_id, object, size FROM entries ORDER BY accessed_at"):
+            if total <= self.max_size:
+                break
+            evicted.append((share_id, digest))
+            total -= size
+        self._remove(evicted)
+    
+    def _remove(self, entries: List[Tuple[str, str]]) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM entries WHERE share_id = ?", [(e[0],) for e in entries])
+        for digest in {e[1] for e in entries}:
+            self._remove_object_if_unused(digest)
+
+
+def _temp_path_for(path: Path) -> Path:
+    """Unique temporary file next to path, so concurrent writers never share one"""
+    import tempfile
+    
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    return Path(tmp_name)
+
+
+def _write_json_atomic(path: Path, data: Any) -> None:
+    """Write JSON to path via a temporary file and rename"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = _temp_path_for(path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+INSIGHTS_SYSTEM_PROMPT = "You are a helpful assistant that extracts insights from conversations."
+
+
+def _language_instruction(config: Config) -> str:
+    if config.insights_language == "ja":
+        return "Return insights and tags in Japanese."
+    elif config.insights_language == "en":
+        return "Return insights and tags in English."
+    return "Return insights and tags in the same language as the conversation."
+
+
+def build_insights_prompt(messages: List[Message], config: Config) -> Optional[str]:
+    """Prompt for the insights request, or None if the conversation is too short"""
+    combined = []
+    total_chars = 0
+    for m in messages:
+        if m.is_marker:
+            continue
+        chunk = f"{m.speaker}: {m.content}\n\n"
+        combined.append(chunk)
+        total_chars += len(chunk)
+        if total_chars > 12000:
+            break
+    convo = "".join(combined)
+    
+    if len(convo) < 50:
+        return None
+    
+    prompt = (
+        f"Extract key insights and tags from this ChatGPT conversation.\n"
+        f"{_language_instruction(config)}\n"
+        "Return JSON only:\n"
+        '{"insights": ["insight1", "insight2", ...], "tags": ["#tag1", "#tag2", ...]}'
+    )
+    return prompt + "\n\n" + convo
+
+
+def chunk_transcript(messages: List[Message], max_tokens: int) -> List[str]:
+    """Split the full transcript into chunks of roughly ``max_tokens`` tokens
+    
+    Tokens are estimated at four characters each. Messages are kept whole
+    where possible; a message longer than a chunk is split across chunks.
+    """
+    max_chars = max(1, max_tokens) * 4
+    chunks = []
+    current = []
+    size = 0
+    
+    for m in messages:
+        if m.is_marker:
+            continue
+        text = f"{m.speaker}: {m.content}\n\n"
+        while text:
+            room = max_chars - size
+            if len(text) > room and current:
+                chunks.append("".join(current))
+                current, size = [], 0
+                continue
+            piece, text = text[:max_chars], text[max_chars:]
+            current.append(piece)
+            size += len(piece)
+    
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def build_map_prompt(chunk: str, index: int, total: int, config: Config) -> str:
+    return (
+        f"This is part {index} of {total} of a ChatGPT conversation.\n"
+        "Extract the key insights and tags from this part.\n"
+        f"{_language_instruction(config)}\n"
+        "Return JSON only:\n"
+        '{"insights": ["insight1", "insight2", ...], "tags": ["#tag1", "#tag2", ...]}'
+        "\n\n" + chunk
+    )
+
+
+def build_reduce_prompt(partials: List[Tuple[List[str], List[str]]], config: Config) -> str:
+    parts = [{"part": i, "insights": insights, "tags": tags}
+             for i, (insights, tags) in enumerate(partials, 1)]
+    return (
+        "Below are insights and tags extracted from consecutive parts of one ChatGPT conversation.\n"
+        "Merge them into the 5 most important insights and 7 most relevant tags for the whole conversation.\n"
+        f"{_language_instruction(config)}\n"
+        "Return JSON only:\n"
+        '{"insights": ["insight1", "insight2", ...], "tags": ["#tag1", "#tag2", ...]}'
+        "\n\n" + json.dumps(parts, ensure_ascii=False)
+    )
+
+
+def _parse_insights_response(text: str) -> Tuple[List[str], List[str]]:
+    """Insights and tags from a response; raises ValueError if it isn't the expected JSON"""
+    data = json.loads(text or "{}")
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    insights, tags = data.get("insights", []), data.get("tags", [])
+    if not isinstance(insights, list) or not isinstance(tags, list):
+        raise ValueError("insights and tags must be lists")
+    return insights[:5], tags[:7]
+
+
+class RateLimiter:
+    """Token buckets for requests per minute and tokens per minute (0 disables a limit)"""
+    
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+    
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request of roughly ``tokens`` tokens may be sent"""
+        if not self.rpm and not self.tpm:
+            return
+        import asyncio
+        
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # A single oversized request may use the whole bucket but no more
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        
+        async with self._lock:
+            while True:
+                self._refill()
+                waits = []
+                if self.rpm and self._requests < 1:
+                    waits.append((1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tpm)
+                if not waits:
+                    break
+                await asyncio.sleep(max(waits))
+            
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+
+class InsightsCache:
+    """Persistent cache of insights responses keyed by a hash of the request
+    
+    Entries older than ``max_age_days`` are ignored, and the least recently
+    used ones are removed above ``max_size_mb`` (checked once per process).
+    """
+    
+    _pruned: set = set()
+    _pruned_lock = threading.Lock()
+    
+    def __init__(self, directory: str, max_size_mb: float = 50, max_age_days: float = 90):
+        self.directory = Path(directory).expanduser()
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        with self._pruned_lock:
+            prune = self.directory not in self._pruned
+            self._pruned.add(self.directory)
+        if prune:
+            self.prune()
+    
+    @staticmethod
+    def key(prompt: str, config: Config) -> str:
+        material = json.dumps([prompt, config.openai_model, config.openai_temperature,
+                               config.insights_language, config.openai_max_tokens, config.openai_base_url])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry['stored_at'] > self.max_age:
+                return None
+            os.utime(path)  # the modification time tracks last use, for prune()
+            return entry['response']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def put(self, key: str, response: str) -> None:
+        _write_json_atomic(self._path(key), {'response': response, 'stored_at': time.time()})
+    
+    def prune(self) -> None:
+        """Remove expired entries, then the least recently used ones above the size limit"""
+        entries = []
+        now = time.time()
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+                if now - stat.st_mtime > self.max_age:
+                    path.unlink()
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a failed API call, or None if it should not be retried"""
+    import openai
+    
+    status = getattr(error, 'status_code', None)
+    retryable = isinstance(error, openai.APIConnectionError) or status in (408, 409, 429) or (status or 0) >= 500
+    if not retryable:
+        return None
+    
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), 120.0)
+        except ValueError:
+            pass
+    return min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class InsightsEngine:
+    """Async insights generation with a shared client, bounded concurrency,
+    rate limiting, retries with backoff and a persistent response cache"""
+    
+    def __init__(self, config: Config):
+        self.config = config
+        self.limiter = RateLimiter(config.openai_requests_per_minute, config.openai_tokens_per_minute)
+        self.cache = InsightsCache(str(data_path(config, config.cache_dir, "cache") / "insights"),
+                                   config.openai_cache_max_size_mb,
+                                   config.openai_cache_max_age_days) if config.openai_cache else None
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _get_client(self):
+        if self._client is None:
+            import asyncio
+            from openai import AsyncOpenAI
+            
+            # Retries are handled here so they also respect the rate limiter
+            self._client = AsyncOpenAI(api_key=self.config.openai_api_key,
+                                       base_url=self.config.openai_base_url, max_retries=0)
+            self._semaphore = asyncio.Semaphore(max(1, self.config.openai_max_concurrency))
+        return self._client
+    
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+    
+    async def complete(self, prompt: str) -> Tuple[List[str], List[str]]:
+        """Run one JSON chat completion and parse its insights and tags, served from the
+        cache when possible
+        
+        Only complete (``finish_reason == "stop"``) responses that parse are
+        cached, so a truncated or malformed reply is asked for again next time.
+        """
+        import asyncio
+        
+        key = InsightsCache.key(prompt, self.config) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                try:
+                    result = _parse_insights_response(cached)
+                except ValueError:
+                    pass  # written before responses were checked; replace it
+                else:
+                    METRICS.count("openai_requests", result="cached")
+                    return result
+        
+        client = self._get_client()
+        limit = {"max_tokens": self.config.openai_max_tokens} if self.config.openai_max_tokens else {}
+        # Without a limit, assume a typical insights response for the rate limiter
+        estimated_tokens = len(prompt) // 4 + (self.config.openai_max_tokens or 1000)
+        
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            await self.limiter.acquire(estimated_tokens)
+            try:
+                async with self._semaphore:
+                    response = await client.chat.completions.create(
+                        model=self.config.openai_model,
+                        messages=[
+                            {"role": "system", "content": INSIGHTS_SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt},
+                        ],
+                        temperature=self.config.openai_temperature,
+                        response_format={"type": "json_object"},
+                        **limit,
+                    )
+                break
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt >= self.config.openai_max_retries:
+                    METRICS.count("openai_requests", result="failed")
+                    METRICS.event("openai_request", _elapsed_ms(start), prompt_chars=len(prompt),
+                                  retries=attempt, error=type(e).__name__)
+                    raise
+                attempt += 1
+                METRICS.count("openai_retries", reason=type(e).__name__)
+                await asyncio.sleep(delay)
+        
+        usage = getattr(response, "usage", None)
+        METRICS.count("openai_requests", result="ok")
+        METRICS.event("openai_request", _elapsed_ms(start), prompt_chars=len(prompt), retries=attempt,
+                      prompt_tokens=getattr(usage, "prompt_tokens", None),
+                      completion_tokens=getattr(usage, "completion_tokens", None))
+        if usage:
+            METRICS.count("openai_tokens", usage.prompt_tokens or 0, kind="prompt")
+            METRICS.count("openai_tokens", usage.completion_tokens or 0, kind="completion")
+        
+        choice = response.choices[0]
+        text = choice.message.content or "{}"
+        try:
+            result = _parse_insights_response(text)
+        except ValueError as e:
+            reason = " (truncated by openai.max_tokens)" if choice.finish_reason == "length" else ""
+            raise ValueError(f"unusable insights response{reason}: {e}")
+        if key and choice.finish_reason == "stop":
+            self.cache.put(key, text)
+        return result
+    
+    async def _map_reduce(self, messages: List[Message]) -> Tuple[List[str], List[str]]:
+        """Insights over the whole transcript: per-chunk extraction in parallel,
+        then tree-shaped merges of at most ``openai_reduce_fanout`` results"""
+        import asyncio
+        
+        chunks = chunk_transcript(messages, self.config.openai_chunk_tokens)
+        if len(chunks) <= 1:
+            prompt = build_insights_prompt(messages, self.config)
+            return await self.complete(prompt) if prompt else ([], [])
+        
+        partials = await asyncio.gather(*(
+            self.complete(build_map_prompt(chunk, i, len(chunks), self.config))
+            for i, chunk in enumerate(chunks, 1)
+        ))
+        
+        fanout = max(2, self.config.openai_reduce_fanout)
+        while True:
+            groups = [partials[i:i + fanout] for i in range(0, len(partials), fanout)]
+            partials = await asyncio.gather(*(
+                self.complete(build_reduce_prompt(group, self.config)) for group in groups
+            ))
+            if len(partials) == 1:
+                return partials[0]
+    
+    async def generate(self, messages: List[Message], raise_errors: bool = False) -> Tuple[List[str], List[str]]:
+        """Generate insights and tags for one conversation
+        
+        API errors are reported and give no insights, unless ``raise_errors``
+        is set (for callers that retry later).
+        """
+        if not self.config.openai_api_key:
+            return [], []
+        
+        start = time.perf_counter()
+        try:
+            if self.config.insights_mode == "map_reduce":
+                insights, tags = await self._map_reduce(messages)
+            else:
+                prompt = build_insights_prompt(messages, self.config)
+                if prompt is None:
+                    return [], []
+                insights, tags = await self.complete(prompt)
+        except Exception as e:
+            print(f"⚠️ API error: {e}")
+            METRICS.event("insights", _elapsed_ms(start), mode=self.config.insights_mode,
+                          messages=len(messages), error=type(e).__name__)
+            if raise_errors:
+                raise
+            return [], []
+        METRICS.event("insights", _elapsed_ms(start), mode=self.config.insights_mode,
+                      messages=len(messages), insights=len(insights), tags=len(tags))
+        return insights, tags
+
+
+def generate_insights_and_tags(messages: List[Message], config: Config) -> Tuple[List[str], List[str]]:
+    """Generate insights and tags using OpenAI API"""
+    if not config.openai_api_key:
+        return [], []
+    import asyncio
+    
+    async def run():
+        engine = InsightsEngine(config)
+        try:
+            return await engine.generate(messages)
+        finally:
+            await engine.close()
+    
+    return asyncio.run(run())
+
+
+SPEAKER_EMOJI = {"User": "👤", "ChatGPT": "🤖", BRANCH_SPEAKER: "🔀"}
+
+
+class MarkdownBackend:
+    """Renders one output format as a stream of markdown chunks
+    
+    A document is ``header()``, then ``turn()`` for each message, then
+    ``footer()``. Every turn chunk is self-contained, so new turns can be
+    appended to an existing body followed by the footer.
+    """
+    
+    name = "standard"
+    
+    def header(self, title: str, date_str: str, insights: List[str], tags: List[str],
+               note: Optional[str] = None) -> str:
+        lines = [f"# {title}", "", f"**Date:** {date_str}", ""]
+        lines.extend(self.insights_lines(insights))
+        lines.extend(self.note_lines(note))
+        lines.extend(["## Conversation", ""])
+        return "\n".join(lines)
+    
+    def insights_lines(self, insights: List[str]) -> List[str]:
+        if not insights:
+            return []
+        return ["## Key Insights", ""] + [f"- {insight}" for insight in insights] + [""]
+    
+    def note_lines(self, note: Optional[str]) -> List[str]:
+        return [f"> {note}", ""] if note else []
+    
+    def link(self, title: str, target: Path, directory: Path) -> str:
+        """Link from a file in directory to another exported file"""
+        return f"[{title}](<{os.path.relpath(target, directory)}>)"
+    
+    def asset(self, label: str, image: bool, path: Optional[Path] = None,
+              directory: Optional[Path] = None, url: Optional[str] = None) -> str:
+        """Embed or link a stored asset, a remote one, or a placeholder if neither is available"""
+        if path is not None:
+            target = os.path.relpath(path, directory)
+        elif url:
+            target = url
+        else:
+            return f"*[{'image' if image else 'attachment'}: {label}]*"
+        return f"{'!' if image else ''}[{label}](<{target}>)"
+    
+    def turn(self, message: Message) -> str:
+        emoji = SPEAKER_EMOJI.get(message.speaker, "🤖")
+        return f"\n### {emoji} {message.speaker}\n\n{message.content}\n"
+    
+    def footer(self) -> str:
+        return ""
+
+
+class ObsidianBackend(MarkdownBackend):
+    name = "obsidian"
+    
+    def header(self, title: str, date_str: str, insights: List[str], tags: List[str],
+               note: Optional[str] = None) -> str:
+        lines = [f"# {title}", "", f"Date: {date_str}"]
+        if tags:
+            lines.append(f"Tags: {' '.join(tags)}")
+        lines.append("")
+        lines.extend(self.insights_lines(insights))
+        lines.extend(self.note_lines(note))
+        lines.extend(["## Conversation", ""])
+        return "\n".join(lines)
+    
+    def link(self, title: str, target: Path, directory: Path) -> str:
+        return f"[[{Path(target).stem}]]"
+    
+    def asset(self, label: str, image: bool, path: Optional[Path] = None,
+              directory: Optional[Path] = None, url: Optional[str] = None) -> str:
+        if path is not None:
+            return f"![[{path.name}]]" if image else f"[[{path.name}|{label}]]"
+        return super().asset(label, image, url=url)
+
+
+class BlogBackend(MarkdownBackend):
+    name = "blog"
+    
+    def footer(self) -> str:
+        return "\n---\n\n*This conversation was exported from ChatGPT.*"
+
+
+FORMAT_BACKENDS: Dict[str, MarkdownBackend] = {
+    backend.name: backend for backend in (MarkdownBackend(), ObsidianBackend(), BlogBackend())
+}
+
+
+def get_backend(format_type: str) -> MarkdownBackend:
+    """Backend for an output format (unknown formats render as standard)"""
+    return FORMAT_BACKENDS.get(format_type, FORMAT_BACKENDS["standard"])
+
+
+# Links and embeds written by localize_assets, and its placeholders
+ASSET_MARKUP_RE = re.compile(r'!?\[\[[^\]]*\]\]|!?\[[^\]]*\]\(<[^>]*>\)|\*\[(?:image|attachment): [^\]]*\]\*')
+
+
+def _title_text(content: str) -> str:
+    """Message text for titles and filenames, without images or attachments"""
+    return " ".join(ASSET_MARKUP_RE.sub(" ", ASSET_LINK_RE.sub(" ", content)).split())
+
+
+def conversation_title(messages: List[Message]) -> str:
+    """Title from the first user message"""
+    for m in messages:
+        if m.speaker == "User":
+            return _title_text(m.content)[:100] or "ChatGPT Conversation"
+    return "ChatGPT Conversation"
+
+
+def iter_markdown(messages: List[Message], insights: List[str] = None, tags: List[str] = None,
+                  format_type: str = "standard", title: Optional[str] = None,
+                  date: Optional[datetime] = None, note: Optional[str] = None) -> Iterator[str]:
+    """Yield the document chunk by chunk: header, one chunk per turn, then the footer (if any)"""
+    backend = get_backend(format_type)
+    date_str = (date or datetime.now()).strftime('%Y-%m-%d')
+    
+    yield backend.header(title or conversation_title(messages), date_str, insights or [], tags or [], note)
+    for message in messages:
+        yield backend.turn(message)
+    footer = backend.footer()
+    if footer:
+        yield footer
+
+
+def create_markdown(messages: List[Message], insights: List[str] = None, tags: List[str] = None, format_type: str = "standard",
+                    title: Optional[str] = None, date: Optional[datetime] = None) -> str:
+    """Create markdown content from messages"""
+    return "".join(iter_markdown(messages, insights, tags, format_type, title, date))
+
+
+def write_markdown(path: Path, messages: List[Message], insights: List[str] = None, tags: List[str] = None,
+                   format_type: str = "standard", title: Optional[str] = None,
+                   date: Optional[datetime] = None, note: Optional[str] = None,
+                   buffer_size: int = 1 << 20) -> int:
+    """Stream a rendered document into path atomically and return the body length in bytes
+    
+    Chunks go through a buffered temporary file that replaces path only
+    once complete, so the whole document is never held in memory and
+    readers never see a partial file.
+    """
+    footer = get_backend(format_type).footer()
+    body_end = 0
+    tmp_path = _temp_path_for(path)
+    try:
+        with open(tmp_path, "wb", buffering=buffer_size) as f:
+            for chunk in iter_markdown(messages, insights, tags, format_type, title, date, note):
+                data = chunk.encode("utf-8")
+                f.write(data)
+                body_end += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    return body_end - len(footer.encode("utf-8"))
+
+
+def make_filename(messages: List[Message], date: Optional[datetime] = None, suffix: str = "") -> str:
+    """Build the date-stamped output filename from the first user message"""
+    title_seed = ""
+    for m in messages:
+        if m.speaker == "User":
+            title_seed = re.sub(r"[^\w\s\-]", "", _title_text(m.content)[:50])
+            break
+    
+    date_str = (date or datetime.now()).strftime('%Y-%m-%d')
+    return f"{date_str}-chatgpt-{title_seed or 'conversation'}{suffix}.md"
+
+
+def resolve_output_dir(config: Config, is_blog: bool = False) -> Path:
+    """Directory that exported files are written to"""
+    if config.obsidian_vault and config.format == "obsidian":
+        # Use Obsidian vault structure
+        vault_path = Path(config.obsidian_vault)
+        if is_blog:
+            return vault_path / config.obsidian_blog
+        return vault_path / config.obsidian_slipbox
+    
+    # Use regular output directory
+    return Path(config.output_dir)
+
+
+DATA_DIR = ".chatgpt-to-markdown"
+
+
+def data_path(config: Config, configured: Optional[str], name: str) -> Path:
+    """Where the cache, index, queue or archive is kept
+    
+    A configured path is used as is. Otherwise it is ``name`` in a hidden
+    directory of the output directory (the vault root for obsidian), so
+    nothing is written outside it unless configured.
+    """
+    if configured:
+        return Path(configured).expanduser()
+    if config.obsidian_vault and config.format == "obsidian":
+        return Path(config.obsidian_vault) / DATA_DIR / name
+    return Path(config.output_dir).expanduser() / DATA_DIR / name
+
+
+def assets_directory(config: Config, output_dir: Path) -> Path:
+    """Where downloaded images and files are stored (relative paths are inside the output, or the vault)"""
+    directory = Path(config.assets_dir).expanduser()
+    if directory.is_absolute():
+        return directory
+    if config.obsidian_vault and config.format == "obsidian":
+        return Path(config.obsidian_vault) / directory
+    return output_dir / directory
+
+
+class AssetStore:
+    """Content-addressed store for the images and files that conversations reference
+    
+    Each asset is saved once as ``<sha256><ext>``, however many
+    conversations or sources refer to the same content. Sources are http(s)
+    URLs or ``file-service://`` / ``sediment://`` pointers, which are looked
+    up in ``search_paths`` (e.g. an unpacked data export) and then fetched
+    from ``url_template`` if one is configured. Downloads run on a shared
+    thread pool over persistent connections, so the number in flight is
+    bounded across all conversations being exported. An ``offline`` store
+    only uses what is already stored or found locally.
+    """
+    
+    SOURCES_NAME = ".sources.json"
+    
+    _instances: Dict[Tuple[Path, Tuple[str, ...], bool], AssetStore] = {}
+    _instances_lock = threading.Lock()
+    # file ID -> file, per search path, shared by every store in the process
+    _local_indexes: Dict[Path, Dict[str, Path]] = {}
+    _local_indexes_lock = threading.Lock()
+    
+    def __init__(self, directory: Path, max_size_mb: float = 20, concurrency: int = 8,
+                 search_paths: Optional[List[str]] = None, url_template: Optional[str] = None,
+                 timeout: float = 30.0, offline: bool = False):
+        self.directory = directory
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.concurrency = concurrency
+        self.search_paths = [Path(p).expanduser() for p in search_paths or []]
+        self.url_template = url_template
+        self.offline = offline
+        self.fetcher = HttpFetcher(timeout)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures: Dict[str, Any] = {}
+        self._mirrors: Optional[List[Tuple[Path, Dict[str, str]]]] = None
+        self._sources: Dict[str, str] = {}
+        self._dirty = False
+        
+        sources_path = directory / self.SOURCES_NAME
+        if sources_path.exists():
+            try:
+                with open(sources_path, 'r', encoding='utf-8') as f:
+                    self._sources = json.load(f)
+            except (OSError, ValueError):
+                self._sources = {}
+    
+    @classmethod
+    def for_config(cls, config: Config, output_dir: Path, offline: bool = False) -> Optional[AssetStore]:
+        """Shared store for the assets directory of an export (None if assets are disabled)"""
+        if not config.assets_enabled:
+            return None
+        directory = assets_directory(config, output_dir)
+        key = (directory.resolve(), tuple(config.assets_search_paths), offline)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(directory, config.assets_max_size_mb, config.assets_concurrency,
+                                          config.assets_search_paths, config.assets_url_template,
+                                          config.browser_timeout / 1000, offline)
+            return cls._instances[key]
+    
+    def fetch_all(self, sources: List[str]) -> Dict[str, Path]:
+        """Store every source that can be resolved and return where each one is kept"""
+        futures = {source: self._submit(source) for source in sources}
+        stored = {}
+        for source, future in futures.items():
+            name = future.result()
+            if name:
+                stored[source] = self.directory / name
+            else:
+                # Don't remember failures, so a later export tries again
+                with self._lock:
+                    if self._futures.get(source) is future:
+                        del self._futures[source]
+        
+        with self._lock:
+            if self._dirty:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                _write_json_atomic(self.directory / self.SOURCES_NAME, self._sources)
+                self._dirty = False
+        return stored
+    
+    def _submit(self, source: str):
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with self._lock:
+            future = self._futures.get(source)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="assets")
+                future = self._futures[source] = self._executor.submit(self._fetch, source)
+            return future
+    
+    def _fetch(self, source: str) -> Optional[str]:
+        with self._lock:
+            name = self._sources.get(source)
+        if name and (self.directory / name).exists():
+            METRICS.count("assets", status="cached")
+            return name
+        
+        try:
+            with METRICS.timer("asset_fetch", source=source) as fields:
+                found = self._read(source)
+                fields["bytes"] = len(found[0]) if found else 0
+        except Exception as e:
+            print(f"⚠️  Asset not downloaded: {source}: {e}")
+            METRICS.count("assets", status="failed")
+            return None
+        if found is None:
+            METRICS.count("assets", status="missing")
+            return None
+        
+        data, suffix = found
+        name = hashlib.sha256(data).hexdigest() + suffix
+        path = self.directory / name
+        if path.exists():
+            status = "deduplicated"
+        else:
+            status = "stored"
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = _temp_path_for(path)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        
+        with self._lock:
+            self._sources[source] = name
+            self._dirty = True
+        METRICS.count("assets", status=status)
+        return name
+    
+    def _read(self, source: str) -> Optional[Tuple[bytes, str]]:
+        """Content and file extension of a source, or None if it can't be found"""
+        remote = source.startswith(("http://", "https://"))
+        file_id = source.split("://", 1)[-1]
+        local = self._find_stored(source) or (None if remote else self._find_local(file_id))
+        if local:
+            if local.stat().st_size > self.max_bytes:
+                raise ValueError(f"{local} is larger than {self.max_bytes} bytes")
+            return local.read_bytes(), local.suffix.lower()
+        
+        if self.offline:
+            return None
+        if remote:
+            return self._download(source)
+        if self.url_template:
+            return self._download(self.url_template.format(id=file_id))
+        return None
+    
+    def _download(self, url: str) -> Tuple[bytes, str]:
+        response = self.fetcher.get(url, headers={"Accept": "*/*"}, max_bytes=self.max_bytes)
+        if response.status != 200:
+            raise ValueError(f"HTTP {response.status}")
+        
+        suffix = Path(urlsplit(response.url).path).suffix.lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,5}", suffix):
+            import mimetypes
+            
+            content_type = response.headers.get("content-type", "").split(";")[0].strip()
+            suffix = mimetypes.guess_extension(content_type) or ".bin"
+        return response.body, suffix
+    
+    def _find_stored(self, source: str) -> Optional[Path]:
+        """Copy of source in another asset store among the search paths (e.g. when rendering elsewhere)"""
+        with self._lock:
+            if self._mirrors is None:
+                self._mirrors = []
+                for root in self.search_paths:
+                    try:
+                        with open(root / self.SOURCES_NAME, 'r', encoding='utf-8') as f:
+                            self._mirrors.append((root, json.load(f)))
+                    except (OSError, ValueError):
+                        continue
+        for root, sources in self._mirrors:
+            name = sources.get(source)
+            if name and (root / name).is_file():
+                return root / name
+        return None
+    
+    @classmethod
+    def _local_index(cls, root: Path) -> Dict[str, Path]:
+        """Files under an export directory by every ID their name could stand for"""
+        with cls._local_indexes_lock:
+            index = cls._local_indexes.get(root)
+            if index is None:
+                index = cls._local_indexes[root] = {}
+                for path in root.rglob("file*") if root.is_dir() else ():
+                    if not path.is_file():
+                        continue
+                    # The ID is the whole name or the part before one of its "-", "." or "_"
+                    name = path.name
+                    for i, char in enumerate(name):
+                        if char in "-._":
+                            index.setdefault(name[:i], path)
+                    index.setdefault(name, path)
+            return index
+    
+    def _find_local(self, file_id: str) -> Optional[Path]:
+        """File for a pointer ID in the search paths; exports name them ``<id>-<original name>``"""
+        for root in self.search_paths:
+            path = self._local_index(root).get(file_id)
+            if path:
+                return path
+        return None
+
+
+def localize_assets(messages: List[Message], format_type: str, directory: Optional[Path],
+                    store: Optional[AssetStore] = None) -> List[Message]:
+    """Replace asset references with links to stored copies, for a document written to directory
+    
+    References that can't be stored become links to the remote URL, or a
+    placeholder naming the image or file.
+    """
+    if not any("](asset:" in m.content for m in messages):
+        return messages
+    
+    sources = {unquote(match.group(3)) for m in messages for match in ASSET_LINK_RE.finditer(m.content)}
+    stored = {}
+    if store:
+        with METRICS.timer("assets", assets=len(sources)):
+            stored = store.fetch_all(sorted(sources))
+    backend = get_backend(format_type)
+    
+    def replace(match: re.Match) -> str:
+        image, label, source = match.group(1) == "!", match.group(2), unquote(match.group(3))
+        if source in stored:
+            return backend.asset(label, image, stored[source], directory)
+        url = source if source.startswith(("http://", "https://")) else None
+        return backend.asset(label, image, url=url)
+    
+    return [Message(m.speaker, ASSET_LINK_RE.sub(replace, m.content)) for m in messages]
+
+
+def read_urls(urls: List[str], input_file: Optional[str] = None) -> List[str]:
+    """Collect share URLs from arguments and an optional file ("-" for stdin)"""
+    collected = list(urls)
+    
+    if input_file:
+        if input_file == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        collected.extend(lines)
+    
+    seen = set()
+    result = []
+    for url in collected:
+        url = url.strip()
+        if not url or url.startswith("#") or url in seen:
+            continue
+        seen.add(url)
+        result.append(url)
+    return result
+
+
+@dataclass
+class BatchResult:
+    """Outcome of exporting one conversation in batch or import mode"""
+    url: str
+    filepath: Optional[Path] = None
+    message_count: int = 0
+    error: Optional[str] = None
+    status: str = "created"  # "created" | "appended" | "rewritten" | "unchanged" | "skipped" | "merged" | "linked" | "rendered"
+    timing: Optional[LoadTiming] = None
+    tier: Optional[str] = None  # one of EXTRACTION_TIERS
+    new_messages: int = 0
+    insights: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    duplicate: Optional[DuplicateMatch] = None
+    filtered: List[Tuple[Tuple[Tuple[str, str], ...], float]] = field(default_factory=list)  # Metrics.take("filtered") in a worker
+
+
+MANIFEST_NAME = ".chatgpt-to-markdown-manifest.json"
+
+
+def message_hash(message: Message) -> str:
+    return hashlib.sha1(f"{message.speaker}\0{message.content}".encode("utf-8")).hexdigest()
+
+
+def _duplicate_hash(message: Message) -> str:
+    # Branch markers hold their position but are left out of the comparison
+    return "" if message.is_marker else message_hash(message)
+
+
+class ExportManifest:
+    """Record of which file each share URL was exported to within one output directory
+    
+    Entries hold the number of exported messages, a hash of the last one,
+    and the file size and body length (the offset where the footer starts)
+    at the time of the export, which is what incremental appends need.
+    """
+    
+    _instances: Dict[Path, ExportManifest] = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.path = directory / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._claimed: set = set()
+        
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+    
+    @classmethod
+    def for_directory(cls, directory: Path) -> ExportManifest:
+        """Shared manifest instance for a directory (safe to use from several threads)"""
+        key = directory.resolve()
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(directory)
+            return cls._instances[key]
+    
+    def claim_path(self, filepath: Path, key: str) -> Path:
+        """Reserve a new output file, adding the share ID if the name is already in use"""
+        with self._lock:
+            taken = {e['path'] for k, e in self._entries.items() if k != key} | self._claimed
+            if filepath.name in taken or filepath.exists():
+                filepath = filepath.with_name(f"{filepath.stem}-{key[:8]}{filepath.suffix}")
+            self._claimed.add(filepath.name)
+            return filepath
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+    
+    def get_by_path(self, filepath: Path) -> Optional[Dict[str, Any]]:
+        """Most recent entry for a file (several URLs can be merged into one)"""
+        with self._lock:
+            entries = [e for e in self._entries.values() if e['path'] == filepath.name]
+            return dict(max(entries, key=lambda e: e['message_count'])) if entries else None
+    
+    @staticmethod
+    def entry(url: str, filepath: Path, messages: List[Message], format_type: str,
+              body_end: int) -> Dict[str, Any]:
+        return {
+            'url': url,
+            'path': filepath.name,
+            'format': format_type,
+            'message_count': len(messages),
+            'last_message': message_hash(messages[-1]) if messages else None,
+            'size': filepath.stat().st_size,
+            'body_end': body_end,
+            'updated_at': datetime.now().isoformat(timespec="seconds"),
+        }
+    
+    def record(self, key: str, url: str, filepath: Path, messages: List[Message],
+               format_type: str, body_end: int) -> None:
+        self.update({key: self.entry(url, filepath, messages, format_type, body_end)})
+    
+    def update(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Store entries made elsewhere (e.g. by render workers) with a single write
+        
+        Other entries for the same file (URLs merged into it) get its new
+        size and body length too, so any of them can append to it later.
+        """
+        with self._lock:
+            self._entries.update(entries)
+            files = {e['path']: e for e in entries.values()}
+            for entry in self._entries.values():
+                written = files.get(entry['path'])
+                if written is not None:
+                    entry['size'], entry['body_end'] = written['size'], written['body_end']
+            _write_json_atomic(self.path, self._entries)
+
+
+def _append_turns(filepath: Path, entry: Dict[str, Any], messages: List[Message], format_type: str,
+                  buffer_size: int = 1 << 20) -> int:
+    """Append turns to an exported file and return the new body length
+    
+    If the file is exactly as the last export left it, everything after the
+    body (the footer) is replaced by the turns and a new footer. A file
+    edited since then is kept whole and the turns are added at its end. The
+    result is written to a temporary file that replaces the original only
+    once complete, so an interrupted append leaves the file (and with it
+    the manifest entry) as it was.
+    """
+    backend = get_backend(format_type)
+    addition = "".join(backend.turn(m) for m in messages).encode("utf-8")
+    footer = backend.footer().encode("utf-8")
+    
+    tmp_path = _temp_path_for(filepath)
+    try:
+        with open(filepath, "rb") as src, open(tmp_path, "wb") as f:
+            size = src.seek(0, os.SEEK_END)
+            body_end = entry['body_end'] if size == entry['size'] else size
+            src.seek(0)
+            remaining = body_end
+            while remaining:
+                chunk = src.read(min(remaining, buffer_size))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+            f.write(addition + footer)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    return body_end + len(addition)
+
+
+@dataclass
+class ArchivedConversation:
+    key: str  # share ID, or the conversation ID for data export imports
+    url: Optional[str]
+    title: str
+    date: Optional[str]  # YYYY-MM-DD
+    path: Optional[str]  # file name it was exported to
+    is_blog: bool
+    messages: List[Message]
+    insights: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    assets: Optional[str] = None  # directory its images and files were stored in
+    duplicate: Optional[Dict[str, Any]] = None  # see ConversationArchive.add
+    message_count: int = 0
+
+
+class ConversationArchive:
+    """Append-only tables of everything that was exported, for re-rendering without scraping
+    
+    Two tables, ``conversations`` and ``messages``, are stored as JSON
+    lines that pandas, DuckDB or jq can read directly. Each process appends
+    to its own part file per table, so threads, import workers and
+    concurrent commands never interleave writes, and rows are buffered and
+    written in batches. Updates are new rows: the latest conversation row
+    per key wins (date, insights, tags and duplicate handling from the
+    latest row that has them), and the latest row per message position, up
+    to its message count.
+    """
+    
+    TABLES = ("conversations", "messages")
+    
+    _instances: Dict[Path, ConversationArchive] = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, directory: Path, batch_rows: int = 1000):
+        self.directory = directory
+        self.batch_rows = batch_rows
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._part = self._new_part()
+        self._rows: Dict[str, List[str]] = {table: [] for table in self.TABLES}
+    
+    @classmethod
+    def for_config(cls, config: Config) -> Optional[ConversationArchive]:
+        """Shared archive for config (None if archiving is disabled)"""
+        if not config.archive_enabled:
+            return None
+        key = data_path(config, config.archive_path, "archive").resolve()
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(key, config.archive_batch_rows)
+            return cls._instances[key]
+    
+    @classmethod
+    def flush_all(cls) -> None:
+        with cls._instances_lock:
+            archives = list(cls._instances.values())
+        for archive in archives:
+            archive.flush()
+    
+    def _new_part(self) -> str:
+        return f"{time.time_ns():x}-{os.getpid()}"
+    
+    def add(self, key: str, url: Optional[str], title: str, path: Optional[Path], is_blog: bool,
+            messages: List[Message], start: int = 0, date: Optional[str] = None,
+            insights: Optional[List[str]] = None, tags: Optional[List[str]] = None,
+            assets: Optional[AssetStore] = None, duplicate: Optional[Dict[str, Any]] = None) -> None:
+        """Record a conversation and its messages from position start on
+        
+        ``date``, ``insights``, ``tags`` and ``duplicate`` are None when they
+        did not change. ``duplicate`` is how the file at ``path`` relates to
+        another conversation, so renders can do the same: ``{}`` for not at
+        all, ``{"mode": "merged"}`` if the turns were appended to that file
+        (another conversation's), or ``{"mode": "linked", ...}`` with the
+        DuplicateMatch fields if only the turns after ``shared`` were
+        written, with a note linking to ``target``.
+        """
+        archived_at = time.time()
+        conversation = {
+            "key": key, "url": url, "title": title, "date": date,
+            "path": path.name if path else None, "is_blog": is_blog,
+            "message_count": len(messages), "insights": insights, "tags": tags,
+            "assets": str(assets.directory.resolve()) if assets else None, "duplicate": duplicate,
+            "archived_at": archived_at,
+        }
+        rows = [json.dumps({"key": key, "position": position, "speaker": m.speaker, "content": m.content,
+                            "marker": m.is_marker, "archived_at": archived_at}, ensure_ascii=False)
+                for position, m in enumerate(messages[start:], start)]
+        
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked (e.g. an import worker): the parent's buffered rows are not ours to write
+                self._pid, self._part = os.getpid(), self._new_part()
+                self._rows = {table: [] for table in self.TABLES}
+            self._rows["conversations"].append(json.dumps(conversation, ensure_ascii=False))
+            self._rows["messages"].extend(rows)
+            if sum(len(r) for r in self._rows.values()) >= self.batch_rows:
+                self._flush()
+    
+    def flush(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                self._flush()
+    
+    def _flush(self) -> None:
+        for table, rows in self._rows.items():
+            if not rows:
+                continue
+            path = self.directory / table / f"{self._part}.jsonl"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(rows) + "\n")
+            rows.clear()
+    
+    def _read_table(self, table: str) -> Iterator[Dict[str, Any]]:
+        for path in sorted((self.directory / table).glob("*.jsonl")):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A partial last line from an interrupted write
+                        continue
+    
+    def latest_rows(self) -> Dict[str, Dict[str, Any]]:
+        """The latest conversation row per key (without messages), with columns that
+        are None when unchanged filled in from earlier rows"""
+        self.flush()
+        latest: Dict[str, Dict[str, Any]] = {}
+        found: Dict[Tuple[str, str], Tuple[float, Any]] = {}  # (key, column) -> latest non-null value
+        for row in self._read_table("conversations"):
+            key = row["key"]
+            if key not in latest or latest[key]["archived_at"] <= row["archived_at"]:
+                latest[key] = row
+            for name in ("date", "insights", "tags", "duplicate"):
+                if row.get(name) is not None and found.get((key, name), (0, None))[0] <= row["archived_at"]:
+                    found[(key, name)] = (row["archived_at"], row[name])
+        
+        for key, row in latest.items():
+            for name, default in (("date", None), ("insights", []), ("tags", []), ("duplicate", None)):
+                row[name] = found.get((key, name), (0, default))[1]
+            row["duplicate"] = row["duplicate"] or None
+        return latest
+    
+    def conversations(self, rows: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[ArchivedConversation]:
+        """The latest version of every archived conversation, one at a time
+        
+        Messages are staged in a temporary SQLite database, so only the
+        conversation being yielded is held in memory. ``rows`` is the result
+        of latest_rows(), if the caller already has it.
+        """
+        import tempfile
+        
+        rows = self.latest_rows() if rows is None else rows
+        with tempfile.TemporaryDirectory(prefix="chatgpt-to-markdown-") as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, "messages.db"))
+            try:
+                conn.execute("PRAGMA journal_mode=OFF")
+                conn.execute("CREATE TABLE messages (key TEXT, position INTEGER, archived_at REAL, "
+                             "speaker TEXT, content TEXT)")
+                conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?)", (
+                    (row["key"], row["position"], row["archived_at"], row["speaker"], row["content"])
+                    for row in self._read_table("messages")
+                    if row["key"] in rows and row["position"] < rows[row["key"]]["message_count"]))
+                conn.execute("CREATE INDEX messages_key ON messages (key, position, archived_at)")
+                
+                for key, row in rows.items():
+                    # Rows are read in order, so the last one per position is the latest (ties too)
+                    messages: Dict[int, Message] = {}
+                    for position, speaker, content in conn.execute(
+                            "SELECT position, speaker, content FROM messages WHERE key = ? "
+                            "ORDER BY position, archived_at, rowid", (key,)):
+                        messages[position] = Message(speaker, content)
+                    yield ArchivedConversation(key, row["url"], row["title"], row["date"], row["path"],
+                                               row["is_blog"], [messages[p] for p in sorted(messages)],
+                                               row["insights"], row["tags"], row.get("assets"),
+                                               row["duplicate"], row["message_count"])
+            finally:
+                conn.close()
+
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    url TEXT,
+    title TEXT,
+    date TEXT,
+    tags TEXT NOT NULL DEFAULT '',
+    message_count INTEGER NOT NULL DEFAULT 0,
+    mtime REAL,
+    size INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    content,
+    speaker UNINDEXED,
+    doc_id UNINDEXED,
+    position UNINDEXED,
+    tokenize = '{tokenizer}'
+);
+CREATE TABLE IF NOT EXISTS message_hashes (
+    doc_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (doc_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS message_hashes_hash ON message_hashes (hash, position);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    PRIMARY KEY (band, bucket, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lsh_buckets_doc ON lsh_buckets (doc_id);
+"""
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 4 rows per band: conversations sharing ~50% of messages collide
+_MERSENNE_PRIME = (1 << 61) - 1
+_MINHASH_RNG = random.Random(0x5eed)
+_MINHASH_COEFFICIENTS = [(_MINHASH_RNG.randrange(1, _MERSENNE_PRIME), _MINHASH_RNG.randrange(_MERSENNE_PRIME))
+                         for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def minhash_signature(hashes: List[str]) -> List[int]:
+    """MinHash of a conversation's set of message hashes"""
+    values = {int(h[:15], 16) for h in hashes}
+    if not values:
+        return []
+    return [min((a * v + b) % _MERSENNE_PRIME for v in values) for a, b in _MINHASH_COEFFICIENTS]
+
+
+def lsh_buckets(signature: List[int]) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs: conversations with a bucket in common are candidate duplicates"""
+    rows = len(signature) // LSH_BANDS
+    buckets = []
+    for band in range(LSH_BANDS if signature else 0):
+        data = b"".join(v.to_bytes(8, "little") for v in signature[band * rows:(band + 1) * rows])
+        digest = hashlib.blake2b(data, digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+
+def _common_prefix(a: List[str], b: List[str]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+@dataclass
+class DuplicateMatch:
+    """An indexed conversation that overlaps the one being exported
+    
+    ``kind`` is "duplicate" (every message is already in the match),
+    "extension" (the match is a prefix, e.g. re-shared after more turns),
+    "fork" (same opening, then diverges) or "similar" (messages in common,
+    not as a prefix). ``shared`` is the length of the common prefix.
+    """
+    path: str
+    url: Optional[str]
+    title: str
+    kind: str
+    shared: int
+    similarity: float
+
+
+DUPLICATE_MODES = ("write", "skip", "link", "merge")
+
+
+@dataclass
+class SearchHit:
+    path: str
+    title: str
+    date: str
+    speaker: str
+    position: int
+    snippet: str
+    rank: float
+
+
+class SearchIndex:
+    """SQLite FTS5 index of exported messages, one row per message
+    
+    Exports update the index as they write files; ``reindex`` brings it in
+    line with files on disk. Each thread gets its own connection, so one
+    instance can be shared by threads (and pickled to worker processes).
+    """
+    
+    def __init__(self, path: Path, tokenizer: str = "unicode61 remove_diacritics 2"):
+        self.path = path
+        self.tokenizer = tokenizer
+        self._initialized = False
+        self._local = threading.local()
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'path': self.path, 'tokenizer': self.tokenizer}
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state['path'], state['tokenizer'])
+    
+    @classmethod
+    def open(cls, config: Config) -> SearchIndex:
+        return cls(data_path(config, config.index_path, "index.db"), config.index_tokenizer)
+    
+    @classmethod
+    def from_config(cls, config: Config) -> Optional[SearchIndex]:
+        if not config.index_enabled:
+            return None
+        return cls.open(config)
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are kept open: closing the last one checkpoints the WAL,
+        # which would otherwise dominate the cost of indexing one export
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        if not self._initialized:
+            # WAL lets searches run while a batch export is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The tokenizer is fixed when the table is created (reindex --full recreates it)
+            conn.executescript(INDEX_SCHEMA.format(tokenizer=self.tokenizer.replace("'", "''")))
+            self._initialized = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        return conn
+    
+    def close(self) -> None:
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def _replace(self, conn: sqlite3.Connection, filepath: Path, messages: List[Message], title: str,
+                 date: str, tags: List[str], url: Optional[str], start: int = 0) -> None:
+        stat = filepath.stat()
+        row = conn.execute("SELECT id FROM documents WHERE path = ?", (str(filepath),)).fetchone()
+        if row:
+            doc_id = row[0]
+            self._delete_rows(conn, doc_id)
+            conn.execute(
+                "UPDATE documents SET url = coalesce(?, url), title = ?, date = ?, tags = ?,"
+                " message_count = ?, mtime = ?, size = ? WHERE id = ?",
+                (url, title, date, " ".join(tags), start + len(messages), stat.st_mtime, stat.st_size, doc_id),
+            )
+        else:
+            doc_id = conn.execute(
+                "INSERT INTO documents (path, url, title, date, tags, message_count, mtime, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(filepath), url, title, date, " ".join(tags), start + len(messages), stat.st_mtime, stat.st_size),
+            ).lastrowid
+        self._insert_messages(conn, doc_id, messages, start)
+    
+    def _delete_rows(self, conn: sqlite3.Connection, doc_id: int, start: int = 0) -> None:
+        conn.execute("DELETE FROM messages WHERE doc_id = ? AND position >= ?", (doc_id, start))
+        conn.execute("DELETE FROM message_hashes WHERE doc_id = ? AND position >= ?", (doc_id, start))
+        conn.execute("DELETE FROM lsh_buckets WHERE doc_id = ?", (doc_id,))
+    
+    def _insert_messages(self, conn: sqlite3.Connection, doc_id: int, messages: List[Message], start: int) -> None:
+        conn.executemany(
+            "INSERT INTO messages (content, speaker, doc_id, position) VALUES (?, ?, ?, ?)",
+            ((m.content, m.speaker, doc_id, start + i) for i, m in enumerate(messages) if not m.is_marker),
+        )
+        conn.executemany(
+            "INSERT INTO message_hashes (doc_id, position, hash) VALUES (?, ?, ?)",
+            ((doc_id, start + i, _duplicate_hash(m)) for i, m in enumerate(messages)),
+        )
+        # The signature covers every message of the file, including earlier appends
+        hashes = [h for (h,) in conn.execute(
+            "SELECT hash FROM message_hashes WHERE doc_id = ? AND hash != ''", (doc_id,))]
+        conn.executemany(
+            "INSERT INTO lsh_buckets (band, bucket, doc_id) VALUES (?, ?, ?)",
+            ((band, bucket, doc_id) for band, bucket in lsh_buckets(minhash_signature(hashes))),
+        )
+    
+    def add(self, filepath: Path, messages: List[Message], title: str, date: str,
+            tags: List[str], url: Optional[str] = None, start: int = 0) -> None:
+        """Index an exported file, replacing whatever was indexed for it before
+        
+        ``start`` is the conversation position of the first message, for
+        files that only hold the turns after a linked duplicate's prefix.
         """
+        conn = self._connect()
+        with conn:
+            self._replace(conn, filepath.resolve(), messages, title, date, tags, url, start)
+    
+    def append(self, filepath: Path, messages: List[Message], start: int) -> None:
+        """Index turns appended to an already indexed file, starting at message position start"""
+        filepath = filepath.resolve()
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT id FROM documents WHERE path = ?", (str(filepath),)).fetchone()
+            if row is None:
+                return
+            stat = filepath.stat()
+            self._delete_rows(conn, row[0], start)
+            self._insert_messages(conn, row[0], messages, start)
+            conn.execute("UPDATE documents SET message_count = ?, mtime = ?, size = ? WHERE id = ?",
+                         (start + len(messages), stat.st_mtime, stat.st_size, row[0]))
+    
+    def search(self, query: str, limit: int = 20, tag: Optional[str] = None,
+               speaker: Optional[str] = None) -> List[SearchHit]:
+        """Best matching messages first (BM25)"""
+        sql = (
+            "SELECT d.path, d.title, d.date, m.speaker, m.position,"
+            " snippet(messages, 0, '**', '**', '…', 16), bm25(messages) AS rank"
+            " FROM messages m JOIN documents d ON d.id = m.doc_id"
+            " WHERE messages MATCH ?"
+        )
+        params: List[Any] = []
+        if tag:
+            sql += " AND (' ' || d.tags || ' ') LIKE ?"
+            params.append(f"% #{tag.lstrip('#')} %")
+        if speaker:
+            sql += " AND m.speaker = ?"
+            params.append(speaker)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, [query] + params).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS5 query syntax: search for the words as literal terms
+            terms = " ".join('"' + t.replace('"', '""') + '"' for t in query.split())
+            rows = conn.execute(sql, [terms] + params).fetchall() if terms else []
+        return [SearchHit(*row) for row in rows]
+    
+    def find_duplicate(self, messages: List[Message], threshold: float = 0.6,
+                       max_candidates: int = 50) -> Optional[DuplicateMatch]:
+        """Best overlapping conversation in the index, or None
+        
+        Candidates come from LSH buckets (similar message sets) and from
+        conversations with the same first message (forks), both index
+        lookups, so the cost does not grow with the size of the archive.
+        Duplicates and extensions always match; forks and similar
+        conversations need ``threshold`` of the messages in common.
+        """
+        hashes = [_duplicate_hash(m) for m in messages]
+        ours = set(hashes) - {""}
+        if not ours:
+            return None
+        buckets = lsh_buckets(minhash_signature(list(ours)))
+        
+        conn = self._connect()
+        candidates = {doc_id for (doc_id,) in conn.execute(
+            "SELECT doc_id FROM message_hashes WHERE hash = ? AND position = 0 LIMIT ?",
+            (hashes[0], max_candidates))} if hashes[0] else set()
+        for band, bucket in buckets:
+            candidates.update(doc_id for (doc_id,) in conn.execute(
+                "SELECT doc_id FROM lsh_buckets WHERE band = ? AND bucket = ? LIMIT ?",
+                (band, bucket, max_candidates)))
+        
+        best, best_key = None, None
+        for doc_id in list(candidates)[:max_candidates * 2]:
+            theirs = [h for (h,) in conn.execute(
+                "SELECT hash FROM message_hashes WHERE doc_id = ? ORDER BY position", (doc_id,))]
+            if not theirs:
+                continue
+            shared = _common_prefix(hashes, theirs)
+            jaccard = len(ours & set(theirs)) / len(ours | (set(theirs) - {""}))
+            similarity = max(jaccard, shared / len(hashes))
+            if shared == len(hashes):
+                kind = "duplicate"
+            elif shared == len(theirs) and shared >= 2:
+                kind = "extension"
+            elif similarity >= threshold:
+                kind = "fork" if shared else "similar"
+            else:
+                continue
+            
+            key = (kind in ("duplicate", "extension"), shared, similarity)
+            if best_key is None or key > best_key:
+                path, url, title = conn.execute(
+                    "SELECT path, url, title FROM documents WHERE id = ?", (doc_id,)).fetchone()
+                best, best_key = DuplicateMatch(path, url, title, kind, shared, similarity), key
+        return best
+    
+    def documents(self) -> Dict[str, Tuple[float, int]]:
+        """(mtime, size) of every indexed file"""
+        conn = self._connect()
+        return {path: (mtime, size) for path, mtime, size in
+                conn.execute("SELECT path, mtime, size FROM documents")}
+    
+    def update(self, parsed: List[ParsedMarkdown], removed: List[str] = ()) -> None:
+        """Replace the rows of re-parsed files and drop removed ones, in one transaction"""
+        conn = self._connect()
+        with conn:
+            for path in removed:
+                row = conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+                if row:
+                    self._delete_rows(conn, row[0])
+                    conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            for doc in parsed:
+                self._replace(conn, Path(doc.path), doc.messages, doc.title, doc.date, doc.tags, doc.url)
+    
+    def clear(self) -> None:
+        """Drop everything and recreate the tables (picking up a changed tokenizer)"""
+        conn = self._connect()
+        with conn:
+            for table in ("messages", "documents", "message_hashes", "lsh_buckets"):
+                conn.execute(f"DROP TABLE {table}")
+            conn.executescript(INDEX_SCHEMA.format(tokenizer=self.tokenizer.replace("'", "''")))
+
+
+@dataclass
+class ParsedMarkdown:
+    path: str
+    title: str
+    date: str
+    tags: List[str]
+    messages: List[Message]
+    url: Optional[str] = None
+
+
+TURN_HEADING_RE = re.compile(
+    r"^### (?:%s) (%s)$" % ("|".join(SPEAKER_EMOJI.values()), "|".join(SPEAKER_EMOJI)),
+    re.MULTILINE,
+)
+
+
+def parse_markdown_file(path: str) -> Optional[ParsedMarkdown]:
+    """Read an exported file back into messages (None if it is not an export)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    
+    head, sep, body = text.partition("\n## Conversation\n")
+    if not sep or not head.startswith("# "):
+        return None
+    
+    title = head[2:head.find("\n")] if "\n" in head else head[2:]
+    date, tags = "", []
+    for line in head.splitlines():
+        if line.startswith("**Date:** ") or line.startswith("Date: "):
+            date = line.split(" ", 1)[1].strip()
+        elif line.startswith("Tags: "):
+            tags = line[len("Tags: "):].split()
+    
+    for backend in FORMAT_BACKENDS.values():
+        footer = backend.footer()
+        if footer and body.endswith(footer):
+            body = body[:-len(footer)]
+    
+    messages = []
+    headings = list(TURN_HEADING_RE.finditer(body))
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(body)
+        # A turn is "\n### heading\n\n" + content + "\n"; the next one starts with "\n"
+        content = body[match.end():end]
+        content = content[2:] if content.startswith("\n\n") else content.lstrip("\n")
+        trailing = "\n\n" if i + 1 < len(headings) else "\n"
+        content = content[:-len(trailing)] if content.endswith(trailing) else content.rstrip("\n")
+        messages.append(Message(match.group(1), content))
+    
+    return ParsedMarkdown(str(Path(path).resolve()), title, date, tags, messages)
+
+
+def index_roots(config: Config) -> List[Path]:
+    """Directories exports are written to"""
+    roots = [resolve_output_dir(config), resolve_output_dir(config, is_blog=True)]
+    unique = []
+    for root in roots:
+        if root.resolve() not in unique:
+            unique.append(root.resolve())
+    return unique
+
+
+def reindex(index: SearchIndex, roots: List[Path], workers: Optional[int] = None,
+            full: bool = False, batch_size: int = 200) -> Tuple[int, int]:
+    """Index new and changed .md files under roots and drop deleted ones
+    
+    Files are parsed in a process pool (in this process for one worker) and
+    written to the index by this process in batched transactions. Returns (files indexed, files removed).
+    """
+    if full:
+        index.clear()
+    known = index.documents()
+    
+    changed, seen, urls = [], set(), {}
+    for root in roots:
+        if not root.is_dir():
+            continue
+        for manifest_path in root.rglob(MANIFEST_NAME):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    for entry in json.load(f).values():
+                        urls[str((manifest_path.parent / entry['path']).resolve())] = entry.get('url')
+            except (OSError, ValueError, KeyError):
+                pass
+        for path in root.rglob("*.md"):
+            path = path.resolve()
+            seen.add(str(path))
+            stat = path.stat()
+            if known.get(str(path)) != (stat.st_mtime, stat.st_size):
+                changed.append(str(path))
+    
+    prefixes = tuple(str(root) + os.sep for root in roots)
+    removed = [path for path in known if path not in seen and path.startswith(prefixes)]
+    
+    indexed = 0
+    batch: List[ParsedMarkdown] = []
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # With one worker, parsing in this process saves starting the pool
+        docs = executor.map(parse_markdown_file, changed, chunksize=16) if executor else map(parse_markdown_file, changed)
+        for doc in docs:
+            if doc is None:
+                continue
+            doc.url = urls.get(doc.path)
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                index.update(batch)
+                indexed += len(batch)
+                batch = []
+    finally:
+        if executor:
+            executor.shutdown()
+    index.update(batch, removed)
+    indexed += len(batch)
+    
+    return indexed, len(removed)
+
+
+DUPLICATE_NOTES = {
+    "duplicate": "Duplicate of {link}.",
+    "extension": "Continues {link} after its {shared} messages.",
+    "fork": "Forked from {link} after {shared} shared messages.",
+    "similar": "Similar to {link} ({similarity:.0%} of messages in common).",
+}
+
+
+def duplicate_note(duplicate: Dict[str, Any], format_type: str, directory: Path) -> Tuple[str, int]:
+    """Note linking a file to the conversation it overlaps, and the message it starts at
+    
+    ``duplicate`` holds the DuplicateMatch fields (``target`` is its path).
+    """
+    link = get_backend(format_type).link(duplicate['title'], Path(duplicate['target']), directory)
+    note = DUPLICATE_NOTES[duplicate['kind']].format(link=link, shared=duplicate['shared'],
+                                                     similarity=duplicate['similarity'])
+    return note, duplicate['shared']
+
+
+def _find_duplicate(index: SearchIndex, messages: List[Message], config: Config) -> Optional[DuplicateMatch]:
+    try:
+        with METRICS.timer("duplicate_lookup", messages=len(messages)) as fields:
+            match = index.find_duplicate(messages, config.duplicate_threshold)
+            fields["kind"] = match.kind if match else None
+    except sqlite3.Error as e:
+        print(f"⚠️  Duplicate detection skipped: {e}")
+        return None
+    return match if match and Path(match.path).exists() else None
+
+
+def _merge_into(match: DuplicateMatch, url: str, key: str, messages: List[Message], config: Config,
+                index: SearchIndex) -> Optional[BatchResult]:
+    """Append the turns after an extension's shared prefix to the matched file
+    
+    Returns None if the match was not written by an export in this format,
+    since appending needs its manifest entry.
+    """
+    target = Path(match.path)
+    manifest = ExportManifest.for_directory(target.parent)
+    entry = manifest.get_by_path(target)
+    if entry is None or entry['format'] != config.format or entry['message_count'] != match.shared:
+        return None
+    
+    new = messages[match.shared:]
+    with METRICS.timer("write", url=url, status="merged", messages=len(new)):
+        body_end = _append_turns(target, entry, new, config.format)
+    manifest.record(key, url, target, messages, config.format, body_end)
+    _update_index(index.append, target, new, match.shared)
+    return BatchResult(url, target, len(messages), status="merged", new_messages=len(new), duplicate=match)
+
+
+def _update_index(method: Callable[..., None], *args: Any) -> None:
+    # The file is already written; a locked or broken index must not fail the export
+    try:
+        with METRICS.timer("index", operation=method.__name__):
+            method(*args)
+    except sqlite3.Error as e:
+        print(f"⚠️  Search index not updated: {e}")
+
+
+def export_conversation(url: str, messages: List[Message], config: Config, with_insights: bool = True,
+                        is_blog: bool = False, refresh_insights: bool = False,
+                        insights_fn: Optional[Callable[[List[Message]], Tuple[List[str], List[str]]]] = None,
+                        index: Optional[SearchIndex] = None) -> BatchResult:
+    """Generate insights, render and write one extracted conversation
+    
+    With ``config.incremental``, a URL that was exported to the same
+    directory before is updated in place: only new turns are appended, and
+    the file is rewritten only if the conversation diverged from what was
+    exported or ``refresh_insights`` is set. ``insights_fn`` replaces
+    generate_insights_and_tags, e.g. to share an InsightsEngine. Written
+    messages are added to ``index`` if given.
+    
+    Before writing a new file, ``index`` is also searched for a conversation
+    this one duplicates, extends or forks from; ``config.duplicates`` says
+    whether to write it anyway, skip it, write only the turns after the
+    shared prefix with a link to the match, or append them to the match.
+    """
+    if not messages:
+        return BatchResult(url, error="no messages extracted")
+    
+    output_dir = resolve_output_dir(config, is_blog)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = ExportManifest.for_directory(output_dir)
+    archive = ConversationArchive.for_config(config)
+    # The archive keeps asset references as extracted, so renders can link them for any format
+    extracted = messages
+    store = AssetStore.for_config(config, output_dir)
+    messages = localize_assets(messages, config.format, output_dir, store)
+    key = share_id_from_url(url)
+    
+    entry = manifest.get(key) if config.incremental else None
+    filepath = output_dir / entry['path'] if entry else None
+    if entry and (not filepath.exists() or entry['format'] != config.format):
+        entry, filepath = None, None
+    
+    if entry:
+        # Another URL's turns may have been merged into the file since; new
+        # turns must continue what the file holds now, not this URL's part of it
+        latest = manifest.get_by_path(filepath)
+        own = entry['message_count']
+        if (not refresh_insights and own == len(messages) and
+                message_hash(messages[-1]) == entry['last_message']):
+            return BatchResult(url, filepath, len(messages), status="unchanged")
+        shared = latest['message_count'] > own
+        entry = latest
+    
+    if entry and not refresh_insights:
+        count = entry['message_count']
+        if 0 < count <= len(messages) and message_hash(messages[count - 1]) == entry['last_message']:
+            new = messages[count:]
+            if not new:
+                return BatchResult(url, filepath, len(messages), status="unchanged")
+            with METRICS.timer("write", url=url, status="appended", messages=len(new)):
+                body_end = _append_turns(filepath, entry, new, config.format)
+            manifest.record(key, url, filepath, messages, config.format, body_end)
+            if archive:
+                archive.add(key, url, conversation_title(messages), filepath, is_blog, extracted, count, assets=store)
+            if index:
+                _update_index(index.append, filepath, new, count)
+            return BatchResult(url, filepath, len(messages), status="appended", new_messages=len(new))
+    
+    if entry and shared:
+        # Rewriting would drop the merged turns: write this branch as a conversation of its own
+        entry, filepath = None, None
+    
+    match = _find_duplicate(index, messages, config) if filepath is None and index else None
+    mode = config.duplicates if match else "write"
+    if match:
+        METRICS.count("duplicates", kind=match.kind, mode=mode)
+    if mode in ("link", "merge") and match.kind == "duplicate":
+        # Nothing after the shared prefix: there are no turns to write or append
+        mode = "skip"
+    if mode == "skip":
+        return BatchResult(url, Path(match.path), len(messages), status="skipped", duplicate=match)
+    if mode == "merge" and match.kind == "extension":
+        result = _merge_into(match, url, key, messages, config, index)
+        if result:
+            if archive:
+                archive.add(key, url, conversation_title(messages), result.filepath, is_blog, extracted,
+                            date=datetime.now().strftime('%Y-%m-%d'), assets=store, duplicate={"mode": "merged"})
+            return result
+    
+    # Linked files hold only the turns after the prefix they share with the match
+    note, start, duplicate = None, 0, {}
+    if mode in ("link", "merge"):
+        duplicate = {"mode": "linked", "kind": match.kind, "target": match.path, "title": match.title,
+                     "shared": match.shared, "similarity": match.similarity}
+        note, start = duplicate_note(duplicate, config.format, output_dir)
+    
+    insights, tags = [], []
+    if with_insights:
+        insights, tags = (insights_fn or (lambda m: generate_insights_and_tags(m, config)))(messages)
+    
+    status = "linked" if note else "rewritten" if filepath else "created"
+    if filepath is None:
+        filepath = output_dir / make_filename(messages)
+        if config.incremental:
+            filepath = manifest.claim_path(filepath, key)
+    title = conversation_title(messages)
+    with METRICS.timer("write", url=url, status=status, messages=len(messages) - start) as fields:
+        body_end = write_markdown(filepath, messages[start:], insights, tags, config.format, title=title, note=note)
+        fields["bytes"] = filepath.stat().st_size
+    manifest.record(key, url, filepath, messages, config.format, body_end)
+    date_str = datetime.now().strftime('%Y-%m-%d')
+    if archive:
+        archive.add(key, url, title, filepath, is_blog, extracted, date=date_str, insights=insights, tags=tags,
+                    assets=store, duplicate=duplicate)
+    if index:
+        _update_index(index.add, filepath, messages[start:], title, date_str, tags, url, start)
+    
+    return BatchResult(url, filepath, len(messages), status=status, new_messages=len(messages) - start,
+                       insights=insights, tags=tags, duplicate=match)
+
+
+async def export_batch(urls: List[str], config: Config, concurrency: int,
+                       with_insights: bool = True, is_blog: bool = False,
+                       cache: Optional[ExtractionCache] = None, refresh: bool = False,
+                       refresh_insights: bool = False, index: Optional[SearchIndex] = None) -> List[BatchResult]:
+    """Export many URLs with one shared browser, writing each file as soon as it is extracted"""
+    import asyncio
+    
+    loop = asyncio.get_running_loop()
+    engine = InsightsEngine(config)
+    
+    def insights_fn(messages: List[Message]) -> Tuple[List[str], List[str]]:
+        # Called from executor threads; all requests go through the one engine
+        return asyncio.run_coroutine_threadsafe(engine.generate(messages), loop).result()
+    
+    async def export_one(pool: BrowserPool, url: str) -> BatchResult:
+        try:
+            messages = await pool.extract(url, cache, refresh, exported_before(url, config, is_blog))
+            # File writes are blocking; keep them off the event loop
+            result = await loop.run_in_executor(
+                None, export_conversation, url, messages, config, with_insights, is_blog,
+                refresh_insights, insights_fn, index,
+            )
+        except Exception as e:
+            result = BatchResult(url, error=f"{type(e).__name__}: {e}")
+        result.timing = pool.timings.pop(url, None)
+        result.tier = pool.tiers.pop(url, None)
+        
+        if result.error:
+            print(f"❌ {url}: {result.error}")
+        elif result.status in ("appended", "merged"):
+            print(f"✅ {url} -> {result.filepath} (+{result.new_messages} messages, via {result.tier})")
+        elif result.status == "skipped":
+            print(f"⏭️  {url}: {result.duplicate.kind} of {result.filepath}")
+        else:
+            print(f"✅ {url} -> {result.filepath} ({result.status}, {result.message_count} messages, via {result.tier})")
+        return result
+    
+    try:
+        async with BrowserPool(config, concurrency) as pool:
+            results = await asyncio.gather(*(export_one(pool, url) for url in urls))
+    finally:
+        await engine.close()
+    
+    return list(results)
+
+
+def print_batch_summary(results: List[BatchResult]) -> None:
+    failed = [r for r in results if r.error]
+    print(f"\n📦 Batch complete: {len(results) - len(failed)}/{len(results)} exported")
+    
+    tiers = {tier: sum(1 for r in results if r.tier == tier) for tier in EXTRACTION_TIERS}
+    if any(tiers.values()):
+        print("🧭 Extracted via: " + ", ".join(f"{tier} {count}" for tier, count in tiers.items() if count))
+    
+    loads = sorted(r.timing.total_ms for r in results if r.timing and r.timing.total_ms)
+    if loads:
+        print(f"⏱️  Page load: median {loads[len(loads) // 2]:.0f} ms, max {loads[-1]:.0f} ms "
+              f"over {len(loads)} pages")
+    if failed:
+        print("❌ Failed:")
+        for r in failed:
+            print(f"  - {r.url}: {r.error}")
+
+
+class HttpError(Exception):
+    """An error response for the export server"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ExportServer:
+    """Long-running exporter behind a small local HTTP API
+    
+    The browser, page pool, insights client, extraction cache and search
+    index are created once and shared by all requests. At most
+    ``browser_concurrency`` exports run at a time and ``max_queue`` more may
+    wait; beyond that requests are refused with 503 so callers can back off.
+    
+        POST /export   {"url": ..., "format": ..., "insights": true, "write": true, "markdown": false}
+        GET  /health   liveness and load
+        GET  /stats    server counters and per-stage metrics (JSON)
+        GET  /metrics  the same metrics in the Prometheus text format
+    """
+    
+    MAX_BODY = 64 * 1024
+    KEEP_ALIVE_TIMEOUT = 60.0
+    
+    def __init__(self, config: Config, max_queue: Optional[int] = None):
+        self.config = config
+        self.concurrency = max(1, config.browser_concurrency)
+        self.max_queue = config.server_max_queue if max_queue is None else max_queue
+        self.cache = ExtractionCache.from_config(config)
+        self.index = SearchIndex.from_config(config)
+        self.engine = InsightsEngine(config)
+        self.pool = BrowserPool(config, self.concurrency)
+        self.started = time.time()
+        self.pending = 0
+        self.active = 0
+        self._slots = None
+        self._url_locks: Dict[str, Tuple[Any, int]] = {}  # share ID -> (lock, requests using it)
+        self._loop = None
+        self._connections: Dict[Any, Any] = {}  # writer -> handler task
+    
+    async def start(self) -> ExportServer:
+        import asyncio
+        
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        await self.pool.start()
+        if self.config.server_warm_browser:
+            try:
+                await self.pool._ensure_browser()
+            except Exception as e:
+                # Pages with embedded data still work over HTTP
+                print(f"⚠️ Browser not started ({type(e).__name__}); it will be launched on demand")
+        return self
+    
+    async def close(self) -> None:
+        """Let running exports finish, close idle connections, then release the browser"""
+        import asyncio
+        
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+        await self.pool.close()
+        await self.engine.close()
+        if self.index:
+            self.index.close()
+    
+    def _insights(self, messages: List[Message]) -> Tuple[List[str], List[str]]:
+        # Called from executor threads; all requests go through the one engine
+        import asyncio
+        
+        return asyncio.run_coroutine_threadsafe(self.engine.generate(messages), self._loop).result()
+    
+    async def export(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle one POST /export body"""
+        import asyncio
+        
+        url = request.get("url")
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            raise HttpError(400, "'url' must be an http(s) URL")
+        format_type = request.get("format") or self.config.format
+        if format_type not in FORMAT_BACKENDS:
+            raise HttpError(400, f"'format' must be one of {', '.join(FORMAT_BACKENDS)}")
+        with_insights = bool(request.get("insights", True))
+        
+        if self.pending >= self.concurrency + self.max_queue:
+            raise HttpError(503, "export queue is full, retry later")
+        
+        # Requests for the same conversation would race on its file and manifest entry
+        key = share_id_from_url(url)
+        lock, users = self._url_locks.get(key) or (asyncio.Lock(), 0)
+        self._url_locks[key] = (lock, users + 1)
+        self.pending += 1
+        try:
+            async with lock, self._slots:
+                self.active += 1
+                try:
+                    return await self._export(url, request, format_type, with_insights)
+                finally:
+                    self.active -= 1
+        finally:
+            self.pending -= 1
+            lock, users = self._url_locks[key]
+            if users == 1:
+                del self._url_locks[key]
+            else:
+                self._url_locks[key] = (lock, users - 1)
+    
+    async def _export(self, url: str, request: Dict[str, Any], format_type: str,
+                      with_insights: bool) -> Dict[str, Any]:
+        from dataclasses import replace
+        
+        config = replace(self.config, format=format_type) if format_type != self.config.format else self.config
+        messages = await self.pool.extract(url, self.cache, bool(request.get("refresh")),
+                                           exported_before(url, config, bool(request.get("is_blog"))))
+        self.pool.timings.pop(url, None)
+        tier = self.pool.tiers.pop(url, None)
+        if not messages:
+            raise HttpError(422, "no messages extracted")
+        
+        if not request.get("write", True):
+            insights, tags = (await self.engine.generate(messages)) if with_insights else ([], [])
+            # Nothing is written, so assets are linked remotely (or named) instead of stored
+            markdown = create_markdown(localize_assets(messages, format_type, None), insights, tags, format_type)
+            return {"url": url, "status": "rendered", "tier": tier, "messages": len(messages),
+                    "insights": insights, "tags": tags, "markdown": markdown}
+        
+        # File writes are blocking; keep them off the event loop
+        result = await self._loop.run_in_executor(
+            None, export_conversation, url, messages, config, with_insights, bool(request.get("is_blog")),
+            bool(request.get("refresh_insights")), self._insights, self.index,
+        )
+        if result.error:
+            raise HttpError(500, result.error)
+        await self._loop.run_in_executor(None, ConversationArchive.flush_all)
+        response = {
+            "url": url,
+            "status": result.status,
+            "path": str(result.filepath.resolve()) if result.filepath else None,
+            "tier": tier,
+            "messages": result.message_count,
+            "new_messages": result.new_messages,
+            "insights": result.insights,
+            "tags": result.tags,
+            "duplicate": asdict(result.duplicate) if result.duplicate else None,
+        }
+        if request.get("markdown") and result.filepath:
+            response["markdown"] = result.filepath.read_text(encoding="utf-8")
+        return response
+    
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started, 1),
+            "browser": self.pool._browser is not None,
+            "active": self.active,
+            "queued": self.pending - self.active,
+            "capacity": self.concurrency + self.max_queue,
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"server": self.health(), **METRICS.snapshot()}
+    
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, bytes, str]:
+        """Route one request; returns (status, body, content type)"""
+        if path == "/export":
+            if method != "POST":
+                raise HttpError(405, "use POST")
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpError(400, "body must be JSON")
+            if not isinstance(request, dict):
+                raise HttpError(400, "body must be a JSON object")
+            data = await self.export(request)
+        elif path in ("/health", "/stats", "/metrics"):
+            if method != "GET":
+                raise HttpError(405, "use GET")
+            if path == "/metrics":
+                return 200, METRICS.prometheus().encode(), "text/plain; version=0.0.4"
+            data = self.health() if path == "/health" else self.stats()
+        else:
+            raise HttpError(404, f"no such endpoint: {path}")
+        return 200, json.dumps(data, ensure_ascii=False).encode(), "application/json"
+    
+    async def handle(self, reader, writer) -> None:
+        """Serve HTTP/1.1 requests on one connection (keep-alive supported)"""
+        import asyncio
+        
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                start = time.perf_counter()
+                keep_alive = False
+                path = "?"
+                try:
+                    try:
+                        method, target, version = request_line.decode("latin-1").split()
+                    except ValueError:
+                        raise HttpError(400, "malformed request line")
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    
+                    path = urlsplit(target).path
+                    declared = headers.get("content-length") or "0"
+                    if not re.fullmatch(r"[0-9]+", declared):
+                        # The body can't be told apart from the next request
+                        keep_alive = False
+                        raise HttpError(400, f"invalid Content-Length: {declared!r}")
+                    length = int(declared)
+                    if length > self.MAX_BODY:
+                        keep_alive = False
+                        raise HttpError(413, "request body too large")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload, content_type = await self.dispatch(method, path, body)
+                except HttpError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode()
+                except Exception as e:
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+                
+                METRICS.count("server_requests", endpoint=path, status=status)
+                METRICS.event("server_request", _elapsed_ms(start), endpoint=path, status=status)
+                writer.write(_http_response(status, payload, content_type, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+
+def _http_response(status: int, body: bytes, content_type: str, keep_alive: bool) -> bytes:
+    from http import HTTPStatus
+    
+    headers = [
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def serve(config: Config, host: Optional[str] = None, port: Optional[int] = None,
+                socket_path: Optional[str] = None, max_queue: Optional[int] = None) -> None:
+    """Run an ExportServer on a TCP port or a Unix socket until SIGINT/SIGTERM"""
+    import asyncio
+    import signal
+    
+    server = await ExportServer(config, max_queue).start()
+    if socket_path:
+        socket_path = os.path.expanduser(socket_path)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+        print(f"🛰️  Serving on unix:{socket_path}")
+    else:
+        listener = await asyncio.start_server(server.handle, host or config.server_host,
+                                              port or config.server_port)
+        address = listener.sockets[0].getsockname()
+        print(f"🛰️  Serving on http://{address[0]}:{address[1]}")
+    
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        print("🛑 Shutting down")
+        listener.close()
+        await server.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+JOB_STATES = ("queued", "extracted", "insights_done", "written", "failed")
+JOB_STEPS = {"queued": "extract", "extracted": "insights", "insights_done": "write"}  # state -> next step
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    failed_state TEXT,
+    error TEXT,
+    messages TEXT,
+    insights TEXT,
+    path TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, next_attempt);
+"""
+
+
+@dataclass
+class Job:
+    """One URL tracked through the stages queued → extracted → insights_done → written"""
+    id: int
+    url: str
+    state: str
+    attempts: int
+    messages: Optional[List[Message]] = None
+    insights: Optional[Tuple[List[str], List[str]]] = None
+
+
+class JobQueue:
+    """Persistent job store for resumable bulk exports
+    
+    A job only advances once its current stage succeeded, and extracted
+    messages and generated insights are stored with it. A run that is
+    interrupted therefore resumes each job at the stage it was in, without
+    repeating browser work or OpenAI calls. A failed stage is retried with
+    exponential backoff; after ``max_attempts`` the job is marked failed.
+    
+    Use one ``queue run`` per queue file.
+    """
+    
+    def __init__(self, path: Path, max_attempts: int = 5, retry_delay: float = 10.0,
+                 max_retry_delay: float = 600.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(QUEUE_SCHEMA)
+    
+    @classmethod
+    def open(cls, config: Config) -> JobQueue:
+        return cls(data_path(config, config.queue_path, "queue.db"), config.queue_max_attempts,
+                   config.queue_retry_delay, config.queue_max_retry_delay)
+    
+    def close(self) -> None:
+        self.conn.close()
+    
+    def add(self, urls: List[str], requeue: bool = False) -> int:
+        """Queue URLs that are not in the store yet (with ``requeue``, also restart written
+        and failed ones); returns the number of jobs queued"""
+        now = time.time()
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (url, created, updated) VALUES (?, ?, ?)",
+                [(url, now, now) for url in urls],
+            )
+            if requeue:
+                self.conn.executemany(
+                    "UPDATE jobs SET state = 'queued', attempts = 0, next_attempt = 0, failed_state = NULL, "
+                    "error = NULL, messages = NULL, insights = NULL, updated = ? "
+                    "WHERE url = ? AND state IN ('written', 'failed')",
+                    [(now, url) for url in urls],
+                )
+            return self.conn.total_changes - before
+    
+    def retry_failed(self) -> int:
+        """Put failed jobs back at the stage they failed in"""
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET state = failed_state, attempts = 0, next_attempt = 0, failed_state = NULL, "
+                "error = NULL, updated = ? WHERE state = 'failed'", (time.time(),)
+            ).rowcount
+    
+    def ready(self, limit: int, exclude: Optional[set] = None) -> List[Job]:
+        """Jobs whose next stage may run now, oldest first"""
+        rows = self.conn.execute(
+            "SELECT id, url, state, attempts, messages, insights FROM jobs "
+            "WHERE state IN ('queued', 'extracted', 'insights_done') AND next_attempt <= ? "
+            "ORDER BY next_attempt, id LIMIT ?", (time.time(), limit + len(exclude or ()))
+        ).fetchall()
+        jobs = []
+        for job_id, url, state, attempts, messages, insights in rows:
+            if exclude and job_id in exclude:
+                continue
+            jobs.append(Job(job_id, url, state, attempts,
+                            [Message(**m) for m in json.loads(messages)] if messages else None,
+                            tuple(json.loads(insights)) if insights else None))
+        return jobs[:limit]
+    
+    def next_wakeup(self) -> Optional[float]:
+        """Seconds until the earliest backed-off job is due (None if no job is pending)"""
+        row = self.conn.execute(
+            "SELECT MIN(next_attempt) FROM jobs WHERE state IN ('queued', 'extracted', 'insights_done')"
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+    
+    def advance(self, job: Job, state: str, **columns: Any) -> None:
+        """Record that ``job`` finished its stage and is now in ``state``"""
+        values = {"state": state, "attempts": 0, "next_attempt": 0, "error": None, "updated": time.time()}
+        values.update(columns)
+        job.state, job.attempts = state, 0
+        with self.conn:
+            self.conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in values)} WHERE id = ?",
+                              (*values.values(), job.id))
+    
+    def fail(self, job: Job, error: str) -> Optional[float]:
+        """Schedule a retry of the job's current stage; returns the delay,
+        or None once the job has used up its attempts and is marked failed"""
+        job.attempts += 1
+        now = time.time()
+        if job.attempts >= self.max_attempts:
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE jobs SET state = 'failed', failed_state = state, attempts = ?, error = ?, updated = ? "
+                    "WHERE id = ?", (job.attempts, error, now, job.id))
+            return None
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET attempts = ?, next_attempt = ?, error = ?, updated = ? WHERE id = ?",
+                              (job.attempts, now + delay, error, now, job.id))
+        return delay
+    
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return counts
+    
+    def failures(self, limit: int = 50) -> List[Tuple[str, str, str]]:
+        """(url, state it failed in, error) of failed jobs, most recent first"""
+        return self.conn.execute(
+            "SELECT url, failed_state, error FROM jobs WHERE state = 'failed' ORDER BY updated DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+
+
+class Inbox:
+    """New URLs dropped into a file or a directory, for ``queue run --watch``
+    
+    A file is re-read whenever it changes (URLs already queued are ignored).
+    In a directory, every file is read once and renamed to ``<name>.done``.
+    """
+    
+    def __init__(self, path: str):
+        self.path = Path(os.path.expanduser(path))
+        self._stamp = None
+    
+    def poll(self) -> List[str]:
+        if self.path.is_dir():
+            urls = []
+            for entry in sorted(self.path.iterdir()):
+                if not entry.is_file() or entry.name.startswith(".") or entry.suffix == ".done":
+                    continue
+                urls.extend(read_urls([], str(entry)))
+                entry.rename(entry.with_name(entry.name + ".done"))
+            return urls
+        
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return []
+        if (stat.st_mtime, stat.st_size) == self._stamp:
+            return []
+        self._stamp = (stat.st_mtime, stat.st_size)
+        return read_urls([], str(self.path))
+
+
+async def run_queue(queue: JobQueue, config: Config, workers: int, with_insights: bool = True,
+                    is_blog: bool = False, inbox: Optional[Inbox] = None) -> Dict[str, int]:
+    """Work through the queue with ``workers`` concurrent jobs sharing one browser
+    
+    Returns when no job is pending, or, with an inbox, keeps polling it until
+    interrupted. SIGINT/SIGTERM stop it after the running stages finish (a
+    second Ctrl+C aborts). Returns the number of jobs written and failed in
+    this run, and whether it was interrupted.
+    """
+    import asyncio
+    import signal
+    
+    loop = asyncio.get_running_loop()
+    engine = InsightsEngine(config)
+    cache = ExtractionCache.from_config(config)
+    index = SearchIndex.from_config(config)
+    with_insights = with_insights and bool(config.openai_api_key)
+    outcome = {"written": 0, "failed": 0, "interrupted": 0}
+    running: Dict[int, Any] = {}  # job id -> task
+    stop = asyncio.Event()
+    
+    def request_stop(sig: int) -> None:
+        print("\n⏸️  Stopping after the running stages (Ctrl+C again to abort)")
+        stop.set()
+        loop.remove_signal_handler(sig)
+    
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, request_stop, sig)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    
+    async def run_stage(job: Job, pool: BrowserPool) -> None:
+        if job.state == "queued":
+            messages = await pool.extract(job.url, cache, revalidate=exported_before(job.url, config, is_blog))
+            pool.timings.pop(job.url, None)
+            if not messages:
+                raise ValueError("no messages extracted")
+            job.messages = messages
+            queue.advance(job, "extracted", messages=json.dumps([asdict(m) for m in messages], ensure_ascii=False))
+        elif job.state == "extracted":
+            job.insights = (await engine.generate(job.messages, raise_errors=True)) if with_insights else ([], [])
+            queue.advance(job, "insights_done", insights=json.dumps(job.insights, ensure_ascii=False))
+        elif job.state == "insights_done":
+            insights_fn = lambda messages: job.insights
+            result = await loop.run_in_executor(
+                None, export_conversation, job.url, job.messages, config, with_insights, is_blog,
+                False, insights_fn, index,
+            )
+            if result.error:
+                raise ValueError(result.error)
+            # The job drops its messages once written, so they must be in the archive by then
+            await loop.run_in_executor(None, ConversationArchive.flush_all)
+            queue.advance(job, "written", path=str(result.filepath), messages=None)
+            outcome["written"] += 1
+            print(f"✅ {job.url} -> {result.filepath} ({result.status}, {result.message_count} messages)")
+    
+    async def work(job: Job, pool: BrowserPool) -> None:
+        while job.state != "written" and not stop.is_set():
+            step = JOB_STEPS[job.state]
+            attempt = job.attempts + 1
+            start = time.perf_counter()
+            try:
+                await run_stage(job, pool)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                METRICS.event(f"job_{step}", _elapsed_ms(start), url=job.url, attempt=attempt,
+                              error=type(e).__name__)
+                delay = queue.fail(job, error)
+                if delay is None:
+                    outcome["failed"] += 1
+                    METRICS.count("jobs", state="failed")
+                    print(f"❌ {job.url}: {step} failed {job.attempts} times: {error}")
+                else:
+                    METRICS.count("job_retries", step=step)
+                    print(f"🔁 {job.url}: {step} failed ({error}), retry {job.attempts} in {delay:.1f} s")
+                return
+            METRICS.event(f"job_{step}", _elapsed_ms(start), url=job.url, attempt=attempt)
+        if job.state == "written":
+            METRICS.count("jobs", state="written")
+    
+    try:
+        async with BrowserPool(config, workers) as pool:
+            while True:
+                if inbox and not stop.is_set():
+                    added = queue.add(inbox.poll())
+                    if added:
+                        print(f"📥 {added} new URLs from {inbox.path}")
+                
+                if not stop.is_set():
+                    for job in queue.ready(workers - len(running), exclude=set(running)):
+                        running[job.id] = asyncio.ensure_future(work(job, pool))
+                
+                if running:
+                    done, _ = await asyncio.wait(list(running.values()), timeout=config.queue_poll_interval,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    for job_id in [i for i, task in running.items() if task in done]:
+                        running.pop(job_id).result()
+                    continue
+                
+                wakeup = queue.next_wakeup()
+                if stop.is_set() or (wakeup is None and not inbox):
+                    break
+                try:
+                    await asyncio.wait_for(stop.wait(), min(wakeup, config.queue_poll_interval)
+                                           if wakeup is not None else config.queue_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        for task in running.values():
+            task.cancel()
+        await engine.close()
+    outcome["interrupted"] = int(stop.is_set())
+    return outcome
+
+
+def iter_export_conversations(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yield conversations one at a time from a data export's conversations.json
+    
+    The file is a single JSON array; only the conversation currently being
+    decoded is held in memory, so arbitrarily large exports can be read.
+    """
+    decoder = json.JSONDecoder()
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = f.read(chunk_size)
+        pos = 0
+        started = False
+        
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            
+            if pos == len(buf):
+                buf = f.read(chunk_size)
+                pos = 0
+                if not buf:
+                    raise ValueError(f"Unexpected end of file in {path}")
+                continue
+            
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError(f"{path} is not a conversations.json export (expected a JSON array)")
+                started = True
+                pos += 1
+                continue
+            
+            if buf[pos] == ']':
+                return
+            
+            try:
+                conversation, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Incomplete object: grow the window geometrically so each
+                # conversation is decoded in amortized linear time
+                more = f.read(max(chunk_size, len(buf) - pos))
+                if not more:
+                    raise
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            
+            yield conversation
+            pos = end
+            if pos >= chunk_size:
+                buf = buf[pos:]
+                pos = 0
+
+
+def _run_bounded(fn: Callable[..., Any], calls: Iterable[Tuple], workers: int,
+                 max_pending: int) -> Iterator[Any]:
+    """Yield fn(*args) for each args in calls, as they finish, from a process pool
+    
+    At most max_pending calls are in flight, so memory stays flat. With one
+    worker the calls run in this process, which saves starting the pool.
+    """
+    if workers <= 1:
+        for args in calls:
+            yield fn(*args)
+        return
+    
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for args in calls:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(fn, *args))
+        
+        done, _ = wait(pending)
+        for future in done:
+            yield future.result()
+
+
+# This process's InsightsEngine for imports, as (config, event loop, engine)
+_import_engine: Optional[Tuple[Config, Any, InsightsEngine]] = None
+
+
+def _import_insights(messages: List[Message], config: Config) -> Tuple[List[str], List[str]]:
+    """Insights for one imported conversation, from this process's InsightsEngine
+    
+    The engine and its event loop outlive the conversation, so everything a
+    worker imports shares one client, rate limiter and response cache.
+    """
+    global _import_engine
+    if not config.openai_api_key:
+        return [], []
+    
+    if _import_engine is None or _import_engine[0] != config:
+        import asyncio
+        
+        _close_import_engine()
+        _import_engine = (config, asyncio.new_event_loop(), InsightsEngine(config))
+    _, loop, engine = _import_engine
+    return loop.run_until_complete(engine.generate(messages))
+
+
+def _close_import_engine() -> None:
+    global _import_engine
+    if _import_engine is not None:
+        _, loop, engine = _import_engine
+        _import_engine = None
+        loop.run_until_complete(engine.close())
+        loop.close()
+
+
+def _import_conversation(conversation: Dict[str, Any], config: Config, with_insights: bool,
+                         index: Optional[SearchIndex] = None) -> BatchResult:
+    """Render and write one conversation from a data export (runs in a worker process)"""
+    conv_id = conversation.get('conversation_id') or conversation.get('id') or ""
+    label = conversation.get('title') or conv_id or "untitled"
+    
+    try:
+        messages = parse_extraction_result(conversation, config.branch_mode, NoiseFilter.from_config(config))
+        filtered = METRICS.take("filtered")
+        if not messages:
+            return BatchResult(label, error="no messages", filtered=filtered)
+        
+        create_time = conversation.get('create_time')
+        date = datetime.fromtimestamp(create_time) if create_time else None
+        
+        insights, tags = [], []
+        if with_insights:
+            insights, tags = _import_insights(messages, config)
+        
+        # Exports often contain many conversations with the same opening line
+        # on the same day, so disambiguate with the conversation ID
+        output_dir = resolve_output_dir(config)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        extracted = messages
+        store = AssetStore.for_config(config, output_dir)
+        messages = localize_assets(messages, config.format, output_dir, store)
+        filepath = output_dir / make_filename(messages, date, suffix=f"-{conv_id[:8]}" if conv_id else "")
+        title = conversation.get('title')
+        with METRICS.timer("write", url=label, status="created", messages=len(messages)):
+            write_markdown(filepath, messages, insights, tags, config.format, title=title, date=date)
+        date_str = (date or datetime.now()).strftime('%Y-%m-%d')
+        archive = ConversationArchive.for_config(config)
+        if archive:
+            # Each worker process appends to its own part files
+            archive.add(conv_id or label, None, title or conversation_title(messages), filepath, False, extracted,
+                        date=date_str, insights=insights, tags=tags, assets=store)
+            archive.flush()
+        if index:
+            _update_index(index.add, filepath, messages, title or conversation_title(messages), date_str, tags)
+        return BatchResult(label, filepath, len(messages), filtered=filtered)
+    except Exception as e:
+        return BatchResult(label, error=f"{type(e).__name__}: {e}")
+
+
+def import_data_export(path: str, config: Config, workers: Optional[int] = None,
+                       with_insights: bool = True, index: Optional[SearchIndex] = None) -> List[BatchResult]:
+    """Convert every conversation in a data export, rendering in a process pool
+    
+    Images and files are copied from the export's directory, where they
+    sit next to conversations.json. Each worker process generates insights
+    with one InsightsEngine, limited to its share of the API rate limits.
+    """
+    from dataclasses import replace
+    
+    config = replace(config, assets_search_paths=[*config.assets_search_paths,
+                                                  os.path.dirname(os.path.abspath(path))])
+    workers = workers or os.cpu_count() or 1
+    if with_insights:
+        # Each worker process has its own InsightsEngine, so each gets an
+        # equal share of the API rate limits
+        config = replace(config,
+                         openai_requests_per_minute=config.openai_requests_per_minute and
+                         max(1, config.openai_requests_per_minute // workers),
+                         openai_tokens_per_minute=config.openai_tokens_per_minute and
+                         max(1, config.openai_tokens_per_minute // workers))
+    calls = ((conversation, config, with_insights, index) for conversation in iter_export_conversations(path))
+    results = []
+    try:
+        for result in _run_bounded(_import_conversation, calls, workers, max_pending=workers * 2):
+            if result.error:
+                print(f"❌ {result.url}: {result.error}")
+            else:
+                print(f"✅ {result.filepath} ({result.message_count} messages)")
+            for labels, value in result.filtered:
+                METRICS.count("filtered", value, **dict(labels))
+            results.append(result)
+    finally:
+        # Only set here when importing in this process; worker processes'
+        # engines go away with them
+        _close_import_engine()
+    
+    return results
+
+
+def _render_conversation(conversation: ArchivedConversation, config: Config,
+                         members: List[Tuple[str, str, int]]) -> Tuple[BatchResult, Dict[str, Dict[str, Any]]]:
+    """Write one archived conversation (runs in a worker process) and return manifest entries
+    
+    ``members`` are the (key, URL, message count) of the share URL exports
+    the file holds: the conversation itself, and any merged into it.
+    """
+    label = conversation.url or conversation.title
+    try:
+        output_dir = resolve_output_dir(config, conversation.is_blog)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        store = AssetStore.for_config(config, output_dir, offline=True)
+        messages = localize_assets(conversation.messages, config.format, output_dir, store)
+        date = datetime.strptime(conversation.date, '%Y-%m-%d') if conversation.date else None
+        filepath = output_dir / (conversation.path or make_filename(messages, date, suffix=f"-{conversation.key[:8]}"))
+        note, start = None, 0
+        if conversation.duplicate and conversation.duplicate.get("mode") == "linked":
+            note, start = duplicate_note(conversation.duplicate, config.format, output_dir)
+        
+        with METRICS.timer("write", url=label, status="rendered", messages=len(messages) - start):
+            body_end = write_markdown(filepath, messages[start:], conversation.insights, conversation.tags,
+                                      config.format, title=conversation.title, date=date, note=note)
+        entries = {}
+        if conversation.path:
+            entries = {key: ExportManifest.entry(url, filepath, messages[:count], config.format, body_end)
+                       for key, url, count in members}
+        return BatchResult(label, filepath, len(messages), status="rendered"), entries
+    except Exception as e:
+        return BatchResult(label, error=f"{type(e).__name__}: {e}"), {}
+
+
+def render_archive(config: Config, workers: Optional[int] = None) -> List[BatchResult]:
+    """Rewrite every archived conversation in config's format, without a browser or network
+    
+    Files keep the names they were exported under, and images and files are
+    copied from the asset stores of the original exports. Duplicate handling
+    is replayed: conversations merged into another one's file are rendered
+    into that file, and linked ones start after the shared turns with a note
+    linking to where their match is rendered. Share URL exports are recorded
+    in the output manifest, so later exports append to the rendered files.
+    """
+    from dataclasses import replace
+    
+    archive = ConversationArchive.for_config(config)
+    rows = archive.latest_rows() if archive else {}
+    # Images and files are copied from wherever earlier exports stored them
+    stores = sorted({row["assets"] for row in rows.values() if row.get("assets")})
+    config = replace(config, assets_search_paths=[*config.assets_search_paths, *stores])
+    
+    # A file holds its own conversation plus any merged into it, each a prefix
+    # of the longest one, which is what the file is rendered from
+    files: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows.values():
+        if row["path"]:
+            files.setdefault(row["path"], []).append(row)
+    owners, longest, rendered = {}, {}, {}
+    for name, file_rows in files.items():
+        own = [row for row in file_rows if (row["duplicate"] or {}).get("mode") != "merged"]
+        owners[name] = own[0] if own else file_rows[0]
+        longest[name] = max(file_rows, key=lambda row: row["message_count"])["key"]
+        rendered[name] = resolve_output_dir(config, owners[name]["is_blog"]) / name
+    
+    def calls():
+        # Conversations are read from the archive and pickled to the workers
+        # one at a time, so only the few in flight are held in memory
+        for conversation in archive.conversations(rows) if archive else ():
+            name = conversation.path
+            if name and longest[name] != conversation.key:
+                continue  # rendered as part of the longest conversation in its file
+            members = []
+            if name:
+                members = [(row["key"], row["url"], row["message_count"]) for row in files[name] if row["url"]]
+                owner = owners[name]
+                conversation = replace(conversation, title=owner["title"], date=owner["date"],
+                                       is_blog=owner["is_blog"], insights=owner["insights"],
+                                       tags=owner["tags"], duplicate=owner["duplicate"])
+            if conversation.duplicate and conversation.duplicate.get("mode") == "linked":
+                # Link to where the match is rendered now, if it is in the archive
+                target = conversation.duplicate["target"]
+                conversation.duplicate = dict(conversation.duplicate,
+                                              target=str(rendered.get(Path(target).name, target)))
+            yield conversation, config, members
+    
+    workers = workers or os.cpu_count() or 1
+    results = []
+    entries: Dict[Path, Dict[str, Dict[str, Any]]] = {}
+    for result, file_entries in _run_bounded(_render_conversation, calls(), workers, max_pending=workers * 4):
+        if result.error:
+            print(f"❌ {result.url}: {result.error}")
+        elif file_entries:
+            entries.setdefault(result.filepath.parent, {}).update(file_entries)
+        results.append(result)
+    
+    for directory, directory_entries in entries.items():
+        ExportManifest.for_directory(directory).update(directory_entries)
+    return results
+
+
+def search_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py search",
+        description="Search exported conversations",
+        epilog="Queries use SQLite FTS5 syntax: words, \"exact phrases\", prefix*, AND/OR/NOT",
+    )
+    parser.add_argument("query", nargs="+", help="Search terms")
+    parser.add_argument("--limit", "-n", type=int, default=20, help="Maximum number of hits (default: 20)")
+    parser.add_argument("--tag", type=str, help="Only conversations with this tag")
+    parser.add_argument("--speaker", choices=list(SPEAKER_EMOJI), help="Only messages from this speaker")
+    parser.add_argument("--config", type=str, default="config.yaml",
+                        help="Configuration file path (default: config.yaml)")
+    args = parser.parse_args(argv)
+    
+    config = Config.from_file(args.config)
+    index = SearchIndex.open(config)
+    
+    start = time.perf_counter()
+    hits = index.search(" ".join(args.query), args.limit, args.tag, args.speaker)
+    elapsed = _elapsed_ms(start)
+    
+    for i, hit in enumerate(hits, 1):
+        print(f"{i}. {hit.title} ({hit.date})")
+        print(f"   {hit.path}")
+        print(f"   {SPEAKER_EMOJI.get(hit.speaker, '🤖')} {hit.speaker}: {' '.join(hit.snippet.split())}")
+    print(f"\n🔎 {len(hits)} hits in {elapsed:.1f} ms")
+    return 0 if hits else 1
+
+
+def reindex_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py reindex",
+        description="Update the search index from exported files on disk",
+    )
+    parser.add_argument("paths", nargs="*",
+                        help="Directories to index (default: the configured output directory and Obsidian folders)")
+    parser.add_argument("--full", action="store_true", help="Rebuild the index from scratch")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--config", type=str, default="config.yaml",
+                        help="Configuration file path (default: config.yaml)")
+    args = parser.parse_args(argv)
+    
+    config = Config.from_file(args.config)
+    index = SearchIndex.open(config)
+    roots = [Path(p).expanduser().resolve() for p in args.paths] or index_roots(config)
+    
+    print(f"🗂️  Indexing {', '.join(str(r) for r in roots)}")
+    start = time.perf_counter()
+    indexed, removed = reindex(index, roots, args.workers, args.full)
+    print(f"✅ {indexed} files indexed, {removed} removed in {_elapsed_ms(start) / 1000:.1f} s ({index.path})")
+    return 0
+
+
+def render_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py render",
+        description="Rewrite the markdown of every archived conversation, without a browser or network",
+    )
+    parser.add_argument("--format", choices=list(FORMAT_BACKENDS),
+                        help="Output format (overrides config)")
+    parser.add_argument("--output", type=str,
+                        help="Output directory (overrides config)")
+    parser.add_argument("--obsidian-vault", type=str,
+                        help="Obsidian vault path (overrides config)")
+    parser.add_argument("--no-assets", action="store_true",
+                        help="Link or name images and files instead of using stored copies")
+    parser.add_argument("--workers", type=int, help="Render processes (default: CPU count)")
+    parser.add_argument("--config", type=str, default="config.yaml",
+                        help="Configuration file path (default: config.yaml)")
+    args = parser.parse_args(argv)
+    
+    config = Config.from_file(args.config)
+    # Read the archive the configured exports wrote, wherever this render writes to
+    config.archive_path = str(data_path(config, config.archive_path, "archive"))
+    apply_overrides(args, config)
+    if not config.archive_enabled:
+        print("❌ The archive is disabled (archive.enabled in the configuration)")
+        return 1
+    
+    print(f"🗄️  Rendering {config.archive_path} as {config.format}")
+    start = time.perf_counter()
+    results = render_archive(config, args.workers)
+    failed = sum(1 for r in results if r.error)
+    print(f"✅ {len(results) - failed} files written in {_elapsed_ms(start) / 1000:.1f} s"
+          + (f", {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+def serve_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py serve",
+        description="Run a warm exporter with a local HTTP API (POST /export, GET /health, /stats, /metrics)",
+    )
+    parser.add_argument("--host", type=str, help="Address to listen on (default: config or 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="TCP port (default: config or 8765)")
+    parser.add_argument("--socket", type=str, metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--concurrency", type=int, help="Exports running at the same time (overrides config)")
+    parser.add_argument("--max-queue", type=int,
+                        help="Requests that may wait for a free slot before new ones get 503 (overrides config)")
+    parser.add_argument("--config", type=str, default="config.yaml",
+                        help="Configuration file path (default: config.yaml)")
+    args = parser.parse_args(argv)
+    
+    config = Config.from_file(args.config)
+    if args.concurrency:
+        config.browser_concurrency = args.concurrency
+    if config.metrics_json:
+        METRICS.open_json_lines(config.metrics_json)
+    
+    import asyncio
+    
+    try:
+        asyncio.run(serve(config, args.host, args.port, args.socket or config.server_socket, args.max_queue))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        METRICS.close()
+    return 0
+
+
+def queue_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py queue",
+        description="Resumable bulk exports: queue URLs, then work through them with retries",
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", type=str, default="config.yaml",
+                        help="Configuration file path (default: config.yaml)")
+    actions = parser.add_subparsers(dest="action", metavar="ACTION")
+    actions.required = True
+    
+    add = actions.add_parser("add", parents=[common], help="Queue share URLs")
+    add.add_argument("urls", nargs="*", metavar="url", help="ChatGPT share URL(s)")
+    add.add_argument("--input-file", "-i", type=str, help="Read URLs from a file, one per line (- for stdin)")
+    add.add_argument("--requeue", action="store_true", help="Also restart URLs that were written or failed")
+    
+    run = actions.add_parser("run", parents=[common], help="Process queued jobs until none are left")
+    run.add_argument("--workers", type=int, help="Jobs processed at the same time (default: browser concurrency)")
+    run.add_argument("--watch", type=str, metavar="INBOX",
+                     help="Keep running and queue URLs added to this file or directory")
+    run.add_argument("--no-insights", action="store_true", help="Skip AI insights generation")
+    run.add_argument("--is-blog", action="store_true", help="Save as blog drafts in the Obsidian vault")
+    run.add_argument("--metrics-json", type=str, metavar="PATH",
+                     help="Append per-stage timings and counts as JSON lines to PATH (- for stderr)")
+    
+    status = actions.add_parser("status", parents=[common], help="Show how many jobs are in each state")
+    status.add_argument("--failed", action="store_true", help="List failed jobs and their errors")
+    
+    actions.add_parser("retry", parents=[common], help="Retry failed jobs from the stage they failed in")
+    args = parser.parse_args(argv)
+    
+    config = Config.from_file(args.config)
+    queue = JobQueue.open(config)
+    try:
+        if args.action == "add":
+            urls = read_urls(args.urls, args.input_file)
+            added = queue.add(urls, args.requeue)
+            print(f"📥 {added} of {len(urls)} URLs queued ({queue.path})")
+        elif args.action == "retry":
+            print(f"🔁 {queue.retry_failed()} failed jobs queued again")
+        elif args.action == "status":
+            counts = queue.counts()
+            print("📋 " + ", ".join(f"{state} {count}" for state, count in counts.items()))
+            if args.failed:
+                for url, state, error in queue.failures():
+                    print(f"  ❌ {url} ({JOB_STEPS.get(state, state)}): {error}")
+        else:
+            import asyncio
+            
+            metrics_json = args.metrics_json or config.metrics_json
+            if metrics_json:
+                METRICS.open_json_lines(metrics_json)
+            workers = args.workers or config.browser_concurrency
+            inbox = Inbox(args.watch) if args.watch else None
+            print(f"🏃 Processing {queue.path} with {workers} workers"
+                  + (f", watching {inbox.path}" if inbox else ""))
+            try:
+                outcome = asyncio.run(run_queue(queue, config, workers, not args.no_insights, args.is_blog, inbox))
+            except KeyboardInterrupt:
+                print("\n⏸️  Interrupted; run again to resume")
+                return 130
+            finally:
+                METRICS.close()
+            counts = queue.counts()
+            print(f"\n📦 {outcome['written']} written, {outcome['failed']} failed in this run "
+                  f"({counts['written']} written, {counts['failed']} failed in total)")
+            if outcome["interrupted"]:
+                print("⏸️  Interrupted; run again to resume")
+                return 130
+            return 1 if outcome["failed"] else 0
+    finally:
+        queue.close()
+    return 0
+
+
+def config_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py config",
+        description="Check a configuration file",
     )
+    parser.add_argument("action", choices=["validate", "show"],
+                        help="validate: report invalid settings; show: print the effective configuration")
+    parser.add_argument("--config", type=str, default="config.yaml",
+                        help="Configuration file path (default: config.yaml)")
+    args = parser.parse_args(argv)
+    
+    if not os.path.exists(args.config):
+        print(f"⚠️ {args.config} not found, using defaults")
+    try:
+        config = Config.from_file(args.config)
+    except Exception as e:
+        print(f"❌ {args.config}: {e}")
+        return 1
+    
+    if args.action == "show":
+        settings = asdict(config)
+        if settings["openai_api_key"]:
+            settings["openai_api_key"] = settings["openai_api_key"][:3] + "..."
+        print(json.dumps(settings, indent=2, ensure_ascii=False))
+        return 0
     
-    parser.add_argument("url", help="ChatGPT share URL")
+    problems = config.validate()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        return 1
+    print(f"✅ {args.config} is valid")
+    return 0
+
+
+def _add_output_options(parser: argparse.ArgumentParser) -> None:
+    """Options shared by the export and import commands"""
     parser.add_argument("--config", type=str, default="config.yaml",
                         help="Configuration file path (default: config.yaml)")
-    parser.add_argument("--format", choices=["standard", "obsidian", "blog"],
+    parser.add_argument("--format", choices=list(FORMAT_BACKENDS),
                         help="Output format (overrides config)")
     parser.add_argument("--output", type=str,
                         help="Output directory (overrides config)")
+    parser.add_argument("--obsidian-vault", type=str,
+                        help="Obsidian vault path (overrides config)")
+    parser.add_argument("--insights-mode", choices=["truncate", "map_reduce"],
+                        help="Insights from the first 12,000 characters (truncate) or the whole conversation (map_reduce)")
     parser.add_argument("--no-insights", action="store_true",
                         help="Skip AI insights generation")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Do not add exported conversations to the search index")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Do not add exported conversations to the archive that render reads")
+    parser.add_argument("--no-assets", action="store_true",
+                        help="Do not download images and attached files (link or name them instead)")
+    parser.add_argument("--metrics-json", type=str, metavar="PATH",
+                        help="Append per-stage timings and counts as JSON lines to PATH (- for stderr)")
+    parser.add_argument("--metrics-prometheus", type=str, metavar="PATH",
+                        help="Write run metrics to a Prometheus textfile (e.g. for node_exporter)")
+    parser.add_argument("--profile", type=str, metavar="PATH",
+                        help="Profile the run with cProfile and write the stats to PATH")
+
+
+def import_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="chatgpt_to_markdown.py import",
+        description="Convert conversations.json from a ChatGPT data export, without a browser",
+    )
+    parser.add_argument("from_export", metavar="CONVERSATIONS_JSON",
+                        help="conversations.json from Settings → Data controls → Export data")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    _add_output_options(parser)
+    args = parser.parse_args(argv)
+    return run_with_metrics(args, [])
+
+
+def export_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Export ChatGPT conversations as beautiful markdown files",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Commands (run with --help for their options):
+  [export] URL...            Export share URLs (the default command)
+  import CONVERSATIONS_JSON  Convert a ChatGPT data export
+  search QUERY               Search exported conversations
+  reindex [PATH...]          Update the search index from files on disk
+  render                     Rewrite every archived conversation, offline
+  serve                      Run a warm exporter with a local HTTP API
+  queue add|run|status|retry Resumable bulk exports with retries
+  config validate|show       Check the configuration file
+
+Examples:
+  %(prog)s https://chatgpt.com/share/...
+  %(prog)s https://chatgpt.com/share/... --format obsidian
+  %(prog)s https://chatgpt.com/share/... --output ./conversations
+  %(prog)s https://chatgpt.com/share/... --config config.yaml
+  %(prog)s https://chatgpt.com/share/... --no-insights --show-browser
+  %(prog)s https://chatgpt.com/share/a https://chatgpt.com/share/b --concurrency 8
+  %(prog)s --input-file urls.txt
+  cat urls.txt | %(prog)s --input-file -
+  %(prog)s import ~/Downloads/chatgpt-export/conversations.json --no-insights
+  %(prog)s search "vector database" --tag python
+  %(prog)s reindex
+  %(prog)s render --format obsidian --obsidian-vault ~/vault
+  %(prog)s serve --port 8765
+  %(prog)s queue add -i urls.txt && %(prog)s queue run --workers 8
+  %(prog)s config validate
+        """
+    )
+    
+    parser.add_argument("urls", nargs="*", metavar="url", help="ChatGPT share URL(s)")
+    parser.add_argument("--input-file", "-i", type=str,
+                        help="Read share URLs from a file, one per line (- for stdin)")
+    parser.add_argument("--concurrency", type=int,
+                        help="Pages processed in parallel in batch mode (overrides config)")
+    parser.add_argument("--from-export", type=str, metavar="CONVERSATIONS_JSON",
+                        help="Same as the import command")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes for --from-export (default: CPU count)")
+    parser.add_argument("--branches", choices=list(BRANCH_MODES),
+                        help="Which conversation branches to export: active (default), all, or summary")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached extractions and re-scrape (the cache is still updated)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Neither read nor write the extraction cache")
+    parser.add_argument("--full-export", action="store_true",
+                        help="Write a new file instead of updating a previous export of the same URL")
+    parser.add_argument("--refresh-insights", action="store_true",
+                        help="Regenerate insights when updating a previous export")
+    parser.add_argument("--duplicates", choices=list(DUPLICATE_MODES),
+                        help="What to do when the conversation duplicates, extends or forks an indexed one: "
+                             "write a full copy (default), skip it, link to it with only the new turns, "
+                             "or merge new turns into it")
     parser.add_argument("--show-browser", action="store_true",
                         help="Show browser window (for debugging)")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="Block images, fonts, media and analytics and stop waiting once conversation data is present")
+    parser.add_argument("--browser-only", action="store_true",
+                        help="Always load pages in the browser instead of trying plain HTTP first")
     parser.add_argument("--timeout", type=int,
                         help="Timeout in milliseconds (overrides config)")
-    parser.add_argument("--obsidian-vault", type=str,
-                        help="Obsidian vault path (overrides config)")
     parser.add_argument("--is-blog", action="store_true",
                         help="Save as blog draft in Obsidian vault")
+    _add_output_options(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    # Load configuration
-    config = Config.from_file(args.config)
+    urls = read_urls(args.urls, args.input_file)
+    if not urls and not args.from_export:
+        parser.error("at least one URL is required (as an argument or via --input-file)")
+    return run_with_metrics(args, urls)
+
+
+COMMANDS = {
+    "export": export_main,
+    "import": import_main,
+    "search": search_main,
+    "reindex": reindex_main,
+    "render": render_main,
+    "serve": serve_main,
+    "queue": queue_main,
+    "config": config_main,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return export_main(argv)
+
+
+def apply_overrides(args: argparse.Namespace, config: Config) -> None:
+    """Override config with the command line arguments the command has"""
+    option = lambda name: getattr(args, name, None)
     
-    # Override config with command line arguments
-    if args.format:
+    if option("format"):
         config.format = args.format
-    if args.output:
+    if option("output"):
         config.output_dir = args.output
-    if args.show_browser:
+    if option("show_browser"):
         config.browser_headless = False
-    if args.timeout:
+    if option("timeout"):
         config.browser_timeout = args.timeout
-    if args.obsidian_vault:
+    if option("concurrency"):
+        config.browser_concurrency = args.concurrency
+    if option("fast_load"):
+        config.browser_fast_load = True
+    if option("browser_only"):
+        config.http_fast_path = False
+    if option("obsidian_vault"):
         config.obsidian_vault = os.path.expanduser(args.obsidian_vault)
+    if option("branches"):
+        config.branch_mode = args.branches
+    
+    if option("no_cache"):
+        config.cache_enabled = False
+    if option("full_export"):
+        config.incremental = False
+    if option("insights_mode"):
+        config.insights_mode = args.insights_mode
+    if option("no_index"):
+        config.index_enabled = False
+    if option("no_assets"):
+        config.assets_enabled = False
+    if option("no_archive"):
+        config.archive_enabled = False
+    if option("duplicates"):
+        config.duplicates = args.duplicates
+    if option("metrics_json"):
+        config.metrics_json = args.metrics_json
+    if option("metrics_prometheus"):
+        config.metrics_prometheus = args.metrics_prometheus
+
+
+def run_with_metrics(args: argparse.Namespace, urls: List[str]) -> int:
+    """Load the configuration, then run the export with metrics and the optional profiler"""
+    config = Config.from_file(args.config)
+    apply_overrides(args, config)
     
+    if config.metrics_json:
+        METRICS.open_json_lines(config.metrics_json)
+    profiler = None
+    if args.profile:
+        import cProfile
+        
+        profiler = cProfile.Profile()
+    start = time.perf_counter()
+    exit_code = 1
+    try:
+        if profiler:
+            profiler.enable()
+        exit_code = run_export(args, config, urls)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"🧪 Profile written to {args.profile} (python -m pstats {args.profile})")
+        ConversationArchive.flush_all()
+        METRICS.event("run", _elapsed_ms(start), urls=len(urls), from_export=bool(args.from_export),
+                      exit_code=exit_code)
+        if config.metrics_prometheus:
+            METRICS.write_prometheus(config.metrics_prometheus)
+        METRICS.close()
+    return exit_code
+
+
+def _count_exports(results: List[BatchResult]) -> None:
+    for r in results:
+        METRICS.count("exports", status="failed" if r.error else r.status)
+
+
+def run_export(args: argparse.Namespace, config: Config, urls: List[str]) -> int:
+    """Export (or import) what the command line asked for and return the exit code"""
     print(f"\n🚀 ChatGPT to Markdown Exporter")
-    print(f"📍 URL: {args.url}")
+    
+    if args.from_export:
+        print(f"📂 Importing data export: {args.from_export}")
+        results = import_data_export(args.from_export, config, args.workers,
+                                     with_insights=not args.no_insights, index=SearchIndex.from_config(config))
+        _count_exports(results)
+        print_batch_summary(results)
+        return 0 if all(r.error is None for r in results) else 1
+    
+    cache = ExtractionCache.from_config(config)
+    index = SearchIndex.from_config(config)
+    
+    if len(urls) > 1 or args.input_file:
+        import asyncio
+        
+        print(f"📦 Batch mode: {len(urls)} URLs")
+        results = asyncio.run(export_batch(
+            urls, config, config.browser_concurrency,
+            with_insights=not args.no_insights, is_blog=args.is_blog,
+            cache=cache, refresh=args.refresh, refresh_insights=args.refresh_insights, index=index,
+        ))
+        _count_exports(results)
+        print_batch_summary(results)
+        return 0 if all(r.error is None for r in results) else 1
+    
+    url = urls[0]
+    print(f"📍 URL: {url}")
     
     # Extract messages
-    messages = extract_messages_with_playwright(args.url, config)
+    messages = extract_messages(url, config, cache, args.refresh, exported_before(url, config, args.is_blog))
     
     if not messages:
+        METRICS.count("exports", status="failed")
         print("\n❌ Failed to extract messages")
         print("💡 Tips:")
         print("  1. Ensure the URL is a valid share link")
@@ -435,58 +5026,33 @@ Examples:
         print("  3. Increase timeout with --timeout 60000")
         return 1
     
-    # Generate insights and tags
-    insights = []
-    tags = []
-    if not args.no_insights:
-        print("\n💭 Generating insights and tags...")
-        insights, tags = generate_insights_and_tags(messages, config)
-        if insights:
-            print(f"✅ Generated {len(insights)} insights")
-        if tags:
-            print(f"✅ Generated {len(tags)} tags")
-    
-    # Create markdown
-    markdown = create_markdown(messages, insights, tags, config.format)
-    
-    # Generate filename
-    title_seed = ""
-    for m in messages:
-        if m.speaker == "User":
-            title_seed = re.sub(r"[^\w\s\-]", "", m.content[:50])
-            break
-    
-    filename = f"{datetime.now().strftime('%Y-%m-%d')}-chatgpt-{title_seed or 'conversation'}.md"
+    # Generate insights, render and write (or update a previous export)
+    result = export_conversation(url, messages, config, with_insights=not args.no_insights,
+                                 is_blog=args.is_blog, refresh_insights=args.refresh_insights, index=index)
+    _count_exports([result])
     
-    # Determine output path
-    if config.obsidian_vault and config.format == "obsidian":
-        # Use Obsidian vault structure
-        vault_path = Path(config.obsidian_vault)
-        if args.is_blog:
-            output_dir = vault_path / config.obsidian_blog
-        else:
-            output_dir = vault_path / config.obsidian_slipbox
+    if result.status == "unchanged":
+        print(f"\n✅ Already up to date: {result.filepath}")
+    elif result.status == "appended":
+        print(f"\n✅ Appended {result.new_messages} new messages to: {result.filepath}")
+    elif result.status == "skipped":
+        print(f"\n⏭️  Skipped: {result.duplicate.kind} of {result.filepath}")
+    elif result.status == "merged":
+        print(f"\n✅ Merged {result.new_messages} new messages into: {result.filepath}")
     else:
-        # Use regular output directory
-        output_dir = Path(config.output_dir)
-    
-    output_dir.mkdir(parents=True, exist_ok=True)
-    filepath = output_dir / filename
-    
-    # Save file
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(markdown)
-    
-    print(f"\n✅ Exported to: {filepath}")
+        print(f"\n✅ Exported to: {result.filepath}")
+    if result.duplicate and result.status != "skipped":
+        d = result.duplicate
+        print(f"🔁 {d.kind.capitalize()} of {d.path} ({d.shared} shared messages, {d.similarity:.0%} similar)")
     print(f"📝 Messages: {len(messages)}")
     
-    if insights:
-        print(f"💡 Insights: {len(insights)}")
-    if tags:
-        print(f"🏷️  Tags: {', '.join(tags)}")
+    if result.insights:
+        print(f"💡 Insights: {len(result.insights)}")
+    if result.tags:
+        print(f"🏷️  Tags: {', '.join(result.tags)}")
     
     return 0
 
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -13,6 +13,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/snufkin0866/chatgpt-to-markdown",
     packages=find_packages(),
+    py_modules=["chatgpt_to_markdown"],
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.8",
@@ -32,6 +33,7 @@ setup(
         "playwright>=1.40.0",
         "openai>=1.0.0",
         "beautifulsoup4>=4.12.0",
+        "pyyaml>=6.0",
     ],
     entry_points={
         "console_scripts": [
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from chatgpt_to_markdown import Config
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """Config with every file the exporter keeps (cache, index, archive, ...) under tmp_path"""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    return Config(
+        output_dir=str(tmp_path / "out"),
+        cache_dir=str(tmp_path / "cache"),
+        index_path=str(tmp_path / "index.db"),
+        queue_path=str(tmp_path / "queue.db"),
+        archive_path=str(tmp_path / "archive"),
+        openai_api_key=None,
+    )
+
+
+@pytest.fixture(scope="session")
+def fixture_server():
+    """Local share pages (benchmarks/fixture_server.py); yields (server, base_url)"""
+    from fixture_server import start_fixture_server
+    
+    server, base_url = start_fixture_server()
+    yield server, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def mock_openai():
+    """Start local OpenAI-compatible servers (benchmarks/mock_openai.py); call with
+    start_mock_server's arguments to get (server, base_url)"""
+    from mock_openai import start_mock_server
+    
+    servers = []
+    
+    def start(**kwargs):
+        server, base_url = start_mock_server(**kwargs)
+        servers.append(server)
+        return server, base_url
+    
+    yield start
+    for server in servers:
+        server.shutdown()
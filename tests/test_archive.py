@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import types
+from dataclasses import replace
+
+import pytest
+
+from chatgpt_to_markdown import (Config, ConversationArchive, ExportManifest, ExtractionCache, InsightsEngine,
+                                 JobQueue, Message, SearchIndex, export_conversation, parse_markdown_file,
+                                 render_archive, render_main)
+
+
+def conversation(turns: int, branch: str = "main"):
+    return [Message("User" if i % 2 == 0 else "ChatGPT",
+                    f"{branch} turn {i} " + "about sqlite full text search and tokenizers " * 3)
+            for i in range(turns)]
+
+
+def test_archive_yields_latest_version_of_each_conversation(config):
+    archive = ConversationArchive.for_config(config)
+    archive.add("a", None, "A", None, False, conversation(2), date="2024-01-01", insights=["first"])
+    archive.add("a", None, "A", None, False, conversation(4), start=2)
+    archive.add("b", None, "B", None, False, conversation(1, "other"))
+    
+    conversations = archive.conversations()
+    assert isinstance(conversations, types.GeneratorType)
+    by_key = {c.key: c for c in conversations}
+    assert by_key["a"].messages == conversation(4)
+    assert by_key["a"].insights == ["first"] and by_key["a"].date == "2024-01-01"
+    assert by_key["b"].messages == conversation(1, "other")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_replays_merged_and_linked_conversations(config, tmp_path, workers):
+    config.duplicates = "merge"
+    index = SearchIndex.open(config)
+    original = export_conversation("https://chatgpt.com/share/abc", conversation(8), config, False, index=index)
+    merged = export_conversation("https://chatgpt.com/share/xyz", conversation(9), config, False, index=index)
+    forked = conversation(6) + conversation(8, "fork")[6:]
+    linked = export_conversation("https://chatgpt.com/share/fork", forked, config, False, index=index)
+    assert (merged.status, linked.status) == ("merged", "linked")
+    exported = {path.name: path.read_text(encoding="utf-8") for path in original.filepath.parent.glob("*.md")}
+    
+    rendered_config = replace(config, output_dir=str(tmp_path / "rendered"))
+    results = render_archive(rendered_config, workers=workers)
+    
+    assert not [r for r in results if r.error]
+    rendered = {path.name: path.read_text(encoding="utf-8") for path in (tmp_path / "rendered").glob("*.md")}
+    assert rendered.keys() == exported.keys()
+    assert len(parse_markdown_file(str(tmp_path / "rendered" / original.filepath.name)).messages) == 9
+    assert "Forked from" in rendered[linked.filepath.name]
+    assert rendered == exported
+    
+    manifest = ExportManifest.for_directory(tmp_path / "rendered")
+    assert manifest.get("abc")['path'] == manifest.get("xyz")['path'] == original.filepath.name
+    assert (manifest.get("abc")['message_count'], manifest.get("xyz")['message_count']) == (8, 9)
+
+
+def test_data_is_kept_in_the_output_directory_by_default(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    config = Config(output_dir=str(tmp_path / "out"))
+    data = tmp_path / "out" / ".chatgpt-to-markdown"
+    
+    exported = export_conversation("https://chatgpt.com/share/abc", conversation(4), config, False,
+                                   index=SearchIndex.from_config(config))
+    ConversationArchive.flush_all()
+    
+    assert ExtractionCache.from_config(config).directory == data / "cache"
+    assert InsightsEngine(config).cache.directory == data / "cache" / "insights"
+    assert SearchIndex.from_config(config).path == data / "index.db"
+    assert JobQueue.open(config).path == data / "queue.db"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out"]
+    assert {"archive", "cache", "index.db", "queue.db"} <= {path.name for path in data.iterdir()}
+    
+    # Rendering elsewhere still reads the archive the exports wrote
+    config_path = tmp_path / "out" / "config.yaml"
+    config_path.write_text(f"output:\n  directory: {config.output_dir}\n", encoding="utf-8")
+    assert render_main(["--output", str(tmp_path / "rendered"), "--workers", "1", "--config", str(config_path)]) == 0
+    assert (tmp_path / "rendered" / exported.filepath.name).read_text(encoding="utf-8") == \
+        exported.filepath.read_text(encoding="utf-8")
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import http.client
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chatgpt_to_markdown import AssetStore, HttpFetcher
+
+
+def test_local_files_are_found_by_id(tmp_path):
+    export = tmp_path / "export"
+    (export / "dalle-generations").mkdir(parents=True)
+    (export / "file-abc123-photo.png").write_bytes(b"photo")
+    (export / "dalle-generations" / "file-xyz789.webp").write_bytes(b"image")
+    (export / "file-abc1234-other.png").write_bytes(b"other")
+    store = AssetStore(tmp_path / "assets", search_paths=[str(export)])
+    
+    assert store._find_local("file-abc123") == export / "file-abc123-photo.png"
+    assert store._find_local("file-xyz789") == export / "dalle-generations" / "file-xyz789.webp"
+    assert store._find_local("file-abc12") is None
+    # The directory is indexed once and shared by every store in the process
+    assert AssetStore(tmp_path / "other", search_paths=[str(export)])._local_index(export) \
+        is store._local_index(export)
+
+
+def test_gzip_size_limit_applies_to_decoded_bytes(fixture_server):
+    _, base_url = fixture_server
+    fetcher = HttpFetcher(5)
+    
+    assert fetcher.get(f"{base_url}/gzip/100000", max_bytes=100000).body == bytes(100000)
+    # Compresses to about 10 KB, well under the limit
+    with pytest.raises(ValueError, match="larger than"):
+        fetcher.get(f"{base_url}/gzip/10000000", max_bytes=1000000)
+    assert fetcher.get(f"{base_url}/gzip/10", max_bytes=10).body == bytes(10)
+
+
+def test_close_reaches_connections_opened_by_other_threads(fixture_server, monkeypatch):
+    _, base_url = fixture_server
+    fetcher = HttpFetcher(5)
+    opened = []
+    connect = http.client.HTTPConnection.connect
+    
+    def tracked_connect(self):
+        opened.append(self)
+        connect(self)
+    
+    monkeypatch.setattr(http.client.HTTPConnection, "connect", tracked_connect)
+    barrier = threading.Barrier(3)
+    
+    def fetch(_):
+        # Hold every thread until all three have their own connection
+        body = fetcher.get(f"{base_url}/gzip/10").body
+        barrier.wait(5)
+        return body
+    
+    with ThreadPoolExecutor(3) as executor:
+        assert list(executor.map(fetch, range(3))) == [bytes(10)] * 3
+    assert len(opened) == 3 and all(conn.sock for conn in opened)
+    
+    fetcher.close()
+    
+    assert not any(conn.sock for conn in opened)
+    # The fetcher reconnects when used again
+    assert fetcher.get(f"{base_url}/gzip/10").body == bytes(10)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from chatgpt_to_markdown import (BRANCH_SPEAKER, ConversationArchive, Message, SearchIndex,
+                                 build_insights_prompt, chunk_transcript, export_conversation,
+                                 linearize_mapping)
+
+
+def node(node_id, parent, children, role=None, text=None):
+    message = {"author": {"role": role}, "content": {"parts": [text]}} if role else None
+    return {"id": node_id, "parent": parent, "children": children, "message": message}
+
+
+# root -> question -> answer -> (edited question "a" -> answer "a") | (edited question "b" -> answer "b")
+MAPPING = {
+    "root": node("root", None, ["q1"]),
+    "q1": node("q1", "root", ["a1"], "user", "How do I index text in SQLite?"),
+    "a1": node("a1", "q1", ["q2a", "q2b"], "assistant", "Use an FTS5 virtual table."),
+    "q2a": node("q2a", "a1", ["a2a"], "user", "Which tokenizer handles Japanese?"),
+    "a2a": node("a2a", "q2a", [], "assistant", "The trigram tokenizer."),
+    "q2b": node("q2b", "a1", ["a2b"], "user", "How do I rank the results?"),
+    "a2b": node("a2b", "q2b", [], "assistant", "Order by bm25()."),
+}
+
+
+def contents(messages):
+    return [m.content for m in messages]
+
+
+def test_active_mode_follows_current_node():
+    messages = linearize_mapping(MAPPING, "a2a")
+    assert contents(messages) == [
+        "How do I index text in SQLite?", "Use an FTS5 virtual table.",
+        "Which tokenizer handles Japanese?", "The trigram tokenizer.",
+    ]
+    assert [m.speaker for m in messages] == ["User", "ChatGPT", "User", "ChatGPT"]
+
+
+@pytest.mark.parametrize("current_node", [None, "deleted-node"])
+def test_missing_or_stale_current_node_follows_the_latest_branch(current_node):
+    assert contents(linearize_mapping(MAPPING, current_node))[2:] == [
+        "How do I rank the results?", "Order by bm25()."]
+
+
+def test_all_mode_introduces_each_branch_with_a_marker():
+    messages = linearize_mapping(MAPPING, "a2a", "all")
+    
+    assert [m.speaker for m in messages] == [
+        "User", "ChatGPT", BRANCH_SPEAKER, "User", "ChatGPT", BRANCH_SPEAKER, "User", "ChatGPT"]
+    assert messages[2].content == "Branch 1 of 2 in reply to: Use an FTS5 virtual table."
+    assert messages[5].content.startswith("Branch 2 of 2")
+    assert contents(messages)[6:] == ["How do I rank the results?", "Order by bm25()."]
+    assert [m.is_marker for m in messages].count(True) == 2
+
+
+def test_summary_mode_notes_the_branches_not_shown():
+    messages = linearize_mapping(MAPPING, "a2a", "summary")
+    
+    assert contents(messages) == [
+        "How do I index text in SQLite?", "Use an FTS5 virtual table.",
+        "1 other branch not shown:\n- How do I rank the results?",
+        "Which tokenizer handles Japanese?", "The trigram tokenizer.",
+    ]
+    assert messages[2].is_marker
+
+
+def test_unknown_branch_mode_is_rejected():
+    with pytest.raises(ValueError):
+        linearize_mapping(MAPPING, "a2a", "newest")
+
+
+def test_markers_are_left_out_of_insights(config):
+    messages = linearize_mapping(MAPPING, "a2a", "all")
+    
+    assert "Branch 1 of 2" not in build_insights_prompt(messages, config)
+    assert "Branch" not in "".join(chunk_transcript(messages, 1000))
+    assert build_insights_prompt(messages, config) == \
+        build_insights_prompt([m for m in messages if not m.is_marker], config)
+
+
+def test_markers_are_not_searched_or_compared_for_duplicates(config):
+    config.duplicates = "skip"
+    index = SearchIndex.open(config)
+    messages = linearize_mapping(MAPPING, "a2a", "summary")
+    exported = export_conversation("https://chatgpt.com/share/abc", messages, config, False, index=index)
+    
+    assert index.search("shown") == []
+    assert index.search("tokenizer")
+    
+    # Only the note about the other branch differs: still the same conversation
+    edited = [Message(BRANCH_SPEAKER, "2 other branches not shown:\n- Something else") if m.is_marker else m
+              for m in messages]
+    match = index.find_duplicate(edited)
+    assert (match.kind, match.path, match.similarity) == ("duplicate", str(exported.filepath), 1.0)
+
+
+def test_archived_markers_are_flagged(config):
+    archive = ConversationArchive.for_config(config)
+    archive.add("abc", None, "Branches", None, False, linearize_mapping(MAPPING, "a2a", "all"))
+    archive.flush()
+    
+    rows = [json.loads(line) for path in sorted((archive.directory / "messages").glob("*.jsonl"))
+            for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [row["marker"] for row in rows] == [False, False, True, False, False, True, False, False]
+    assert next(archive.conversations()).messages == linearize_mapping(MAPPING, "a2a", "all")
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+
+import playwright.async_api
+import pytest
+
+from chatgpt_to_markdown import BrowserPool
+
+
+class FailingChromium:
+    async def launch(self, headless=True):
+        raise RuntimeError("no browser")
+
+
+class FakeDriver:
+    running = 0
+    
+    def __init__(self):
+        self.chromium = FailingChromium()
+    
+    async def start(self):
+        FakeDriver.running += 1
+        return self
+    
+    async def stop(self):
+        FakeDriver.running -= 1
+
+
+def test_failed_launch_stops_the_driver(config, monkeypatch):
+    monkeypatch.setattr(playwright.async_api, "async_playwright", FakeDriver)
+    
+    async def run():
+        async with BrowserPool(config, 1) as pool:
+            for _ in range(3):
+                with pytest.raises(RuntimeError):
+                    await pool._ensure_browser()
+            assert FakeDriver.running == 0
+    
+    asyncio.run(run())
+    assert FakeDriver.running == 0
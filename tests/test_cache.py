@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from chatgpt_to_markdown import (METRICS, ExtractionCache, Message, export_conversation, exported_before,
+                                 extract_messages, parse_key)
+
+
+def test_cache_hit_needs_matching_update_time(config):
+    cache = ExtractionCache.from_config(config)
+    messages = [Message("User", "hello")]
+    cache.put("abc", {"update_time": 1}, parse_key(config), messages)
+    parse = lambda raw: []
+    
+    assert cache.get("abc", parse_key(config), parse) == messages
+    assert cache.get("abc", parse_key(config), parse, update_time=1) == messages
+    assert cache.get("abc", parse_key(config), parse, update_time=2) is None
+
+
+def test_cache_index_survives_reopening(config):
+    cache = ExtractionCache.from_config(config)
+    cache.put("abc", {"update_time": 1}, parse_key(config), [Message("User", "hello")])
+    cache.close()
+    
+    reopened = ExtractionCache.from_config(config)
+    assert reopened.get("abc", parse_key(config), lambda raw: []) == [Message("User", "hello")]
+
+
+def test_cache_evicts_least_recently_used(config):
+    cache = ExtractionCache(config.cache_dir, max_size_mb=0.001)
+    for share_id in ("a", "b", "c"):
+        cache.put(share_id, {"update_time": share_id, "text": "x" * 300}, "k", [Message("User", "x" * 300)])
+    
+    assert cache.get("a", "k", lambda raw: []) is None
+    assert cache.get("c", "k", lambda raw: []) is not None
+
+
+def test_reexport_of_grown_conversation_is_not_served_stale(config, fixture_server):
+    server, base_url = fixture_server
+    path = "/share/next-30"
+    url = base_url + path
+    cache = ExtractionCache.from_config(config)
+    
+    first = extract_messages(url, config, cache)
+    result = export_conversation(url, first, config, with_insights=False)
+    assert result.status == "created"
+    
+    server.sizes[path] = 40
+    try:
+        assert exported_before(url, config)
+        second = extract_messages(url, config, cache, revalidate=exported_before(url, config))
+        result = export_conversation(url, second, config, with_insights=False)
+    finally:
+        del server.sizes[path]
+    
+    assert len(second) > len(first)
+    assert result.status == "appended"
+    assert result.new_messages == len(second) - len(first)
+
+
+def test_unchanged_conversation_is_served_from_cache(config, fixture_server):
+    _, base_url = fixture_server
+    url = base_url + "/share/next-20"
+    cache = ExtractionCache.from_config(config)
+    
+    first = extract_messages(url, config, cache)
+    METRICS.take("cache_lookups")
+    assert extract_messages(url, config, cache, revalidate=True) == first
+    assert METRICS.take("cache_lookups") == [((("result", "hit"),), 1)]
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+
+from chatgpt_to_markdown import (ExportManifest, Message, SearchIndex, export_conversation, get_backend,
+                                 resolve_output_dir)
+
+ORIGINAL = "https://chatgpt.com/share/abc"
+CONTINUED = "https://chatgpt.com/share/xyz"
+
+
+def conversation(turns: int, branch: str = "main"):
+    return [Message("User" if i % 2 == 0 else "ChatGPT",
+                    f"{branch} turn {i} " + "about sqlite full text search and tokenizers " * 3)
+            for i in range(turns)]
+
+
+def export(url, messages, config, index):
+    return export_conversation(url, messages, config, with_insights=False, index=index)
+
+
+def test_merge_keeps_every_manifest_entry_for_the_file_current(config):
+    config.format, config.duplicates = "blog", "merge"
+    index = SearchIndex.open(config)
+    created = export(ORIGINAL, conversation(8), config, index)
+    merged = export(CONTINUED, conversation(10), config, index)
+    assert merged.status == "merged" and merged.filepath == created.filepath
+    
+    manifest = ExportManifest.for_directory(resolve_output_dir(config))
+    size = created.filepath.stat().st_size
+    assert manifest.get("abc")['size'] == manifest.get("xyz")['size'] == size
+    
+    # The original URL catching up with the merged turns appends nothing twice
+    assert export(ORIGINAL, conversation(10), config, index).status == "unchanged"
+    assert export(ORIGINAL, conversation(12), config, index).status == "appended"
+    text = created.filepath.read_text(encoding="utf-8")
+    assert text.count("main turn 9 ") == 1 and text.count("main turn 11 ") == 1
+    assert text.count(get_backend("blog").footer()) == 1
+
+
+def test_divergent_branch_is_not_spliced_into_merged_file(config):
+    config.format, config.duplicates = "blog", "merge"
+    index = SearchIndex.open(config)
+    created = export(ORIGINAL, conversation(8), config, index)
+    export(CONTINUED, conversation(10), config, index)
+    merged_text = created.filepath.read_text(encoding="utf-8")
+    
+    diverged = conversation(8) + conversation(10, "other")[8:]
+    result = export(ORIGINAL, diverged, config, index)
+    
+    assert result.filepath != created.filepath
+    assert created.filepath.read_text(encoding="utf-8") == merged_text
+    assert "other turn 8" in result.filepath.read_text(encoding="utf-8")
+    assert ExportManifest.for_directory(resolve_output_dir(config)).get("abc")['path'] == result.filepath.name
+
+
+@pytest.mark.parametrize("mode", ["link", "merge"])
+def test_exact_duplicate_is_skipped_rather_than_written_empty(config, mode):
+    config.duplicates = mode
+    index = SearchIndex.open(config)
+    created = export(ORIGINAL, conversation(8), config, index)
+    
+    result = export(CONTINUED, conversation(8), config, index)
+    
+    assert result.status == "skipped" and result.duplicate.kind == "duplicate"
+    assert result.filepath == created.filepath
+    assert [path.name for path in created.filepath.parent.glob("*.md")] == [created.filepath.name]
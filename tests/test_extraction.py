@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+import chatgpt_to_markdown
+from chatgpt_to_markdown import METRICS, BrowserPool, extract_messages, should_block_request
+from synthetic import make_dom_elements
+
+
+@pytest.fixture
+def no_browser(monkeypatch):
+    def fetch_with_playwright(url, config):
+        raise AssertionError(f"browser launched for {url}")
+    
+    monkeypatch.setattr(chatgpt_to_markdown, "fetch_with_playwright", fetch_with_playwright)
+
+
+@pytest.fixture(scope="module")
+def chromium():
+    """Skip tests that need a real browser where Playwright's Chromium can't be launched"""
+    playwright = pytest.importorskip("playwright.sync_api")
+    try:
+        with playwright.sync_playwright() as p:
+            p.chromium.launch().close()
+    except Exception as e:
+        pytest.skip(f"Chromium unavailable: {type(e).__name__}")
+
+
+@pytest.mark.parametrize("kind", ["next", "remix"])
+def test_embedded_conversation_is_read_without_a_browser(config, fixture_server, no_browser, kind):
+    _, base_url = fixture_server
+    METRICS.take("extractions")
+    
+    messages = extract_messages(f"{base_url}/share/{kind}-50", config)
+    
+    assert len(messages) > 20
+    assert METRICS.take("extractions") == [((("method", "http"),), 1)]
+
+
+def test_both_page_formats_give_the_same_messages(config, fixture_server, no_browser):
+    _, base_url = fixture_server
+    assert extract_messages(f"{base_url}/share/next-50", config) == \
+        extract_messages(f"{base_url}/share/remix-50", config)
+
+
+def test_page_without_embedded_data_falls_back_to_the_browser(config, fixture_server, monkeypatch):
+    _, base_url = fixture_server
+    loaded = []
+    
+    def fetch_with_playwright(url, config):
+        loaded.append(url)
+        return make_dom_elements(30)
+    
+    monkeypatch.setattr(chatgpt_to_markdown, "fetch_with_playwright", fetch_with_playwright)
+    METRICS.take("http_fallbacks")
+    METRICS.take("extractions")
+    
+    messages = extract_messages(f"{base_url}/share/dom-30", config)
+    
+    assert messages and loaded == [f"{base_url}/share/dom-30"]
+    assert METRICS.take("http_fallbacks") == [((), 1)]
+    assert METRICS.take("extractions") == [((("method", "playwright"),), 1)]
+
+
+def test_browser_pool_only_launches_chromium_when_a_page_needs_it(config, fixture_server):
+    _, base_url = fixture_server
+    url = f"{base_url}/share/next-50"
+    
+    async def run():
+        async with BrowserPool(config, 2) as pool:
+            messages = await pool.extract(url)
+            assert pool._browser is None and pool._playwright is None
+            return messages, pool.tiers[url]
+    
+    messages, tier = asyncio.run(run())
+    assert messages and tier == "http"
+
+
+@pytest.mark.parametrize("resource_type, url, blocked", [
+    ("image", "http://127.0.0.1/static/hero.png", True),
+    ("font", "http://127.0.0.1/static/font.woff2", True),
+    ("script", "https://www.googletagmanager.com/gtag/js", True),
+    ("fetch", "https://api.segment.io/v1/t", True),
+    ("document", "https://chatgpt.com/share/abc", False),
+    ("script", "https://cdn.oaistatic.com/app.js", False),
+    ("fetch", "https://notsegment.io/v1/t", False),
+])
+def test_fast_load_blocks_media_and_analytics(resource_type, url, blocked):
+    assert should_block_request(resource_type, url) is blocked
+
+
+def test_fast_load_returns_once_conversation_data_is_ready(config, fixture_server, chromium):
+    _, base_url = fixture_server
+    url = f"{base_url}/share/next-50"
+    config = replace(config, http_fast_path=False, browser_fast_load=True)
+    
+    async def run():
+        async with BrowserPool(config, 1) as pool:
+            return await pool.extract(url), pool.timings[url]
+    
+    messages, timing = asyncio.run(run())
+    
+    assert messages
+    # The fixture page keeps slow assets and beacons going for about two seconds
+    assert timing.total_ms < 1500
+    assert timing.blocked_requests >= 2
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from import_budget import check
+
+
+def test_commands_do_not_import_heavy_modules():
+    assert check(budget_ms=None, repeat=1, verbose=False) == []
+
+
+@pytest.mark.skipif(not os.environ.get("IMPORT_BUDGET_MS"),
+                    reason="timing depends on the machine; set IMPORT_BUDGET_MS (e.g. 100) to check it")
+def test_commands_stay_within_import_budget():
+    # Each command runs once to warm up, then 7 times in a fresh interpreter
+    # (round-robin with the others); the median is compared
+    assert check(budget_ms=float(os.environ["IMPORT_BUDGET_MS"]), repeat=7, verbose=False) == []
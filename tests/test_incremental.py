@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from chatgpt_to_markdown import (ExportManifest, Message, export_conversation, get_backend, resolve_output_dir,
+                                 share_id_from_url)
+
+URL = "https://chatgpt.com/share/abc-123"
+
+
+def conversation(turns: int, prefix: str = "turn"):
+    return [Message("User" if i % 2 == 0 else "ChatGPT", f"{prefix} {i}") for i in range(turns)]
+
+
+def test_new_turns_are_appended_before_the_footer(config):
+    config.format = "blog"
+    footer = get_backend("blog").footer()
+    created = export_conversation(URL, conversation(4), config, with_insights=False)
+    result = export_conversation(URL, conversation(6), config, with_insights=False)
+    
+    assert result.status == "appended" and result.new_messages == 2
+    text = created.filepath.read_text(encoding="utf-8")
+    assert text.index("turn 3") < text.index("turn 5")
+    assert text.count(footer) == 1 and text.endswith(footer)
+
+
+def test_interrupted_append_leaves_file_and_manifest_unchanged(config, monkeypatch):
+    config.format = "blog"
+    created = export_conversation(URL, conversation(4), config, with_insights=False)
+    before = created.filepath.read_bytes()
+    manifest = ExportManifest.for_directory(resolve_output_dir(config))
+    entry = manifest.get(share_id_from_url(URL))
+    
+    def interrupted(fd):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(os, "fsync", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        export_conversation(URL, conversation(6), config, with_insights=False)
+    monkeypatch.undo()
+    
+    assert created.filepath.read_bytes() == before
+    assert manifest.get(share_id_from_url(URL)) == entry
+    assert not [p for p in created.filepath.parent.iterdir() if p.name.endswith(".tmp")]
+    
+    assert export_conversation(URL, conversation(6), config, with_insights=False).status == "appended"
+    text = created.filepath.read_text(encoding="utf-8")
+    assert text.count("turn 5") == 1
+    assert text.count(get_backend("blog").footer()) == 1
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import chatgpt_to_markdown
+from chatgpt_to_markdown import METRICS, InsightsCache, InsightsEngine, Message, chunk_transcript, import_data_export
+from synthetic import make_conversation
+
+
+def conversation(turns: int):
+    return [Message("User" if i % 2 == 0 else "ChatGPT", f"turn {i} " + "about rate limits and caching " * 20)
+            for i in range(turns)]
+
+
+def insights_config(config, base_url, **changes):
+    return replace(config, openai_api_key="test", openai_base_url=base_url, **changes)
+
+
+def generate(config, messages):
+    async def run():
+        engine = InsightsEngine(config)
+        try:
+            return await engine.generate(messages)
+        finally:
+            await engine.close()
+    
+    return asyncio.run(run())
+
+
+def test_map_reduce_merges_chunk_results_in_a_tree(config, mock_openai):
+    server, base_url = mock_openai()
+    config = insights_config(config, base_url, insights_mode="map_reduce", openai_chunk_tokens=300,
+                             openai_reduce_fanout=2, openai_cache=False)
+    messages = conversation(20)
+    chunks = len(chunk_transcript(messages, config.openai_chunk_tokens))
+    assert chunks > 4
+    
+    insights, tags = generate(config, messages)
+    
+    assert insights and tags
+    # One request per chunk, then merges of at most two results until one is left
+    expected, level = chunks, chunks
+    while level > 1:
+        level = (level + 1) // 2
+        expected += level
+    assert server.RequestHandlerClass.requests == expected
+
+
+def test_rate_limited_requests_are_retried(config, mock_openai):
+    server, base_url = mock_openai(fail_first=3)
+    config = insights_config(config, base_url, openai_cache=False)
+    METRICS.take("openai_retries")
+    
+    insights, tags = generate(config, conversation(4))
+    
+    assert insights and tags
+    assert server.RequestHandlerClass.requests == 4
+    assert METRICS.take("openai_retries") == [((("reason", "RateLimitError"),), 3)]
+
+
+def test_requests_give_up_after_max_retries(config, mock_openai):
+    server, base_url = mock_openai(failure_rate=1.0)
+    config = insights_config(config, base_url, openai_cache=False, openai_max_retries=2)
+    METRICS.take("openai_requests")
+    
+    assert generate(config, conversation(4)) == ([], [])
+    assert server.RequestHandlerClass.requests == 3
+    assert METRICS.take("openai_requests") == [((("result", "failed"),), 1)]
+
+
+def test_responses_are_cached_across_engines(config, mock_openai):
+    server, base_url = mock_openai()
+    config = insights_config(config, base_url)
+    messages = conversation(4)
+    
+    first = generate(config, messages)
+    METRICS.take("openai_requests")
+    second = generate(config, messages)
+    
+    assert second == first
+    assert server.RequestHandlerClass.requests == 1
+    assert METRICS.take("openai_requests") == [((("result", "cached"),), 1)]
+    
+    # A different language is a different prompt, so it is not served from the cache
+    generate(replace(config, insights_language="ja"), messages)
+    assert server.RequestHandlerClass.requests == 2
+
+
+def test_import_shares_one_engine_across_conversations(config, mock_openai, monkeypatch, tmp_path):
+    server, base_url = mock_openai()
+    config = insights_config(config, base_url, openai_cache=False)
+    export = tmp_path / "conversations.json"
+    export.write_text(json.dumps([make_conversation(20, seed=i) for i in range(3)]), encoding="utf-8")
+    engines = []
+    
+    class CountingEngine(InsightsEngine):
+        def __init__(self, config):
+            super().__init__(config)
+            engines.append(self)
+    
+    monkeypatch.setattr(chatgpt_to_markdown, "InsightsEngine", CountingEngine)
+    results = import_data_export(str(export), config, workers=1)
+    
+    assert not [r for r in results if r.error] and len(results) == 3
+    assert len(engines) == 1
+    assert server.RequestHandlerClass.requests == 3
+    assert chatgpt_to_markdown._import_engine is None
+
+
+def test_truncated_responses_are_not_cached(config, mock_openai):
+    server, base_url = mock_openai(truncate=True)
+    config = insights_config(config, base_url)
+    messages = conversation(4)
+    
+    assert generate(config, messages) == ([], [])
+    assert generate(config, messages) == ([], [])
+    assert server.RequestHandlerClass.requests == 2
+
+
+def test_unusable_cached_response_is_requested_again(config, mock_openai):
+    server, base_url = mock_openai()
+    config = insights_config(config, base_url)
+    messages = conversation(4)
+    generate(config, messages)
+    for path in (Path(config.cache_dir) / "insights").glob("*/*.json"):
+        path.write_text(json.dumps({"response": '{"insights": ["cut', "stored_at": time.time()}), encoding="utf-8")
+    
+    insights, tags = generate(config, messages)
+    
+    assert insights and tags
+    assert server.RequestHandlerClass.requests == 2
+
+
+def test_cache_key_includes_the_endpoint(config, mock_openai):
+    first, first_url = mock_openai()
+    second, second_url = mock_openai()
+    messages = conversation(4)
+    
+    generate(insights_config(config, first_url), messages)
+    generate(insights_config(config, second_url), messages)
+    
+    assert first.RequestHandlerClass.requests == second.RequestHandlerClass.requests == 1
+
+
+def test_insights_cache_drops_expired_and_least_recently_used_entries(tmp_path):
+    directory = tmp_path / "insights"
+    cache = InsightsCache(str(directory))
+    for i, key in enumerate(["aa01", "bb02", "cc03", "dd04"]):
+        cache.put(key, "x" * 400_000)
+        os.utime(cache._path(key), (time.time() - 10 + i, time.time() - 10 + i))
+    old = cache._path("aa01")
+    os.utime(old, (time.time() - 200 * 86400, time.time() - 200 * 86400))
+    
+    InsightsCache(str(directory), max_size_mb=0.8, max_age_days=90).prune()
+    
+    assert [path.stem for path in sorted(directory.glob("*/*.json"))] == ["cc03", "dd04"]
+    expired = InsightsCache(str(directory), max_age_days=0)
+    assert expired.get("dd04") is None
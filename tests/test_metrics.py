@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from chatgpt_to_markdown import Metrics
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    metrics = Metrics()
+    metrics.open_json_lines(str(tmp_path / "events.jsonl"))
+    yield metrics
+    metrics.close()
+
+
+def events(tmp_path):
+    with open(tmp_path / "events.jsonl", "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_timers_and_counters_are_written_as_json_lines(metrics, tmp_path):
+    with metrics.timer("extract", url="https://chatgpt.com/share/abc") as fields:
+        fields["messages"] = 12
+    with pytest.raises(OSError):
+        with metrics.timer("extract", url="https://chatgpt.com/share/xyz"):
+            raise OSError("connection reset")
+    metrics.event("page_goto", 250.0, fast_load=True)
+    metrics.event("cache_hit", url="https://chatgpt.com/share/abc")
+    metrics.count("extractions", method="http")
+    metrics.count("extractions", method="http")
+    metrics.count("payload_chars", 1500)
+    
+    recorded = events(tmp_path)
+    
+    assert [event["stage"] for event in recorded] == ["extract", "extract", "page_goto", "cache_hit"]
+    assert recorded[0]["url"] == "https://chatgpt.com/share/abc" and recorded[0]["messages"] == 12
+    assert recorded[0]["duration_ms"] >= 0 and "error" not in recorded[0]
+    assert recorded[1]["error"] == "OSError"
+    assert recorded[2]["duration_ms"] == 250.0 and recorded[2]["fast_load"] is True
+    assert "duration_ms" not in recorded[3]
+    assert all(isinstance(event["ts"], float) for event in recorded)
+    
+    snapshot = metrics.snapshot()
+    assert snapshot["stages"]["extract"]["count"] == 2
+    assert snapshot["stages"]["page_goto"] == {"count": 1, "total_ms": 250.0, "mean_ms": 250.0}
+    assert "cache_hit" not in snapshot["stages"]
+    assert snapshot["counters"] == [
+        {"name": "extractions", "labels": {"method": "http"}, "value": 2},
+        {"name": "payload_chars", "labels": {}, "value": 1500},
+    ]
+    json.dumps(snapshot)
+
+
+def test_prometheus_output(metrics):
+    metrics.event("page_goto", 250.0)
+    metrics.event("page_goto", 750.0)
+    metrics.count("extractions", method="http")
+    metrics.count("extractions", 2, method="browser")
+    metrics.count("filtered", rule='say "hi"\\n')
+    
+    lines = metrics.prometheus().splitlines()
+    
+    assert lines[:4] == [
+        "# HELP chatgpt_to_markdown_stage_seconds Time spent in each stage during the last run",
+        "# TYPE chatgpt_to_markdown_stage_seconds summary",
+        'chatgpt_to_markdown_stage_seconds_sum{stage="page_goto"} 1.000000',
+        'chatgpt_to_markdown_stage_seconds_count{stage="page_goto"} 2',
+    ]
+    assert lines[4:10] == [
+        "# TYPE chatgpt_to_markdown_extractions_total counter",
+        'chatgpt_to_markdown_extractions_total{method="browser"} 2',
+        'chatgpt_to_markdown_extractions_total{method="http"} 1',
+        "# TYPE chatgpt_to_markdown_filtered_total counter",
+        'chatgpt_to_markdown_filtered_total{rule="say \\"hi\\"\\\\n"} 1',
+        "# TYPE chatgpt_to_markdown_last_run_timestamp_seconds gauge",
+    ]
+    assert lines[10].startswith("chatgpt_to_markdown_last_run_timestamp_seconds ")
+    assert len(lines) == 11
+
+
+def test_prometheus_textfile_is_replaced(metrics, tmp_path):
+    path = tmp_path / "metrics.prom"
+    path.write_text("stale\n", encoding="utf-8")
+    metrics.count("extractions", method="http")
+    
+    metrics.write_prometheus(str(path))
+    
+    assert 'chatgpt_to_markdown_extractions_total{method="http"} 1' in path.read_text(encoding="utf-8")
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith("metrics")] == ["metrics.prom"]
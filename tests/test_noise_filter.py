@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pytest
+
+from chatgpt_to_markdown import METRICS, Config, NoiseFilter
+
+
+@pytest.fixture
+def noise():
+    return NoiseFilter([
+        {"text": "Copy link", "name": "copy"},
+        {"text": ["sponsored", "İstanbul", "straße"], "match": "substring", "ignore_case": True, "name": "ad"},
+        {"text": "sign in", "match": "substring", "ignore_case": True, "name": "login"},
+        {"text": "utm_source=", "match": "substring", "name": "tracking"},
+        {"regex": r"Upgrade to \w+", "ignore_case": True, "name": "upsell"},
+        {"regex": r"(\w+) \1", "name": "repeated"},
+    ])
+
+
+@pytest.mark.parametrize("text, rule", [
+    ("Copy link", "copy"),
+    ("  Copy link\n", "copy"),
+    ("How do I copy link text?", None),
+    ("This post is SPONSORED content", "ad"),
+    ("ſponsored", "ad"),
+    ("visit İSTANBUL", "ad"),
+    ("STRASSE", None),
+    ("STRAẞE", "ad"),
+    ("please SIGN İN", "login"),
+    ("please sıgn in", "login"),
+    ("https://example.com/?utm_source=chatgpt", "tracking"),
+    ("upgrade to Plus", "upsell"),
+    ("Please upgrade to Plus first", None),
+    ("bye bye", "repeated"),
+])
+def test_match(noise, text, rule):
+    assert noise.match(text) == rule
+
+
+def test_default_rules_only_drop_whole_messages():
+    noise = NoiseFilter.default()
+    assert noise.match("Log in") == "auth"
+    assert noise.match("Terms of Use | Privacy Policy") == "legal"
+    assert noise.match("How do I fix the Login page?") is None
+
+
+def test_dropped_messages_are_counted_per_rule(noise):
+    METRICS.take("filtered")
+    assert noise.is_noise("Copy link") and not noise.is_noise("hello")
+    assert METRICS.take("filtered") == [((("rule", "copy"),), 1)]
+
+
+def test_invalid_rules_are_rejected():
+    for rule in ({"regex": "("}, {"text": ""}, {"text": "x", "match": "prefix"}, {"name": "nothing"}):
+        with pytest.raises(ValueError):
+            NoiseFilter([rule])
+
+
+@pytest.mark.parametrize("rule, text", [
+    ({"regex": "(?i)accept cookies"}, "ACCEPT Cookies"),
+    ({"regex": "(?is)sign.up", "match": "substring"}, "please SIGN\nup"),
+    ({"regex": "(?P<r0>sign) up", "match": "substring"}, "sign up"),
+    ({"regex": "(?P<literal>x+)(?P<folded>y)"}, "xxy"),
+    ({"regex": "(?x) join \\s now  # verbose, with a comment", "match": "substring"}, "join now!"),
+])
+def test_rules_that_cannot_be_combined_as_written_still_match(rule, text):
+    rules = [{"text": "Copy link", "name": "copy"}, {"regex": r"Upgrade to \w+", "name": "upsell"},
+             dict(rule, name="user")]
+    noise = NoiseFilter(rules)
+    assert noise.match(text) == "user"
+    assert noise.match("Copy link") == "copy" and noise.match("Upgrade to Plus") == "upsell"
+    assert noise.match("unrelated") is None
+
+
+def test_invalid_regex_is_reported_with_its_rule_name():
+    config = Config(filter_rules=[{"regex": "(?i)ok"}, {"regex": "[unclosed", "name": "broken"}])
+    problems = config.validate()
+    assert [p for p in problems if p.startswith("filters.rules: rule 'broken': invalid regex")]
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+from dataclasses import replace
+
+import pytest
+
+from chatgpt_to_markdown import METRICS, BrowserPool, InsightsEngine, Inbox, JobQueue, run_queue
+
+
+@pytest.fixture
+def queue_config(config):
+    return replace(config, queue_retry_delay=0.01, queue_max_retry_delay=0.05, queue_poll_interval=0.02,
+                   queue_max_attempts=3)
+
+
+def run(queue, config, **kwargs):
+    return asyncio.run(run_queue(queue, config, 2, **kwargs))
+
+
+def test_interrupted_run_resumes_at_the_stage_it_stopped_in(queue_config, fixture_server, mock_openai,
+                                                            monkeypatch):
+    _, base_url = fixture_server
+    server, openai_url = mock_openai()
+    config = replace(queue_config, openai_api_key="test", openai_base_url=openai_url)
+    queue = JobQueue.open(config)
+    url = f"{base_url}/share/next-40"
+    queue.add([url])
+    
+    async def interrupted(self, messages, raise_errors=False):
+        raise KeyboardInterrupt
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(InsightsEngine, "generate", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            run(queue, config)
+    assert queue.counts()["extracted"] == 1
+    
+    METRICS.take("extractions")
+    outcome = run(queue, config)
+    
+    assert outcome["written"] == 1
+    assert queue.counts()["written"] == 1
+    # The messages stored with the job were used; the page wasn't extracted again
+    assert METRICS.take("extractions") == []
+    assert server.RequestHandlerClass.requests == 1
+
+
+def test_failed_stage_is_retried_with_backoff(queue_config, fixture_server, monkeypatch):
+    _, base_url = fixture_server
+    queue = JobQueue.open(queue_config)
+    queue.add([f"{base_url}/share/next-40"])
+    extract = BrowserPool.extract
+    calls = []
+    
+    async def flaky(self, url, *args, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            raise OSError("connection reset")
+        return await extract(self, url, *args, **kwargs)
+    
+    monkeypatch.setattr(BrowserPool, "extract", flaky)
+    METRICS.take("job_retries")
+    
+    outcome = run(queue, queue_config, with_insights=False)
+    
+    assert outcome == {"written": 1, "failed": 0, "interrupted": 0}
+    assert len(calls) == 2
+    assert METRICS.take("job_retries") == [((("step", "extract"),), 1)]
+
+
+def test_retry_delay_doubles_up_to_the_maximum(tmp_path):
+    queue = JobQueue(tmp_path / "queue.db", max_attempts=10, retry_delay=1.0, max_retry_delay=5.0)
+    queue.add(["https://chatgpt.com/share/abc"])
+    job = queue.ready(1)[0]
+    
+    delays = [queue.fail(job, "error") for _ in range(5)]
+    
+    for delay, expected in zip(delays, [1, 2, 4, 5, 5]):
+        assert expected * 0.8 <= delay <= expected * 1.2
+    assert queue.ready(1) == []
+
+
+def test_job_fails_after_max_attempts_and_can_be_retried(queue_config, fixture_server, monkeypatch):
+    _, base_url = fixture_server
+    queue = JobQueue.open(queue_config)
+    url = f"{base_url}/share/next-40"
+    queue.add([url])
+    
+    async def broken(self, url, *args, **kwargs):
+        raise OSError("unreachable")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(BrowserPool, "extract", broken)
+        outcome = run(queue, queue_config, with_insights=False)
+    
+    assert outcome == {"written": 0, "failed": 1, "interrupted": 0}
+    assert queue.counts()["failed"] == 1
+    assert queue.failures() == [(url, "queued", "OSError: unreachable")]
+    
+    assert queue.retry_failed() == 1
+    assert queue.counts()["queued"] == 1
+    outcome = run(queue, queue_config, with_insights=False)
+    
+    assert outcome["written"] == 1
+    assert queue.failures() == []
+
+
+def test_watch_mode_queues_urls_dropped_into_the_inbox(queue_config, fixture_server, tmp_path):
+    _, base_url = fixture_server
+    inbox_dir = tmp_path / "inbox"
+    inbox_dir.mkdir()
+    (inbox_dir / "first.txt").write_text(f"{base_url}/share/next-30\n# comment\n", encoding="utf-8")
+    queue = JobQueue.open(queue_config)
+    
+    async def watch():
+        task = asyncio.ensure_future(run_queue(queue, queue_config, 2, with_insights=False,
+                                               inbox=Inbox(str(inbox_dir))))
+        
+        async def written(count):
+            while queue.counts()["written"] < count:
+                assert not task.done(), task.result()
+                await asyncio.sleep(0.02)
+        
+        await asyncio.wait_for(written(1), 10)
+        (inbox_dir / "second.txt").write_text(f"{base_url}/share/remix-30\n{base_url}/share/next-30\n",
+                                              encoding="utf-8")
+        await asyncio.wait_for(written(2), 10)
+        os.kill(os.getpid(), signal.SIGINT)
+        return await asyncio.wait_for(task, 10)
+    
+    outcome = asyncio.run(watch())
+    
+    assert outcome == {"written": 2, "failed": 0, "interrupted": 1}
+    assert sorted(path.name for path in inbox_dir.iterdir()) == ["first.txt.done", "second.txt.done"]
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from chatgpt_to_markdown import Message, SearchIndex, export_conversation, reindex, resolve_output_dir
+
+
+def conversation(topic: str, turns: int = 4):
+    return [Message("User" if i % 2 == 0 else "ChatGPT", f"turn {i} about {topic}") for i in range(turns)]
+
+
+def export(url, messages, config, index, tags=()):
+    return export_conversation(url, messages, config, with_insights=bool(tags), index=index,
+                               insights_fn=lambda m: ([], list(tags)))
+
+
+@pytest.fixture
+def index(config):
+    index = SearchIndex.open(config)
+    yield index
+    index.close()
+
+
+def test_best_matches_come_first(config, index):
+    export("https://chatgpt.com/share/once", conversation("sqlite and python"), config, index)
+    export("https://chatgpt.com/share/often", conversation("sqlite sqlite sqlite"), config, index)
+    export("https://chatgpt.com/share/never", conversation("gardening"), config, index)
+    
+    hits = index.search("sqlite")
+    
+    assert len(hits) == 8
+    assert all("**sqlite**" in hit.snippet for hit in hits)
+    assert {hit.title for hit in hits[:4]} == {"turn 0 about sqlite sqlite sqlite"}
+    assert [hit.rank for hit in hits] == sorted(hit.rank for hit in hits)
+    assert len(index.search("sqlite", limit=3)) == 3
+
+
+def test_tag_and_speaker_filters(config, index):
+    tagged = export("https://chatgpt.com/share/tagged", conversation("sqlite"), config, index, ["#database"])
+    export("https://chatgpt.com/share/other", conversation("sqlite"), config, index, ["#databases"])
+    
+    for tag in ("database", "#database"):
+        assert {hit.path for hit in index.search("sqlite", tag=tag)} == {str(tagged.filepath.resolve())}
+    assert index.search("sqlite", tag="data") == []
+    
+    hits = index.search("sqlite", speaker="User")
+    assert len(hits) == 4 and {hit.speaker for hit in hits} == {"User"}
+    assert sorted(hit.position for hit in hits) == [0, 0, 2, 2]
+
+
+@pytest.mark.parametrize("query", ['"sqlite', "sqlite AND", "sqlite)", "NOT sqlite"])
+def test_invalid_query_syntax_searches_the_words(config, index, query):
+    export("https://chatgpt.com/share/abc", conversation("sqlite and not much else"), config, index)
+    
+    assert index.search(query)
+
+
+def test_reindex_picks_up_changed_files_and_drops_deleted_ones(config, index):
+    first = export("https://chatgpt.com/share/first", conversation("sqlite"), config, None).filepath
+    second = export("https://chatgpt.com/share/second", conversation("gardening"), config, None).filepath
+    roots = [resolve_output_dir(config).resolve()]
+    
+    assert reindex(index, roots, workers=1) == (2, 0)
+    assert index.search("sqlite")[0].path == str(first.resolve())
+    # Unchanged files are not parsed again
+    assert reindex(index, roots, workers=1) == (0, 0)
+    
+    first.write_text(first.read_text(encoding="utf-8").replace("sqlite", "postgres"), encoding="utf-8")
+    second.unlink()
+    
+    assert reindex(index, roots, workers=1) == (1, 1)
+    assert index.search("sqlite") == [] and index.search("gardening") == []
+    assert {hit.path for hit in index.search("postgres")} == {str(first.resolve())}
+    assert set(index.documents()) == {str(first.resolve())}
+
+
+def test_reindex_leaves_files_outside_the_roots_alone(config, index, tmp_path):
+    elsewhere = tmp_path / "elsewhere.md"
+    elsewhere.write_text("# Elsewhere\n\n## Conversation\n\n### 👤 User\n\nsqlite\n", encoding="utf-8")
+    reindex(index, [tmp_path], workers=1)
+    
+    assert reindex(index, [resolve_output_dir(config).resolve()], workers=1) == (0, 0)
+    assert {hit.path for hit in index.search("sqlite")} == {str(Path(elsewhere).resolve())}
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from chatgpt_to_markdown import METRICS, ExportServer
+
+
+async def request(port, method, path, body=b"", headers=None):
+    """(status, headers, JSON body) of one request on its own connection"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", "Connection: close"]
+    headers = {"Content-Length": str(len(body)), **(headers or {})}
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    response_headers = {name.lower(): value.strip() for name, _, value in
+                        (line.partition(":") for line in header_lines)}
+    return int(status_line.split()[1]), response_headers, json.loads(payload)
+
+
+def export(port, url, **fields):
+    return request(port, "POST", "/export", json.dumps({"url": url, "insights": False, **fields}).encode())
+
+
+@pytest.fixture
+def serve(config):
+    """Runs a test coroutine against an ExportServer; call with (test, **config changes)"""
+    def run(test, max_queue=None, **changes):
+        server_config = replace(config, server_warm_browser=False, **changes)
+        
+        async def main():
+            server = await ExportServer(server_config, max_queue).start()
+            listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+            try:
+                return await test(server, listener.sockets[0].getsockname()[1])
+            finally:
+                listener.close()
+                await listener.wait_closed()
+                await server.close()
+        
+        return asyncio.run(main())
+    
+    return run
+
+
+def test_export_writes_the_conversation(serve, fixture_server):
+    _, base_url = fixture_server
+    url = f"{base_url}/share/next-40"
+    
+    async def test(server, port):
+        return await export(port, url), await export(port, url, write=False)
+    
+    (status, _, written), (rendered_status, _, rendered) = serve(test)
+    
+    assert status == 200 and written["status"] == "created" and written["tier"] == "http"
+    assert Path(written["path"]).read_text(encoding="utf-8").count("### ") == written["messages"]
+    assert rendered_status == 200 and rendered["status"] == "rendered" and rendered["markdown"]
+
+
+@pytest.mark.parametrize("body, headers, status", [
+    (b"not json", {}, 400),
+    (b"[1, 2]", {}, 400),
+    (b'{"insights": false}', {}, 400),
+    (b'{"url": "ftp://example.com/share/abc"}', {}, 400),
+    (b'{"url": "https://chatgpt.com/share/abc", "format": "docx"}', {}, 400),
+    (b"{}", {"Content-Length": "abc"}, 400),
+    (b"{}", {"Content-Length": "-1"}, 400),
+    (b"{}", {"Content-Length": str(ExportServer.MAX_BODY + 1)}, 413),
+])
+def test_bad_requests_are_rejected(serve, body, headers, status):
+    async def test(server, port):
+        return await request(port, "POST", "/export", body, headers)
+    
+    got, _, payload = serve(test)
+    assert got == status and payload["error"]
+
+
+def test_full_queue_is_refused_with_503(serve, fixture_server):
+    _, base_url = fixture_server
+    
+    async def test(server, port):
+        release = asyncio.Event()
+        extract = server.pool.extract
+        
+        async def slow_extract(url, *args):
+            await release.wait()
+            return await extract(url, *args)
+        
+        server.pool.extract = slow_extract
+        first = asyncio.ensure_future(export(port, f"{base_url}/share/next-40"))
+        while not server.active:
+            await asyncio.sleep(0.01)
+        refused = await export(port, f"{base_url}/share/remix-40")
+        release.set()
+        return refused, await first
+    
+    (status, headers, payload), (first_status, _, _) = serve(test, max_queue=0, browser_concurrency=1)
+    
+    assert status == 503 and headers["retry-after"] == "1" and payload["error"]
+    assert first_status == 200
+
+
+def test_requests_for_one_conversation_run_one_at_a_time(serve, fixture_server):
+    _, base_url = fixture_server
+    same = f"{base_url}/share/next-40"
+    other = f"{base_url}/share/next-30"
+    
+    async def test(server, port):
+        extract = server.pool.extract
+        running, overlaps = {}, []
+        
+        async def tracked_extract(url, *args):
+            running[url] = running.get(url, 0) + 1
+            overlaps.append(dict(running))
+            await asyncio.sleep(0.1)
+            try:
+                return await extract(url, *args)
+            finally:
+                running[url] -= 1
+        
+        server.pool.extract = tracked_extract
+        results = await asyncio.gather(export(port, same), export(port, same), export(port, other))
+        return results, overlaps
+    
+    results, overlaps = serve(test, browser_concurrency=4)
+    
+    assert [status for status, _, _ in results] == [200, 200, 200]
+    assert sorted(payload["status"] for _, _, payload in results) == ["created", "created", "unchanged"]
+    assert max(counts.get(same, 0) for counts in overlaps) == 1
+    # Different conversations still run in parallel
+    assert any(counts.get(same) and counts.get(other) for counts in overlaps)
+
+
+def test_health_and_stats(serve, fixture_server):
+    _, base_url = fixture_server
+    METRICS.take("server_requests")
+    
+    async def test(server, port):
+        await export(port, f"{base_url}/share/next-40")
+        return (await request(port, "GET", "/health"), await request(port, "GET", "/stats"),
+                await request(port, "POST", "/health"), await request(port, "GET", "/nothing"))
+    
+    health, stats, wrong_method, missing = serve(test, max_queue=3, browser_concurrency=2)
+    
+    status, _, payload = health
+    assert status == 200 and payload["status"] == "ok"
+    assert (payload["active"], payload["queued"], payload["capacity"], payload["browser"]) == (0, 0, 5, False)
+    status, _, payload = stats
+    assert status == 200 and payload["server"]["status"] == "ok"
+    assert {"name": "server_requests", "labels": {"endpoint": "/export", "status": "200"}, "value": 1} \
+        in payload["counters"]
+    assert payload["stages"]["server_request"]["count"] >= 2
+    assert (wrong_method[0], missing[0]) == (405, 404)